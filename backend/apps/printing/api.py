@@ -2,7 +2,12 @@
 Printing config API - merged org + receipt branding.
 Endpoints match frontend expectations exactly.
 """
+import tempfile
+
 from django.conf import settings
+from django.http import FileResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
@@ -10,12 +15,17 @@ from rest_framework.response import Response
 
 from apps.reporting.models import ReportingOrganizationConfig
 from apps.sequences.models import get_next_receipt_number
+from apps.workflow.permissions import IsAnyDesk
 
+from .bundles import BundleError, build_print_bundle, collect_bundle_documents
+from .config_cache import get_print_config
+from .images import store_print_derivative
 from .models import ReceiptBrandingConfig
+from .render_pool import render_pool_stats
 
 
 def _get_org_config():
-    """Get or create ReportingOrganizationConfig singleton."""
+    """Get or create ReportingOrganizationConfig singleton (fresh row, for updates)."""
     org = ReportingOrganizationConfig.objects.first()
     if not org:
         org = ReportingOrganizationConfig.objects.create(
@@ -27,8 +37,9 @@ def _get_org_config():
 
 def _get_merged_config():
     """Build merged config dict for frontend."""
-    org = _get_org_config()
-    receipt = ReceiptBrandingConfig.get_singleton()
+    config = get_print_config()
+    org = config.org or _get_org_config()
+    receipt = config.receipt
 
     return {
         "org_name": org.org_name or "",
@@ -119,6 +130,7 @@ def upload_report_logo(request):
     org = _get_org_config()
     org.logo = f
     org.save()
+    store_print_derivative(org.logo, "report_logo")
     return Response(_get_merged_config())
 
 
@@ -132,6 +144,7 @@ def upload_receipt_logo(request):
     receipt = ReceiptBrandingConfig.get_singleton()
     receipt.receipt_logo = f
     receipt.save()
+    store_print_derivative(receipt.receipt_logo, "receipt_logo")
     return Response(_get_merged_config())
 
 
@@ -145,6 +158,7 @@ def upload_receipt_banner(request):
     receipt = ReceiptBrandingConfig.get_singleton()
     receipt.receipt_banner = f
     receipt.save()
+    store_print_derivative(receipt.receipt_banner, "receipt_banner")
     return Response(_get_merged_config())
 
 
@@ -158,3 +172,81 @@ def sequence_next(request):
         return Response({"detail": "Only type=receipt supported"}, status=status.HTTP_400_BAD_REQUEST)
     next_val = get_next_receipt_number(increment=not dry_run)
     return Response({"next": next_val})
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def render_pool_status(request):
+    """GET /api/printing/render-pool/stats/ -> PDF render pool counters and latency percentiles."""
+    return Response(render_pool_stats())
+
+
+@api_view(["POST"])
+@permission_classes([IsAnyDesk])
+def print_bundle(request):
+    """
+    POST /api/printing/bundle/ -> one merged PDF (table of contents first).
+    Body: exactly one of visit_id, item_ids (list) or date_from + date_to (YYYY-MM-DD);
+    optional include: ["receipts", "reports"] (default both).
+    """
+    data = request.data
+    visit_id = data.get("visit_id")
+    item_ids = data.get("item_ids")
+    try:
+        date_from = parse_date(str(data["date_from"])) if data.get("date_from") else None
+        date_to = parse_date(str(data["date_to"])) if data.get("date_to") else None
+    except ValueError:
+        date_from = date_to = None
+    include = data.get("include") or ["receipts", "reports"]
+
+    if sum(bool(selector) for selector in (visit_id, item_ids is not None, date_from or date_to)) != 1:
+        return Response(
+            {"error": "INVALID_SELECTION", "detail": "Provide exactly one of visit_id, item_ids, or date_from/date_to."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if item_ids is not None and (not isinstance(item_ids, list) or not item_ids):
+        return Response(
+            {"error": "INVALID_SELECTION", "detail": "item_ids must be a non-empty list."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if (date_from or date_to) and not (date_from and date_to):
+        return Response(
+            {"error": "INVALID_SELECTION", "detail": "date_from and date_to are both required (YYYY-MM-DD)."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    max_days = settings.PRINT_BUNDLE_MAX_DAYS
+    if date_from and date_to and max_days and (date_to - date_from).days + 1 > max_days:
+        return Response(
+            {"error": "INVALID_SELECTION", "detail": f"Date range is limited to {max_days} days."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        documents = collect_bundle_documents(
+            visit_id=visit_id,
+            item_ids=item_ids,
+            date_from=date_from,
+            date_to=date_to,
+            include=include,
+            max_documents=settings.PRINT_BUNDLE_MAX_DOCUMENTS,
+        )
+        if not documents:
+            return Response(
+                {"error": "NO_DOCUMENTS", "detail": "No printable documents match the selection."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        output = tempfile.TemporaryFile(prefix="print_bundle_")
+        try:
+            result = build_print_bundle(documents, output)
+        except Exception:
+            output.close()
+            raise
+    except BundleError as exc:
+        return Response({"error": "INVALID_SELECTION", "detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    output.seek(0)
+    response = FileResponse(output, content_type="application/pdf")
+    response["Content-Disposition"] = f'inline; filename="Print_Bundle_{timezone.now():%Y%m%d_%H%M%S}.pdf"'
+    response["X-Bundle-Documents"] = str(result["documents"])
+    response["X-Bundle-Pages"] = str(result["pages"])
+    return response
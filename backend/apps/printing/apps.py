@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class PrintingConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.printing"
+
+    def ready(self):
+        import apps.printing.signals  # noqa
@@ -0,0 +1,292 @@
+"""
+Print bundles: one merged PDF of published reports and receipts.
+
+Documents are selected by visit, by a list of work items, or by date range
+(reports by published_at, receipts by issued_at), grouped per visit so a
+multi-item visit prints as one section: receipt first, then its reports in
+item order. Stored snapshot PDFs are used as-is; missing ones are rendered with
+the regular generators (and stored on the snapshot).
+
+The bundle starts with a table-of-contents page and carries PDF bookmarks per
+visit and document. Rendered sources are spooled to disk and page counts are
+read with a reader that is closed straight away. pypdf assembles the merged
+document in memory before writing it to the temporary file the view streams,
+so peak memory grows with the total size of the bundle;
+settings.PRINT_BUNDLE_MAX_DOCUMENTS is what bounds it.
+"""
+
+import logging
+import math
+import os
+import tempfile
+from dataclasses import dataclass, field
+from datetime import date
+from io import BytesIO
+from typing import Callable, IO, Iterable, List, Optional
+
+from django.db.models import F, Q
+
+logger = logging.getLogger(__name__)
+
+TOC_ROWS_PER_PAGE = 32
+DOCUMENT_KINDS = ("receipts", "reports")
+
+
+class BundleError(ValueError):
+    """The bundle request is invalid (no selection, too many documents, ...)."""
+
+
+@dataclass
+class BundleDocument:
+    visit_id: str
+    patient_name: str
+    kind: str
+    title: str
+    path: Optional[str] = None
+    render: Optional[Callable[[], bytes]] = field(default=None, repr=False)
+    pages: int = 0
+    start_page: int = 0
+
+
+def _receipt_document(visit, snapshot) -> BundleDocument:
+    from apps.workflow.pdf import build_receipt_pdf_from_snapshot, ensure_receipt_pdf_for_snapshot
+
+    document = BundleDocument(
+        visit_id=visit.visit_id,
+        patient_name=visit.patient.name,
+        kind="receipt",
+        title=f"Receipt {snapshot.receipt_number}",
+    )
+    if ensure_receipt_pdf_for_snapshot(snapshot):
+        try:
+            document.path = snapshot.pdf_file.path
+            return document
+        except NotImplementedError:
+            pass
+    document.render = lambda: build_receipt_pdf_from_snapshot(snapshot).read()
+    return document
+
+
+def _report_document(item, snapshot) -> BundleDocument:
+    document = BundleDocument(
+        visit_id=item.service_visit.visit_id,
+        patient_name=item.service_visit.patient.name,
+        kind="report",
+        title=f"{item.service_name_snapshot} report (v{snapshot.version})",
+    )
+    if snapshot.pdf_file:
+        try:
+            if os.path.exists(snapshot.pdf_file.path):
+                document.path = snapshot.pdf_file.path
+                return document
+        except NotImplementedError:
+            pass
+
+    def render():
+        from apps.reporting.pdf_engine.report_pdf_v2 import generate_report_pdf_v2
+        from apps.reporting.services.snapshot_store import attach_pdf
+
+        pdf_bytes = generate_report_pdf_v2(
+            str(snapshot.report_instance_v2_id), snapshot.narrative_json, content_hash=snapshot.content_hash
+        )
+        attach_pdf(snapshot, pdf_bytes)
+        snapshot.save(update_fields=["pdf_file", "pdf_sha256"])
+        return pdf_bytes
+
+    document.render = render
+    return document
+
+
+def collect_bundle_documents(
+    visit_id: Optional[str] = None,
+    item_ids: Optional[Iterable[str]] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    include: Iterable[str] = DOCUMENT_KINDS,
+    max_documents: Optional[int] = None,
+) -> List[BundleDocument]:
+    """Resolve a selection to an ordered list of documents, grouped by visit."""
+    from apps.reporting.models import ReportPublishSnapshotV2
+    from apps.workflow.models import Invoice, ReceiptSnapshot, ServiceVisit, ServiceVisitItem
+    from apps.workflow.receipts import get_receipt_snapshot_data
+
+    include = set(include) & set(DOCUMENT_KINDS)
+    if not include:
+        raise BundleError("Nothing to include; choose receipts and/or reports.")
+
+    items = ServiceVisitItem.objects.select_related("service_visit__patient")
+    receipt_filter = None
+    visits = None
+    if visit_id:
+        visit_filter = Q(visit_id=visit_id)
+        if _is_uuid(visit_id):
+            visit_filter |= Q(id=visit_id)
+        visits = list(ServiceVisit.objects.select_related("patient").filter(visit_filter))
+        if not visits:
+            raise BundleError("Visit not found.")
+        items = items.filter(service_visit__in=visits)
+    elif item_ids:
+        items = items.filter(id__in=list(item_ids))
+    elif date_from and date_to:
+        if date_from > date_to:
+            raise BundleError("date_from must not be after date_to.")
+        items = items.filter(published_at__date__gte=date_from, published_at__date__lte=date_to)
+        receipt_filter = Q(issued_at__date__gte=date_from, issued_at__date__lte=date_to)
+    else:
+        raise BundleError("Provide visit_id, item_ids, or date_from and date_to.")
+
+    items = list(items.order_by("created_at"))
+    if visits is None:
+        visit_pks = {item.service_visit_id for item in items}
+        if receipt_filter is not None and "receipts" in include:
+            visit_pks.update(ReceiptSnapshot.objects.filter(receipt_filter).values_list("service_visit_id", flat=True))
+        visits = list(ServiceVisit.objects.select_related("patient").filter(id__in=visit_pks))
+    visits.sort(key=lambda visit: (visit.registered_at, visit.visit_id))
+
+    latest_snapshots = {}
+    if "reports" in include:
+        snapshots = ReportPublishSnapshotV2.objects.filter(report_instance_v2__work_item__in=items).annotate(
+            work_item_id=F("report_instance_v2__work_item_id")
+        )
+        for snapshot in snapshots.order_by("report_instance_v2_id", "-version"):
+            latest_snapshots.setdefault(snapshot.work_item_id, snapshot)
+
+    receipts = {}
+    invoices = {}
+    if "receipts" in include:
+        snapshots = ReceiptSnapshot.objects.filter(service_visit__in=visits)
+        if receipt_filter is not None:
+            snapshots = snapshots.filter(receipt_filter)
+        else:
+            # Visits billed before receipt snapshots existed get one built on the fly.
+            invoices = {invoice.service_visit_id: invoice for invoice in Invoice.objects.filter(service_visit__in=visits)}
+        receipts = {snapshot.service_visit_id: snapshot for snapshot in snapshots}
+
+    items_by_visit = {}
+    for item in items:
+        items_by_visit.setdefault(item.service_visit_id, []).append(item)
+
+    documents: List[BundleDocument] = []
+    for visit in visits:
+        snapshot = receipts.get(visit.id)
+        invoice = invoices.get(visit.id)
+        if snapshot is None and invoice is not None and invoice.receipt_number:
+            snapshot = get_receipt_snapshot_data(visit, invoice)
+        if snapshot is not None:
+            snapshot.service_visit = visit
+            documents.append(_receipt_document(visit, snapshot))
+        for item in items_by_visit.get(visit.id, []):
+            snapshot = latest_snapshots.get(item.id)
+            if snapshot is not None:
+                item.service_visit = visit
+                documents.append(_report_document(item, snapshot))
+        if max_documents and len(documents) > max_documents:
+            raise BundleError(f"Selection has more than {max_documents} documents; narrow it down.")
+    return documents
+
+
+def _is_uuid(value) -> bool:
+    import uuid
+
+    try:
+        uuid.UUID(str(value))
+    except ValueError:
+        return False
+    return True
+
+
+def _render_toc(documents: List[BundleDocument], toc_pages: int, title: str) -> bytes:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    styles = getSampleStyleSheet()
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=15 * mm, rightMargin=15 * mm, topMargin=15 * mm, bottomMargin=15 * mm)
+    rows = [["#", "Visit", "Patient", "Document", "Page"]]
+    for index, document in enumerate(documents, start=1):
+        rows.append(
+            [
+                str(index),
+                document.visit_id,
+                Paragraph(document.patient_name, styles["BodyText"]),
+                Paragraph(document.title, styles["BodyText"]),
+                str(document.start_page + toc_pages),
+            ]
+        )
+    table = Table(rows, colWidths=[10 * mm, 30 * mm, 50 * mm, 70 * mm, 15 * mm], repeatRows=1)
+    table.setStyle(
+        TableStyle(
+            [
+                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+                ("FONTSIZE", (0, 0), (-1, -1), 9),
+                ("LINEBELOW", (0, 0), (-1, 0), 0.6, colors.black),
+                ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#f3f4f6")]),
+                ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+                ("ALIGN", (-1, 0), (-1, -1), "RIGHT"),
+            ]
+        )
+    )
+    doc.build([Paragraph(title, styles["Title"]), Spacer(1, 4 * mm), table])
+    return buffer.getvalue()
+
+
+def _page_count(path: str) -> int:
+    from pypdf import PdfReader
+
+    with open(path, "rb") as handle:
+        return len(PdfReader(handle).pages)
+
+
+def build_print_bundle(documents: List[BundleDocument], output: IO[bytes], title: str = "Print bundle") -> dict:
+    """Merge documents behind a table of contents into output; returns page/document counts."""
+    from pypdf import PdfReader, PdfWriter
+
+    if not documents:
+        raise BundleError("No printable documents match the selection.")
+
+    with tempfile.TemporaryDirectory(prefix="print_bundle_") as workdir:
+        page = 1
+        for index, document in enumerate(documents):
+            if document.path is None:
+                # Rendered documents are spooled to disk so they are not kept in memory.
+                path = os.path.join(workdir, f"{index}.pdf")
+                with open(path, "wb") as handle:
+                    handle.write(document.render())
+                document.path = path
+            document.pages = _page_count(document.path)
+            document.start_page = page
+            page += document.pages
+
+        toc_pages = max(1, math.ceil(len(documents) / TOC_ROWS_PER_PAGE))
+        for _ in range(3):
+            toc_bytes = _render_toc(documents, toc_pages, title)
+            actual = len(PdfReader(BytesIO(toc_bytes)).pages)
+            if actual == toc_pages:
+                break
+            toc_pages = actual
+
+        writer = PdfWriter()
+        writer.append(PdfReader(BytesIO(toc_bytes)), import_outline=False)
+        visit_outline = {}
+        for document in documents:
+            start = len(writer.pages)
+            writer.append(document.path, import_outline=False)
+            parent = visit_outline.get(document.visit_id)
+            if parent is None:
+                parent = writer.add_outline_item(f"{document.visit_id} - {document.patient_name}", start)
+                visit_outline[document.visit_id] = parent
+            writer.add_outline_item(document.title, start, parent=parent)
+        if hasattr(writer, "compress_identical_objects"):
+            # Every receipt/report embeds the same logo; keep one copy.
+            writer.compress_identical_objects()
+        writer.write(output)
+        total_pages = len(writer.pages)
+
+    logger.info(
+        "print_bundle_built",
+        extra={"event": "print_bundle_built", "documents": len(documents), "pages": total_pages},
+    )
+    return {"documents": len(documents), "pages": total_pages, "toc_pages": toc_pages}
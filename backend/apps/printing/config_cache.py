@@ -0,0 +1,122 @@
+"""
+Per-worker cache of the branding singletons used by every PDF and print path.
+
+ReportingOrganizationConfig (report header, logo, disclaimer, signatories) and
+ReceiptBrandingConfig (receipt header/footer, logo, banner) are loaded once per
+worker process and shared read-only. The snapshot carries a config version: the
+newest updated_at of the two rows in microseconds, so it only ever increases
+(deleting one row touches the other). Dependent caches (report previews, print
+payloads) key on this version instead of re-querying; receipts key on
+receipt_version, the ReceiptBrandingConfig stamp alone, so editing the report
+header does not re-render stored receipt PDFs.
+
+Invalidation:
+- post_save/post_delete on either model drops this worker's snapshot at once and
+  again on commit, and publishes the new version in the Django cache;
+- other workers reload when the published version is newer than theirs, or at
+  the latest after PRINT_CONFIG_CACHE_TTL seconds (the default local-memory
+  cache is per process, so the TTL bounds staleness across workers).
+
+Snapshots are not stored while a transaction is open, so rows written by a
+transaction that later rolls back never end up in the cache.
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+VERSION_CACHE_KEY = "printing:config_version"
+
+
+@dataclass(frozen=True)
+class PrintConfig:
+    org: Optional[object]
+    receipt: object
+    version: int
+    receipt_version: int
+    loaded_at: float
+
+
+_lock = threading.RLock()
+_snapshot: Optional[PrintConfig] = None
+
+
+def _stamp(value) -> int:
+    return int(value.timestamp() * 1_000_000) if value else 0
+
+
+def _ttl() -> float:
+    return float(getattr(settings, "PRINT_CONFIG_CACHE_TTL", 30) or 0)
+
+
+def _load() -> PrintConfig:
+    from apps.printing.models import ReceiptBrandingConfig
+    from apps.reporting.models import ReportingOrganizationConfig
+
+    org = ReportingOrganizationConfig.objects.first()
+    receipt = ReceiptBrandingConfig.get_singleton()
+    receipt_version = _stamp(receipt.updated_at)
+    version = max(_stamp(org.updated_at) if org else 0, receipt_version)
+    return PrintConfig(
+        org=org, receipt=receipt, version=version, receipt_version=receipt_version, loaded_at=time.monotonic()
+    )
+
+
+def _is_fresh(snapshot: Optional[PrintConfig]) -> bool:
+    if snapshot is None or time.monotonic() - snapshot.loaded_at >= _ttl():
+        return False
+    published = cache.get(VERSION_CACHE_KEY)
+    return published is None or published <= snapshot.version
+
+
+def get_print_config() -> PrintConfig:
+    """Organization + receipt branding snapshot for this worker (treat as read-only)."""
+    global _snapshot
+    snapshot = _snapshot
+    if _is_fresh(snapshot):
+        return snapshot
+    with _lock:
+        if _is_fresh(_snapshot):
+            return _snapshot
+        snapshot = _load()
+        if not connection.in_atomic_block:
+            _snapshot = snapshot
+    return snapshot
+
+
+def print_config_version() -> int:
+    """Monotonically increasing version of the branding configuration."""
+    return get_print_config().version
+
+
+def invalidate_print_config(version: Optional[int] = None) -> None:
+    """Drop this worker's snapshot; publish version (when given) to the other workers."""
+    global _snapshot
+    with _lock:
+        _snapshot = None
+    if version:
+        cache.set(VERSION_CACHE_KEY, version, None)
+
+
+def config_saved(sender, instance, **kwargs):
+    version = _stamp(instance.updated_at)
+    invalidate_print_config()
+    transaction.on_commit(lambda: invalidate_print_config(version))
+
+
+def config_deleted(sender, instance, **kwargs):
+    from apps.printing.models import ReceiptBrandingConfig
+    from apps.reporting.models import ReportingOrganizationConfig
+
+    # Keep the version moving forward: the surviving row becomes the newest.
+    now = timezone.now()
+    other = ReceiptBrandingConfig if sender is ReportingOrganizationConfig else ReportingOrganizationConfig
+    other.objects.update(updated_at=now)
+    invalidate_print_config()
+    transaction.on_commit(lambda: invalidate_print_config(_stamp(now)))
@@ -0,0 +1,141 @@
+"""
+Print-resolution derivatives of branding images (report logo, receipt logo and
+banner).
+
+Uploads are often multi-megabyte phone photos; embedding them as-is bloats
+every PDF and costs a full decode per render. On upload a derivative is made
+that is sized to the box the image is drawn in at PRINT_IMAGE_DPI, with EXIF
+orientation applied: a JPEG for opaque images, an optimized PNG when the image
+has transparency. It is stored next to the original as <dir>/print/<stem>.<ext>.
+A derivative that is missing or older than its original (e.g. a logo uploaded
+before this existed) is built on first use.
+
+PDF engines decode each derivative once per worker through cached_image_reader().
+"""
+
+import logging
+import os
+from functools import lru_cache
+from io import BytesIO
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+from reportlab.lib.utils import ImageReader
+
+logger = logging.getLogger(__name__)
+
+# Boxes the images are drawn into (width, height in mm): the report header logo
+# slot, and the receipt logo and banner (full receipt content width).
+DERIVATIVE_BOXES_MM = {
+    "report_logo": (28, 18),
+    "receipt_logo": (40, 15),
+    "receipt_banner": (180, 18),
+}
+JPEG_QUALITY = 85
+
+
+def _dpi() -> int:
+    return int(getattr(settings, "PRINT_IMAGE_DPI", 300) or 300)
+
+
+def _target_pixels(kind: str) -> Tuple[int, int]:
+    width_mm, height_mm = DERIVATIVE_BOXES_MM[kind]
+    dpi = _dpi()
+    return max(1, round(width_mm / 25.4 * dpi)), max(1, round(height_mm / 25.4 * dpi))
+
+
+def _has_alpha(image: Image.Image) -> bool:
+    return image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+
+
+def make_print_derivative(source, kind: str) -> Tuple[bytes, str]:
+    """Downscaled, recompressed copy of source (path or file) for kind; returns (bytes, extension)."""
+    with Image.open(source) as opened:
+        image = ImageOps.exif_transpose(opened)
+        image.thumbnail(_target_pixels(kind), Image.LANCZOS)
+        output = BytesIO()
+        if _has_alpha(image):
+            image.convert("RGBA").save(output, format="PNG", optimize=True)
+            return output.getvalue(), "png"
+        image.convert("RGB").save(output, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+        return output.getvalue(), "jpg"
+
+
+def derivative_name(name: str, extension: str) -> str:
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return "/".join(part for part in (directory, "print", f"{stem}.{extension}") if part)
+
+
+def _existing_derivative(field_file) -> Optional[str]:
+    storage = field_file.storage
+    for extension in ("jpg", "png"):
+        name = derivative_name(field_file.name, extension)
+        if storage.exists(name):
+            return name
+    return None
+
+
+def store_print_derivative(field_file, kind: str) -> Optional[str]:
+    """(Re)build the derivative of an uploaded image; returns its storage name, None on failure."""
+    if not field_file:
+        return None
+    storage = field_file.storage
+    try:
+        with field_file.storage.open(field_file.name, "rb") as source:
+            data, extension = make_print_derivative(source, kind)
+    except Exception as exc:
+        logger.warning(
+            "print_derivative_failed",
+            extra={"event": "print_derivative_failed", "kind": kind, "image": field_file.name, "error": str(exc)},
+        )
+        return None
+
+    for stale in ("jpg", "png"):
+        stale_name = derivative_name(field_file.name, stale)
+        if storage.exists(stale_name):
+            storage.delete(stale_name)
+    name = storage.save(derivative_name(field_file.name, extension), ContentFile(data))
+    logger.info(
+        "print_derivative_stored",
+        extra={"event": "print_derivative_stored", "kind": kind, "image": name, "bytes": len(data)},
+    )
+    return name
+
+
+def print_image_path(field_file, kind: str) -> Optional[str]:
+    """
+    Local path to draw for an image field: the print derivative (built if missing
+    or stale), else the original. Plain path strings are returned when they exist.
+    """
+    if not field_file:
+        return None
+    if isinstance(field_file, str):
+        return field_file if os.path.exists(field_file) else None
+    try:
+        original = field_file.path
+    except (NotImplementedError, ValueError):
+        return None
+    if not os.path.exists(original):
+        return None
+
+    storage = field_file.storage
+    name = _existing_derivative(field_file)
+    if name is not None and os.path.getmtime(storage.path(name)) < os.path.getmtime(original):
+        name = None
+    if name is None:
+        name = store_print_derivative(field_file, kind)
+    return storage.path(name) if name else original
+
+
+@lru_cache(maxsize=32)
+def _image_reader(path: str, mtime_ns: int, size: int) -> ImageReader:
+    return ImageReader(path)
+
+
+def cached_image_reader(path: str) -> ImageReader:
+    """Decoded ImageReader for path, reused by this worker until the file changes."""
+    stat = os.stat(path)
+    return _image_reader(path, stat.st_mtime_ns, stat.st_size)
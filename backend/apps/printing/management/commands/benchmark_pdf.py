@@ -0,0 +1,296 @@
+import json
+import math
+import multiprocessing
+import random
+import re
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.printing.render_pool import _warm_worker
+from apps.reporting.pdf_engine.report_pdf_v2 import render_report_pdf_v2
+from apps.workflow.pdf_engine.prescription import render_prescription_pdf
+from apps.workflow.pdf_engine.receipt import render_receipt_pdf
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+KINDS = ("report", "receipt", "prescription")
+REPORT_PAGES = (1, 2, 5, 10, 20)
+RECEIPT_SERVICES = (1, 10, 30, 60)
+PRESCRIPTION_MEDICINES = (5, 25, 100)
+
+# Roughly one A4 page of findings: blocks of ~70-word paragraphs.
+FINDINGS_BLOCKS_PER_PAGE = 6
+
+WORDS = (
+    "liver spleen kidney normal size echotexture measures mm cortical differentiation maintained "
+    "no focal lesion calculus hydronephrosis seen gall bladder wall thickness portal vein "
+    "diameter within limits mild moderate echogenic cyst septations vascularity doppler"
+).split()
+SERVICES = ("USG Abdomen", "USG Pelvis", "X-Ray Chest PA", "CT Brain Plain", "Doppler Lower Limb Arterial and Venous")
+MEDICINES = ("Paracetamol 500mg", "Omeprazole 20mg", "Amoxicillin 500mg", "Cetirizine 10mg", "Metformin 500mg")
+
+_PAGE_RE = re.compile(rb"/Type\s*/Page(?![s\w])")
+
+
+def _percentile(samples, pct):
+    if not samples:
+        return 0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def synthetic_report(rng, pages):
+    blocks = pages * FINDINGS_BLOCKS_PER_PAGE
+    return {
+        "header": {"logo_path": "", "center_lines": ["Benchmark Imaging Centre", "1 Test Road"], "right_lines": ["Dr Bench"]},
+        "patient": {
+            "name": "Benchmark Patient",
+            "age": "45",
+            "sex": "F",
+            "mrn": "MRN-0001",
+            "mobile": "0300-0000000",
+            "ref_no": "BV-0001",
+            "referred_by": "Dr Referrer",
+            "study_datetime": "2026-01-01 09:00",
+            "report_datetime": "2026-01-01 10:00",
+            "clinical_indication": _sentence(rng, 12),
+        },
+        "report_title": "ULTRASOUND ABDOMEN",
+        "sections": {
+            "technique": [_sentence(rng, 20)],
+            "comparison": ["None available."],
+            "findings": [
+                {"heading": f"Organ {index + 1}", "paragraphs": [_sentence(rng, 70)]} for index in range(blocks)
+            ],
+            "measurements": [
+                {"label": f"Measurement {index + 1}", "value": f"{rng.uniform(1, 150):.1f} mm", "unit": ""}
+                for index in range(12)
+            ],
+            "impression": [_sentence(rng, 25) for _ in range(max(3, pages * 2))],
+            "recommendations": [_sentence(rng, 15)],
+        },
+        "signatories": [
+            {"verification_label": "Electronically Verified", "name": "Dr Bench", "credentials": "MBBS, FCPS", "registration": ""}
+        ],
+        "footer": {"disclaimer": "Benchmark disclaimer."},
+    }
+
+
+def synthetic_receipt(rng, services):
+    lines = [(f"{rng.choice(SERVICES)} {index + 1}", f"Rs. {rng.randint(5, 80) * 100:.2f}") for index in range(services)]
+    return {
+        "receipt_number": "2601-0001",
+        "visit_id": "BV-0001",
+        "date": "2026-01-01 09:00:00",
+        "cashier": "Bench Cashier",
+        "patient_reg_no": "REG-0001",
+        "mrn": "MRN-0001",
+        "patient_name": "Benchmark Patient",
+        "age": "45",
+        "gender": "F",
+        "phone": "0300-0000000",
+        "consultant": "Dr Referrer",
+        "services": lines,
+        "total_amount": "Rs. 10000.00",
+        "discount_text": "Rs. 0.00",
+        "net_amount": "Rs. 10000.00",
+        "paid_amount": "Rs. 10000.00",
+        "balance_amount": "Rs. 0.00",
+        "payment_method": "CASH",
+    }
+
+
+def synthetic_prescription(rng, medicines):
+    return {
+        "visit_id": "BV-0001",
+        "patient_reg_no": "REG-0001",
+        "patient_name": "Benchmark Patient",
+        "age": "45",
+        "gender": "F",
+        "diagnosis": "\n".join(_sentence(rng, 8) for _ in range(3)),
+        "medicines": [
+            {"name": rng.choice(MEDICINES), "dosage": "1 tab", "frequency": "BD", "duration": f"{rng.randint(3, 30)} days"}
+            for _ in range(medicines)
+        ],
+        "investigations": [_sentence(rng, 4) for _ in range(max(1, medicines // 5))],
+        "advice": "\n".join(_sentence(rng, 12) for _ in range(3)),
+        "followup": "2 weeks",
+        "consultant": "dr.bench",
+        "consult_at": "2026-01-01 09:00:00",
+    }
+
+
+BRANDING = {"header_text": "Benchmark Imaging Centre", "footer_text": "1 Test Road\nTel: 000", "header_image": None, "logo_image": None}
+
+
+def build_cases(kinds, seed):
+    """[(name, renderer, args)] for the selected document kinds; data is deterministic per seed."""
+    rng = random.Random(seed)
+    cases = []
+    if "report" in kinds:
+        for pages in REPORT_PAGES:
+            cases.append((f"report_{pages}p", render_report_pdf_v2, (synthetic_report(rng, pages),)))
+    if "receipt" in kinds:
+        for services in RECEIPT_SERVICES:
+            cases.append((f"receipt_{services}svc", render_receipt_pdf, (synthetic_receipt(rng, services), BRANDING)))
+    if "prescription" in kinds:
+        for medicines in PRESCRIPTION_MEDICINES:
+            cases.append((f"prescription_{medicines}med", render_prescription_pdf, (synthetic_prescription(rng, medicines),)))
+    return cases
+
+
+def _max_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _measure_rss(renderer, args):
+    """Runs in a fresh, warmed-up spawned process: (peak RSS before, after rendering once) in KiB."""
+    before = _max_rss_kb()
+    renderer(*args)
+    return before, _max_rss_kb()
+
+
+class Command(BaseCommand):
+    help = "Benchmark ReportLab rendering of reports, receipts and prescriptions over synthetic documents"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--kinds", type=str, default=",".join(KINDS), help="Comma-separated: report,receipt,prescription")
+        parser.add_argument("--iterations", type=int, default=5, help="Timed renders per document")
+        parser.add_argument("--seed", type=int, default=1234, help="Random seed for synthetic documents")
+        parser.add_argument(
+            "--no-rss",
+            action="store_true",
+            help="Skip peak RSS (measured by rendering each document once in a fresh process)",
+        )
+        parser.add_argument("--output", type=str, help="Write the JSON report to this path")
+        parser.add_argument("--baseline", type=str, help="Previous JSON report to compare against")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=1.5,
+            help="Fail when time, memory or size exceeds baseline by this factor (default 1.5)",
+        )
+
+    def handle(self, *args, **options):
+        kinds = [kind.strip() for kind in options["kinds"].split(",") if kind.strip()]
+        unknown = sorted(set(kinds) - set(KINDS))
+        if unknown or not kinds:
+            raise CommandError(f"Unknown kinds: {', '.join(unknown) or '(none)'}; choose from {', '.join(KINDS)}")
+
+        report = self._run(build_cases(kinds, options["seed"]), options)
+        self._print_report(report)
+
+        if options.get("output"):
+            Path(options["output"]).write_text(json.dumps(report, indent=2, sort_keys=True))
+            self.stdout.write(f"Report written to {options['output']}")
+
+        failures = self._check(report, options)
+        if failures:
+            for failure in failures:
+                self.stderr.write(self.style.ERROR(failure))
+            raise CommandError(f"PDF benchmark failed: {len(failures)} check(s)")
+        self.stdout.write(self.style.SUCCESS("PDF benchmark passed"))
+
+    def _run(self, cases, options):
+        iterations = max(1, options["iterations"])
+        measure_rss = not options["no_rss"] and resource is not None
+        results = {}
+        rss_pool = None
+        if measure_rss:
+            # The initializer sets Django up before the task (which imports this module) is unpickled.
+            rss_pool = multiprocessing.get_context("spawn").Pool(
+                processes=1, maxtasksperchild=1, initializer=_warm_worker
+            )
+        try:
+            for name, renderer, args in cases:
+                try:
+                    pdf_bytes = renderer(*args)  # warm-up, also the size/page sample
+                except Exception as exc:
+                    results[name] = {"error": f"{type(exc).__name__}: {exc}"[:500]}
+                    continue
+
+                samples_ns = []
+                for _ in range(iterations):
+                    start = time.perf_counter_ns()
+                    renderer(*args)
+                    samples_ns.append(time.perf_counter_ns() - start)
+
+                tracemalloc.start()
+                try:
+                    renderer(*args)
+                    alloc_peak = tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+
+                result = {
+                    "p50_ms": round(_percentile(samples_ns, 50) / 1e6, 3),
+                    "p95_ms": round(_percentile(samples_ns, 95) / 1e6, 3),
+                    "output_bytes": len(pdf_bytes),
+                    "pages": len(_PAGE_RE.findall(pdf_bytes)),
+                    "alloc_peak_bytes": alloc_peak,
+                }
+                if rss_pool is not None:
+                    before, after = rss_pool.apply(_measure_rss, (renderer, args))
+                    result["peak_rss_kb"] = after
+                    result["rss_growth_kb"] = after - before
+                results[name] = result
+        finally:
+            if rss_pool is not None:
+                rss_pool.close()
+                rss_pool.join()
+
+        return {"seed": options["seed"], "iterations": iterations, "documents": results}
+
+    def _print_report(self, report):
+        self.stdout.write(self.style.MIGRATE_HEADING("PDF render benchmark"))
+        self.stdout.write(f"Iterations: {report['iterations']}  Seed: {report['seed']}")
+        for name, result in report["documents"].items():
+            if "error" in result:
+                self.stdout.write(f"{name:<20} ERROR {result['error']}")
+                continue
+            rss = f"{result['peak_rss_kb']:>8} KiB" if "peak_rss_kb" in result else "       - KiB"
+            self.stdout.write(
+                f"{name:<20} p50 {result['p50_ms']:>9.2f} ms  p95 {result['p95_ms']:>9.2f} ms  "
+                f"{result['pages']:>3} pages  {result['output_bytes']:>8} B  rss {rss}"
+            )
+
+    def _check(self, report, options):
+        failures = [
+            f"{name} failed to render: {result['error']}"
+            for name, result in report["documents"].items()
+            if "error" in result
+        ]
+        baseline_path = options.get("baseline")
+        if not baseline_path:
+            return failures
+        try:
+            baseline = json.loads(Path(baseline_path).read_text())
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Cannot read baseline {baseline_path}: {exc}")
+
+        threshold = options["threshold"]
+        for name, result in report["documents"].items():
+            base = (baseline.get("documents") or {}).get(name) or {}
+            for metric in ("p50_ms", "p95_ms", "output_bytes", "peak_rss_kb"):
+                if metric not in result or not base.get(metric):
+                    continue
+                if result[metric] > base[metric] * threshold:
+                    failures.append(
+                        f"{name} {metric} regressed: {result[metric]} vs baseline {base[metric]} (threshold x{threshold})"
+                    )
+        return failures
@@ -0,0 +1,51 @@
+"""
+Page furniture drawn once per PDF as a form XObject and placed by reference.
+
+Report headers/footers repeat on every page and the receipt branding block and
+footer repeat on both copies of every page. place_form() records the drawing
+the first time a form name is used on a canvas and emits a one-operator
+reference ("/Form Do") afterwards, so the logo, org text and rules are written
+to the file once instead of once per page and copy.
+
+Forms cannot be shared between PDF files; across documents the expensive parts
+(decoded images, text widths and wraps) are already cached per worker by
+apps.printing.images and apps.printing.text_layout.
+"""
+
+import hashlib
+import json
+from typing import Callable, Optional, Tuple
+
+
+def form_name(prefix: str, key) -> str:
+    """Stable form name for prefix + any JSON-serialisable key (e.g. content drawn, box size)."""
+    digest = hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return f"{prefix}_{digest[:16]}"
+
+
+def place_form(
+    canvas,
+    name: str,
+    draw: Callable,
+    origin: Tuple[float, float] = (0, 0),
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+):
+    """
+    Place form `name` with its origin at `origin`; on first use on this canvas,
+    draw(canvas) records it (in form coordinates, clipped to bbox, default the page).
+
+    Returns what draw() returned when the form was recorded, so callers can keep
+    layout results such as the height used.
+    """
+    results = canvas.__dict__.setdefault("_page_form_results", {})
+    if name not in results:
+        lower_x, lower_y, upper_x, upper_y = bbox or (0, 0, None, None)
+        canvas.beginForm(name, lower_x, lower_y, upper_x, upper_y)
+        results[name] = draw(canvas)
+        canvas.endForm()
+
+    canvas.saveState()
+    canvas.translate(*origin)
+    canvas.doForm(name)
+    canvas.restoreState()
+    return results[name]
@@ -0,0 +1,157 @@
+"""
+Serving stored PDFs: streamed, conditional and range-capable.
+
+Published reports, receipts and prescriptions are immutable files, so responses
+carry a strong ETag (a content hash where one is stored) and honour
+If-None-Match / If-Modified-Since (304), Range / If-Range (206, single range)
+and stream from disk in chunks instead of reading the file into memory.
+
+Settings:
+- PDF_SENDFILE_HEADER: hand the body off to the reverse proxy, e.g.
+  "X-Accel-Redirect" (nginx, Caddy) or "X-Sendfile" (Apache/lighttpd).
+  Empty (default) streams from Django.
+- PDF_SENDFILE_PREFIX: internal location the proxy maps to MEDIA_ROOT, used as
+  the X-Accel-Redirect value prefix (e.g. "/protected-media/"). When empty the
+  absolute file path is sent, as X-Sendfile expects.
+
+The proxy handles Range itself when it serves the file.
+"""
+
+import os
+import re
+from pathlib import Path
+from typing import Optional
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags
+
+CHUNK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def file_etag(path) -> str:
+    """Cheap validator for files without a stored content hash: mtime + size."""
+    stat = os.stat(path)
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def _quote_etag(etag: str) -> str:
+    return etag if etag.startswith(('"', 'W/"')) else f'"{etag}"'
+
+
+def _parse_range(header: str, size: int):
+    """Return (start, end) inclusive, None for no/ignored range, or False if unsatisfiable."""
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        # Multi-range and malformed headers fall back to the full body.
+        return None
+    first, last = match.groups()
+    if first == "" and last == "":
+        return None
+    if first == "":
+        length = int(last)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _iter_file_range(path, start: int, length: int):
+    with open(path, "rb") as handle:
+        handle.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = handle.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _sendfile_value(path: Path) -> Optional[str]:
+    prefix = getattr(settings, "PDF_SENDFILE_PREFIX", "") or ""
+    if not prefix:
+        return str(path)
+    media_root = Path(settings.MEDIA_ROOT).resolve()
+    try:
+        relative = path.resolve().relative_to(media_root)
+    except ValueError:
+        return None
+    return f"{prefix.rstrip('/')}/{quote(relative.as_posix())}"
+
+
+def serve_pdf_file(
+    request,
+    path,
+    *,
+    filename: str,
+    etag: Optional[str] = None,
+    last_modified: Optional[float] = None,
+    disposition: str = "inline",
+):
+    """Stream a PDF from disk with ETag/Last-Modified, conditional GET and Range support."""
+    path = Path(path)
+    stat = path.stat()
+    etag = _quote_etag(etag) if etag else file_etag(path)
+    last_modified = last_modified if last_modified is not None else stat.st_mtime
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    sendfile_header = getattr(settings, "PDF_SENDFILE_HEADER", "") or ""
+    sendfile_value = _sendfile_value(path) if sendfile_header else None
+    size = stat.st_size
+    byte_range = None
+    range_header = request.META.get("HTTP_RANGE")
+    if range_header and not sendfile_value:
+        if_range = request.META.get("HTTP_IF_RANGE")
+        if not if_range or etag in parse_etags(if_range):
+            byte_range = _parse_range(range_header, size)
+
+    if sendfile_value:
+        response = HttpResponse(content_type="application/pdf")
+        response[sendfile_header] = sendfile_value
+    elif byte_range is False:
+        response = HttpResponse(status=416, content_type="application/pdf")
+        response["Content-Range"] = f"bytes */{size}"
+    elif byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            _iter_file_range(path, start, length), status=206, content_type="application/pdf"
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = str(length)
+    else:
+        response = FileResponse(open(path, "rb"), content_type="application/pdf")
+        response.block_size = CHUNK_SIZE
+
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = "private, no-cache"
+    response["Content-Disposition"] = f'{disposition}; filename="{filename}"'
+    return response
+
+
+def serve_pdf_field(request, field_file, **kwargs):
+    """serve_pdf_file for a FileField; storages without local paths are streamed via open()."""
+    try:
+        path = field_file.path
+    except NotImplementedError:
+        response = FileResponse(field_file.open("rb"), content_type="application/pdf")
+        etag = kwargs.get("etag")
+        if etag:
+            response["ETag"] = _quote_etag(etag)
+        response["Content-Disposition"] = f'{kwargs.get("disposition", "inline")}; filename="{kwargs["filename"]}"'
+        return response
+    return serve_pdf_file(request, path, **kwargs)
@@ -0,0 +1,292 @@
+"""
+Out-of-process PDF rendering pool.
+
+ReportLab layout is CPU-bound; rendering inside a request ties up a sync worker
+(and, for publish, used to hold a DB transaction open). Callers gather all DB data
+in-process, then hand a plain payload to a module-level render function which runs
+in a pool of pre-warmed worker processes and returns the PDF bytes.
+
+Settings:
+- PDF_RENDER_WORKERS: worker processes per web process (0, the default, renders inline).
+- PDF_RENDER_TIMEOUT: seconds to wait for a render before failing the job; a
+  render still running then has its pool's workers terminated and replaced.
+- PDF_RENDER_MAX_PENDING: jobs queued or running at once (0 = 4 x workers);
+  beyond that submitters wait up to PDF_RENDER_QUEUE_TIMEOUT seconds and then
+  get RenderPoolBusy.
+
+Workers are spawned (not forked) so they never inherit DB connections or locks;
+each one sets Django up and warms ReportLab fonts/styles once.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+METRICS_WINDOW = 500
+
+
+class RenderError(RuntimeError):
+    """A render job could not be completed."""
+
+
+class RenderTimeout(RenderError):
+    pass
+
+
+class RenderPoolBusy(RenderError):
+    """Backpressure: too many render jobs are already queued."""
+
+
+def _warm_worker() -> None:
+    """Pool initializer: set Django up and pay ReportLab's first-use costs once."""
+    import django
+
+    django.setup()
+
+    from io import BytesIO
+
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfgen import canvas
+    from reportlab.platypus import Paragraph
+
+    getSampleStyleSheet()
+    for font_name in ("Helvetica", "Helvetica-Bold", "Helvetica-Oblique"):
+        pdfmetrics.getFont(font_name)
+    buffer = BytesIO()
+    warm_canvas = canvas.Canvas(buffer, pagesize=A4)
+    Paragraph("<b>warm</b> up", getSampleStyleSheet()["Normal"]).wrapOn(warm_canvas, 100, 100)
+    warm_canvas.save()
+
+
+def _run_job(fn: Callable, args: tuple) -> tuple:
+    start = time.perf_counter()
+    pdf_bytes = fn(*args)
+    return pdf_bytes, (time.perf_counter() - start) * 1000, os.getpid()
+
+
+def _percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class RenderPool:
+    def __init__(
+        self,
+        workers: int,
+        timeout: float = 60.0,
+        max_pending: int = 0,
+        queue_timeout: float = 5.0,
+    ):
+        self.workers = max(0, int(workers))
+        self.timeout = timeout
+        self.max_pending = max_pending or max(1, self.workers) * 4
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._counters = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "timeouts": 0,
+            "rejected": 0,
+            "pool_restarts": 0,
+        }
+        self._pending = 0
+        self._render_ms = deque(maxlen=METRICS_WINDOW)
+        self._wait_ms = deque(maxlen=METRICS_WINDOW)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_warm_worker,
+                )
+            return self._executor
+
+    def _reset_executor(self, broken: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+                self._counters["pool_restarts"] += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _recycle_executor(self, stuck: ProcessPoolExecutor) -> None:
+        """Kill a pool whose worker is stuck on a timed-out render; the next job starts a fresh one."""
+        with self._lock:
+            if self._executor is stuck:
+                self._executor = None
+                self._counters["pool_restarts"] += 1
+        # ProcessPoolExecutor cannot cancel a running job; terminating its workers
+        # fails the stuck future (and any other job in flight on this pool), which
+        # releases their backpressure slots.
+        for process in list((getattr(stuck, "_processes", None) or {}).values()):
+            process.terminate()
+        stuck.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, _future=None) -> None:
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def render(self, fn: Callable, *args, label: str = "", timeout: Optional[float] = None) -> bytes:
+        """Run fn(*args) -> bytes in a worker and return its result.
+
+        fn must be a module-level function and args picklable plain data.
+        """
+        queued_at = time.perf_counter()
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self._counters["rejected"] += 1
+            logger.warning("pdf_render_rejected", extra={"event": "pdf_render_rejected", "label": label})
+            raise RenderPoolBusy("PDF render queue is full; try again shortly.")
+        with self._lock:
+            self._pending += 1
+            self._counters["submitted"] += 1
+
+        if self.workers == 0:
+            try:
+                pdf_bytes, render_ms, pid = _run_job(fn, args)
+            except Exception:
+                self._record_failure(label)
+                raise
+            finally:
+                self._release()
+            return self._record_success(label, queued_at, render_ms, pid, pdf_bytes)
+
+        executor = self._get_executor()
+        try:
+            try:
+                future = executor.submit(_run_job, fn, args)
+            except (BrokenProcessPool, RuntimeError):
+                # A crashed worker breaks the whole executor; start a fresh one once.
+                self._reset_executor(executor)
+                executor = self._get_executor()
+                future = executor.submit(_run_job, fn, args)
+        except Exception:
+            self._release()
+            self._record_failure(label)
+            raise
+        # The slot is held until the job really finishes; a timed-out render
+        # holds it until its worker has been terminated.
+        future.add_done_callback(self._release)
+
+        try:
+            pdf_bytes, render_ms, pid = future.result(timeout=timeout if timeout is not None else self.timeout)
+        except FutureTimeoutError:
+            if not future.cancel():
+                # Already running: the worker would keep rendering and hold its slot.
+                self._recycle_executor(executor)
+            with self._lock:
+                self._counters["timeouts"] += 1
+            logger.error("pdf_render_timeout", extra={"event": "pdf_render_timeout", "label": label})
+            raise RenderTimeout(f"PDF render timed out after {timeout or self.timeout}s")
+        except BrokenProcessPool as exc:
+            self._reset_executor(executor)
+            self._record_failure(label)
+            raise RenderError(f"PDF render worker crashed: {exc}") from exc
+        except Exception:
+            self._record_failure(label)
+            raise
+        return self._record_success(label, queued_at, render_ms, pid, pdf_bytes)
+
+    def _record_failure(self, label: str) -> None:
+        with self._lock:
+            self._counters["failed"] += 1
+        logger.warning("pdf_render_failed", extra={"event": "pdf_render_failed", "label": label})
+
+    def _record_success(self, label, queued_at, render_ms, pid, pdf_bytes) -> bytes:
+        total_ms = (time.perf_counter() - queued_at) * 1000
+        wait_ms = max(0.0, total_ms - render_ms)
+        with self._lock:
+            self._counters["completed"] += 1
+            self._render_ms.append(render_ms)
+            self._wait_ms.append(wait_ms)
+        logger.info(
+            "pdf_render_job",
+            extra={
+                "event": "pdf_render_job",
+                "label": label,
+                "worker_pid": pid,
+                "render_ms": round(render_ms, 2),
+                "wait_ms": round(wait_ms, 2),
+                "total_ms": round(total_ms, 2),
+                "bytes": len(pdf_bytes),
+            },
+        )
+        return pdf_bytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            render_ms = list(self._render_ms)
+            wait_ms = list(self._wait_ms)
+            stats["pending"] = self._pending
+        stats.update(
+            {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "render_p50_ms": round(_percentile(render_ms, 50), 2),
+                "render_p95_ms": round(_percentile(render_ms, 95), 2),
+                "wait_p50_ms": round(_percentile(wait_ms, 50), 2),
+                "wait_p95_ms": round(_percentile(wait_ms, 95), 2),
+            }
+        )
+        return stats
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+_POOL: Optional[RenderPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_render_pool() -> RenderPool:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = RenderPool(
+                workers=int(getattr(settings, "PDF_RENDER_WORKERS", 0) or 0),
+                timeout=float(getattr(settings, "PDF_RENDER_TIMEOUT", 60) or 60),
+                max_pending=int(getattr(settings, "PDF_RENDER_MAX_PENDING", 0) or 0),
+                queue_timeout=float(getattr(settings, "PDF_RENDER_QUEUE_TIMEOUT", 5) or 0),
+            )
+        return _POOL
+
+
+def reset_render_pool() -> None:
+    """Shut the shared pool down; the next render re-reads settings."""
+    global _POOL
+    with _POOL_LOCK:
+        pool, _POOL = _POOL, None
+    if pool is not None:
+        pool.shutdown()
+
+
+def render_pdf(fn: Callable, *args, label: str = "", timeout: Optional[float] = None) -> bytes:
+    return get_render_pool().render(fn, *args, label=label, timeout=timeout)
+
+
+def render_pool_stats() -> dict:
+    return get_render_pool().stats()
@@ -0,0 +1,22 @@
+"""
+Branding config signals: keep the per-worker config cache current.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.reporting.models import ReportingOrganizationConfig
+
+from .config_cache import config_deleted, config_saved
+from .models import ReceiptBrandingConfig
+
+
+@receiver(post_save, sender=ReceiptBrandingConfig)
+@receiver(post_save, sender=ReportingOrganizationConfig)
+def branding_config_saved(sender, instance, **kwargs):
+    config_saved(sender, instance, **kwargs)
+
+
+@receiver(post_delete, sender=ReceiptBrandingConfig)
+@receiver(post_delete, sender=ReportingOrganizationConfig)
+def branding_config_deleted(sender, instance, **kwargs):
+    config_deleted(sender, instance, **kwargs)
@@ -3,6 +3,8 @@ RBAC sanity tests for printing config endpoints.
 Tests that admin can access/modify printing config,
 while non-admin users cannot.
 """
+import os
+
 import pytest
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
@@ -110,3 +112,489 @@ class TestPrintingConfigRBAC:
         api_client.force_authenticate(user=staff_user_with_role)
         response = api_client.get("/api/workflow/visits/")
         assert response.status_code != status.HTTP_403_FORBIDDEN
+
+
+def _echo_pdf(text):
+    return f"%PDF-{text}".encode()
+
+
+def _slow_pdf(seconds):
+    import time
+
+    time.sleep(seconds)
+    return b"%PDF-slow"
+
+
+def _wait_for(condition, timeout=10.0):
+    import time
+
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.02)
+
+
+class TestRenderPool:
+    """Render pool: inline and process modes, timeouts, backpressure, metrics."""
+
+    def test_inline_render_records_metrics(self):
+        from apps.printing.render_pool import RenderPool
+
+        pool = RenderPool(workers=0)
+        assert pool.render(_echo_pdf, "a", label="test") == b"%PDF-a"
+        stats = pool.stats()
+        assert stats["completed"] == 1
+        assert stats["pending"] == 0
+        assert stats["render_p95_ms"] >= 0
+
+    def test_process_render_backpressure(self):
+        import threading
+
+        from apps.printing.render_pool import RenderPool, RenderPoolBusy
+
+        pool = RenderPool(workers=1, timeout=30, max_pending=1, queue_timeout=0.01)
+        try:
+            assert pool.render(_echo_pdf, "worker") == b"%PDF-worker"
+            slow = threading.Thread(target=pool.render, args=(_slow_pdf, 1.0))
+            slow.start()
+            _wait_for(lambda: pool.stats()["pending"] == 1)
+            # The in-flight render holds the only slot.
+            with pytest.raises(RenderPoolBusy):
+                pool.render(_echo_pdf, "rejected")
+            slow.join()
+            assert pool.stats()["rejected"] == 1
+        finally:
+            pool.shutdown()
+
+    def test_timeout_recycles_stuck_worker(self):
+        from apps.printing.render_pool import RenderPool, RenderTimeout
+
+        pool = RenderPool(workers=1, timeout=30, max_pending=1, queue_timeout=0.01)
+        try:
+            assert pool.render(_echo_pdf, "warm") == b"%PDF-warm"
+            with pytest.raises(RenderTimeout):
+                pool.render(_slow_pdf, 60.0, timeout=0.2)
+            # The stuck worker is terminated, so its slot comes back well before the render would end.
+            _wait_for(lambda: pool.stats()["pending"] == 0)
+            assert pool.render(_echo_pdf, "fresh") == b"%PDF-fresh"
+            stats = pool.stats()
+            assert stats["timeouts"] == 1
+            assert stats["pool_restarts"] == 1
+        finally:
+            pool.shutdown()
+
+    def test_shared_pool_is_inline_unless_enabled(self, settings):
+        from apps.printing.render_pool import render_pdf, render_pool_stats, reset_render_pool
+
+        reset_render_pool()
+        try:
+            assert render_pdf(_echo_pdf, "inline") == b"%PDF-inline"
+            assert render_pool_stats()["workers"] == 0
+
+            settings.PDF_RENDER_WORKERS = 1
+            reset_render_pool()
+            assert render_pdf(_echo_pdf, "pooled") == b"%PDF-pooled"
+            assert render_pool_stats()["workers"] == 1
+        finally:
+            reset_render_pool()
+
+    def test_stats_endpoint_is_admin_only(self, api_client, admin_user, regular_user):
+        api_client.force_authenticate(user=regular_user)
+        assert api_client.get("/api/printing/render-pool/stats/").status_code == status.HTTP_403_FORBIDDEN
+        api_client.force_authenticate(user=admin_user)
+        response = api_client.get("/api/printing/render-pool/stats/")
+        assert response.status_code == status.HTTP_200_OK
+        assert "render_p50_ms" in response.data
+
+
+class TestPdfDelivery:
+    """Stored PDF responses: streaming, conditional GET, Range and proxy hand-off."""
+
+    @pytest.fixture
+    def pdf_path(self, tmp_path):
+        path = tmp_path / "doc.pdf"
+        path.write_bytes(b"%PDF-" + bytes(range(256)) * 4)
+        return path
+
+    def _get(self, path, **headers):
+        from django.test import RequestFactory
+
+        from apps.printing.pdf_delivery import serve_pdf_file
+
+        request = RequestFactory().get("/doc.pdf", **headers)
+        return serve_pdf_file(request, path, filename="doc.pdf", etag="abc123")
+
+    def test_full_and_conditional(self, pdf_path):
+        response = self._get(pdf_path)
+        assert response.status_code == 200
+        assert b"".join(response.streaming_content) == pdf_path.read_bytes()
+        assert response["ETag"] == '"abc123"'
+        assert response["Accept-Ranges"] == "bytes"
+        assert self._get(pdf_path, HTTP_IF_NONE_MATCH='"abc123"').status_code == 304
+
+    def test_ranges(self, pdf_path):
+        data = pdf_path.read_bytes()
+        response = self._get(pdf_path, HTTP_RANGE="bytes=5-9")
+        assert response.status_code == 206
+        assert response["Content-Range"] == f"bytes 5-9/{len(data)}"
+        assert b"".join(response.streaming_content) == data[5:10]
+
+        suffix = self._get(pdf_path, HTTP_RANGE="bytes=-4")
+        assert b"".join(suffix.streaming_content) == data[-4:]
+
+        unsatisfiable = self._get(pdf_path, HTTP_RANGE=f"bytes={len(data)}-")
+        assert unsatisfiable.status_code == 416
+        assert unsatisfiable["Content-Range"] == f"bytes */{len(data)}"
+
+        stale = self._get(pdf_path, HTTP_RANGE="bytes=0-1", HTTP_IF_RANGE='"other"')
+        assert stale.status_code == 200
+
+    def test_sendfile_handoff(self, pdf_path, settings):
+        settings.MEDIA_ROOT = str(pdf_path.parent)
+        settings.PDF_SENDFILE_HEADER = "X-Accel-Redirect"
+        settings.PDF_SENDFILE_PREFIX = "/protected-media/"
+        response = self._get(pdf_path, HTTP_RANGE="bytes=0-1")
+        assert response.status_code == 200
+        assert response["X-Accel-Redirect"] == "/protected-media/doc.pdf"
+        assert response.content == b""
+
+
+def _one_page_pdf(text):
+    from io import BytesIO
+
+    from reportlab.pdfgen import canvas
+
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer)
+    pdf.drawString(72, 720, text)
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+@pytest.mark.django_db
+class TestPrintBundle:
+    """Merged print bundles: visit grouping, table of contents, missing-PDF rendering."""
+
+    @pytest.fixture
+    def visit(self, settings, tmp_path, admin_user):
+        from django.core.files.base import ContentFile
+        from django.utils import timezone
+
+        from apps.catalog.models import Modality, Service
+        from apps.patients.models import Patient
+        from apps.reporting.models import ReportInstanceV2, ReportPublishSnapshotV2, ReportTemplateV2
+        from apps.workflow.models import ReceiptSnapshot, ServiceVisit, ServiceVisitItem
+
+        settings.MEDIA_ROOT = str(tmp_path)
+        modality = Modality.objects.create(code="USG", name="Ultrasound")
+        template = ReportTemplateV2.objects.create(code="BUNDLE_V2", name="Bundle", modality="USG", status="active")
+        patient = Patient.objects.create(name="Bundle Patient", age=50, gender="F")
+        visit = ServiceVisit.objects.create(patient=patient, created_by=admin_user)
+        ReceiptSnapshot.objects.create(
+            service_visit=visit,
+            receipt_number="2601-0100",
+            issued_at=timezone.now(),
+            items_json=[{"name": "USG Abdomen", "qty": 1, "unit_price": "1000", "line_total": "1000"}],
+            subtotal=1000,
+            total_paid=1000,
+            patient_name=patient.name,
+        )
+        for index, name in enumerate(["USG Abdomen", "USG Pelvis"]):
+            service = Service.objects.create(code=f"BUNDLE_{index}", name=name, modality=modality, price=100)
+            item = ServiceVisitItem.objects.create(
+                service_visit=visit,
+                service=service,
+                service_name_snapshot=name,
+                status="PUBLISHED",
+                published_at=timezone.now(),
+            )
+            instance = ReportInstanceV2.objects.create(
+                work_item=item, template_v2=template, values_json={}, status="published", created_by=admin_user
+            )
+            snapshot = ReportPublishSnapshotV2.objects.create(
+                report_instance_v2=instance,
+                template_v2=template,
+                values_json={},
+                narrative_json={},
+                content_hash=f"hash{index}",
+                published_by=admin_user,
+                version=1,
+            )
+            if index == 0:
+                snapshot.pdf_file.save("stored.pdf", ContentFile(_one_page_pdf(name)))
+        return visit
+
+    def test_visit_bundle_has_toc_and_renders_missing_reports(self, api_client, admin_user, visit):
+        from io import BytesIO
+        from unittest import mock
+
+        from pypdf import PdfReader
+
+        from apps.reporting.models import ReportPublishSnapshotV2
+
+        api_client.force_authenticate(user=admin_user)
+        with mock.patch(
+            "apps.reporting.pdf_engine.report_pdf_v2.generate_report_pdf_v2",
+            side_effect=lambda instance_id, narrative_json=None, content_hash=None: _one_page_pdf("rendered"),
+        ) as render:
+            response = api_client.post("/api/printing/bundle/", {"visit_id": visit.visit_id}, format="json")
+        assert response.status_code == status.HTTP_200_OK
+        assert render.call_count == 1
+        assert response["X-Bundle-Documents"] == "3"
+
+        reader = PdfReader(BytesIO(b"".join(response.streaming_content)))
+        toc = reader.pages[0].extract_text()
+        assert "Receipt 2601-0100" in toc
+        assert "USG Pelvis report (v1)" in toc
+        assert len(reader.pages) == int(response["X-Bundle-Pages"])
+        assert [item.title for item in reader.outline if not isinstance(item, list)] == [
+            f"{visit.visit_id} - Bundle Patient"
+        ]
+        assert all(snapshot.pdf_file for snapshot in ReportPublishSnapshotV2.objects.all())
+
+    def test_selection_is_validated(self, api_client, admin_user, visit):
+        api_client.force_authenticate(user=admin_user)
+        both = api_client.post(
+            "/api/printing/bundle/", {"visit_id": visit.visit_id, "item_ids": []}, format="json"
+        )
+        assert both.status_code == status.HTTP_400_BAD_REQUEST
+        too_wide = api_client.post(
+            "/api/printing/bundle/", {"date_from": "2026-01-01", "date_to": "2026-12-31"}, format="json"
+        )
+        assert too_wide.status_code == status.HTTP_400_BAD_REQUEST
+        empty = api_client.post(
+            "/api/printing/bundle/", {"date_from": "2020-01-01", "date_to": "2020-01-02"}, format="json"
+        )
+        assert empty.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db(transaction=True)
+class TestPrintConfigCache:
+    """Branding singletons are loaded once per worker and versioned on save/delete."""
+
+    @pytest.fixture(autouse=True)
+    def reset(self):
+        from django.core.cache import cache
+
+        from apps.printing.config_cache import VERSION_CACHE_KEY, invalidate_print_config
+
+        invalidate_print_config()
+        cache.delete(VERSION_CACHE_KEY)
+        yield
+        invalidate_print_config()
+        cache.delete(VERSION_CACHE_KEY)
+
+    def test_loaded_once_and_version_increases(self, django_assert_num_queries):
+        from apps.printing.config_cache import get_print_config
+        from apps.printing.models import ReceiptBrandingConfig
+        from apps.reporting.models import ReportingOrganizationConfig
+
+        org = ReportingOrganizationConfig.objects.create(org_name="Clinic")
+        first = get_print_config()
+        assert first.org.org_name == "Clinic"
+        with django_assert_num_queries(0):
+            assert get_print_config() is first
+
+        org.org_name = "Renamed Clinic"
+        org.save()
+        renamed = get_print_config()
+        assert renamed.org.org_name == "Renamed Clinic"
+        assert renamed.version > first.version
+
+        receipt = ReceiptBrandingConfig.get_singleton()
+        receipt.receipt_footer_text = "Thanks"
+        receipt.save()
+        assert get_print_config().version > renamed.version
+
+        before_delete = get_print_config().version
+        org.delete()
+        after_delete = get_print_config()
+        assert after_delete.org is None
+        assert after_delete.version > before_delete
+
+    def test_snapshot_not_stored_inside_transaction(self):
+        from django.db import transaction
+
+        from apps.printing import config_cache
+
+        with transaction.atomic():
+            config_cache.get_print_config()
+            assert config_cache._snapshot is None
+        config_cache.get_print_config()
+        assert config_cache._snapshot is not None
+
+
+class TestTextLayout:
+    """Cached glyph widths and wrapping agree with ReportLab's own measurements."""
+
+    def test_widths_match_reportlab(self):
+        from reportlab.pdfbase import pdfmetrics
+
+        from apps.printing.text_layout import string_width
+
+        for text in ["", "USG Abdomen", "Ultrasound – Doppler (€ 1,000)", "日本"]:
+            for font in ("Helvetica", "Helvetica-Bold"):
+                assert string_width(text, font, 8.5) == pdfmetrics.stringWidth(text, font, 8.5)
+
+    def test_wrap_splits_long_words_and_is_memoized(self):
+        from apps.printing.text_layout import string_width, wrap_cache_info, wrap_text
+
+        lines = wrap_text("USG Pelvis Ultrasonography-Guided-Biopsy-Procedure", "Helvetica", 8, 60)
+        assert lines[0] == "USG Pelvis"
+        assert "".join(lines[1:]) == "Ultrasonography-Guided-Biopsy-Procedure"
+        assert all(string_width(line, "Helvetica", 8) <= 60 for line in lines)
+
+        hits = wrap_cache_info().hits
+        lines.append("mutated")
+        assert wrap_text("USG Pelvis Ultrasonography-Guided-Biopsy-Procedure", "Helvetica", 8, 60) == lines[:-1]
+        assert wrap_cache_info().hits == hits + 1
+
+    def test_largest_fitting(self):
+        from apps.printing.text_layout import largest_fitting
+
+        sizes = [11, 10.5, 10, 9.5, 9, 8.5, 8]
+        assert largest_fitting(sizes, lambda size: size <= 9.5) == 3
+        assert largest_fitting(sizes, lambda size: True) == 0
+        assert largest_fitting(sizes, lambda size: False) is None
+
+
+@pytest.mark.django_db
+class TestPrintImageDerivatives:
+    """Branding uploads get print-sized derivatives; PDFs decode them once per worker."""
+
+    @staticmethod
+    def _photo(size=(4000, 3000), mode="RGB"):
+        from io import BytesIO
+
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image
+
+        buffer = BytesIO()
+        Image.new(mode, size, (200, 30, 30, 128) if mode == "RGBA" else (200, 30, 30)).save(
+            buffer, format="PNG" if mode == "RGBA" else "JPEG", quality=95
+        )
+        name = "logo.png" if mode == "RGBA" else "photo.jpg"
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png" if mode == "RGBA" else "image/jpeg")
+
+    def test_upload_creates_downscaled_derivative(self, api_client, admin_user, settings, tmp_path):
+        from PIL import Image
+
+        from apps.printing.images import print_image_path
+        from apps.printing.models import ReceiptBrandingConfig
+
+        settings.MEDIA_ROOT = str(tmp_path)
+        api_client.force_authenticate(user=admin_user)
+        response = api_client.post(
+            "/api/printing/config/upload-receipt_banner/", {"receipt_banner": self._photo()}, format="multipart"
+        )
+        assert response.status_code == status.HTTP_200_OK
+
+        banner = ReceiptBrandingConfig.get_singleton().receipt_banner
+        path = print_image_path(banner, "receipt_banner")
+        assert path != banner.path
+        assert "/print/" in path and path.endswith(".jpg")
+        with Image.open(path) as derivative:
+            assert derivative.size[1] <= 213  # 18mm at 300dpi
+        assert os.path.getsize(path) < os.path.getsize(banner.path)
+
+    def test_transparent_logo_keeps_alpha_and_reader_is_cached(self, settings, tmp_path):
+        from apps.printing.images import cached_image_reader, print_image_path
+        from apps.printing.models import ReceiptBrandingConfig
+
+        settings.MEDIA_ROOT = str(tmp_path)
+        receipt = ReceiptBrandingConfig.get_singleton()
+        receipt.receipt_logo = self._photo(size=(1200, 1200), mode="RGBA")
+        receipt.save()
+
+        # Uploaded outside the API: the derivative is built on first use.
+        path = print_image_path(receipt.receipt_logo, "receipt_logo")
+        assert path.endswith(".png")
+        assert cached_image_reader(path) is cached_image_reader(path)
+
+
+class TestBenchmarkPdfCommand:
+    """benchmark_pdf renders synthetic documents and fails on errors or regressions."""
+
+    @staticmethod
+    def _run(kinds="receipt,prescription", **options):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command("benchmark_pdf", kinds=kinds, iterations=1, no_rss=True, stdout=out, stderr=StringIO(), **options)
+        return out.getvalue()
+
+    def test_report_lists_every_document(self, tmp_path):
+        import json
+
+        from apps.printing.management.commands.benchmark_pdf import PRESCRIPTION_MEDICINES, RECEIPT_SERVICES
+
+        output = tmp_path / "bench.json"
+        text = self._run(output=str(output))
+        assert "PDF benchmark passed" in text
+
+        report = json.loads(output.read_text())
+        assert len(report["documents"]) == len(RECEIPT_SERVICES) + len(PRESCRIPTION_MEDICINES)
+        for result in report["documents"].values():
+            assert result["pages"] >= 1
+            assert result["output_bytes"] > 0
+            assert result["alloc_peak_bytes"] > 0
+        assert report["documents"]["receipt_60svc"]["pages"] > report["documents"]["receipt_1svc"]["pages"]
+
+    def test_regression_against_baseline_fails(self, tmp_path):
+        import json
+
+        from django.core.management.base import CommandError
+
+        baseline = tmp_path / "baseline.json"
+        baseline.write_text(json.dumps({"documents": {"prescription_5med": {"p50_ms": 0.001, "output_bytes": 1}}}))
+        with pytest.raises(CommandError):
+            self._run(kinds="prescription", baseline=str(baseline), threshold=1.5)
+
+    def test_unknown_kind_is_rejected(self):
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+
+        with pytest.raises(CommandError):
+            call_command("benchmark_pdf", kinds="invoice")
+
+
+class TestPageForms:
+    """Repeated page furniture is one form XObject per document, referenced from every page."""
+
+    @staticmethod
+    def _forms_by_page(pdf_bytes):
+        from io import BytesIO
+
+        from pypdf import PdfReader
+
+        reader = PdfReader(BytesIO(pdf_bytes))
+        pages = []
+        for page in reader.pages:
+            xobjects = page["/Resources"].get("/XObject", {})
+            pages.append({ref.idnum for ref in xobjects.values() if ref.get_object()["/Subtype"] == "/Form"})
+        return pages
+
+    def test_receipt_copies_and_pages_share_header_and_footer(self):
+        import random
+
+        from apps.printing.management.commands.benchmark_pdf import BRANDING, synthetic_receipt
+        from apps.workflow.pdf_engine.receipt import render_receipt_pdf
+
+        pages = self._forms_by_page(render_receipt_pdf(synthetic_receipt(random.Random(1), 30), BRANDING))
+        assert len(pages) > 1
+        assert all(forms == pages[0] for forms in pages)
+        assert len(pages[0]) == 2
+
+    def test_report_pages_share_header_and_footer(self):
+        import random
+
+        from apps.printing.management.commands.benchmark_pdf import synthetic_report
+        from apps.reporting.pdf_engine.report_pdf_v2 import render_report_pdf_v2
+
+        pages = self._forms_by_page(render_report_pdf_v2(synthetic_report(random.Random(1), 3)))
+        assert len(pages) > 1
+        assert all(forms == pages[0] for forms in pages)
+        assert len(pages[0]) == 2
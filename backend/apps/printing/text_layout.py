@@ -0,0 +1,169 @@
+"""
+Text measurement and wrapping for canvas-drawn PDFs (receipts, report and
+prescription headers).
+
+ReportLab measures Type 1 fonts as sum(glyph widths) * 0.001 * size, with
+integer glyph widths. Per-font tables mapping characters to those integers are
+built once (the standard fonts are preloaded at import), so a width is a dict
+lookup per character and matches pdfmetrics.stringWidth exactly. Other fonts
+(TrueType) fall back to pdfmetrics.stringWidth.
+
+wrap_text() is memoized on (text, font, size, width); the same service names
+are wrapped for both receipt copies and for every font size tried.
+largest_fitting() binary-searches an ordered list of candidate sizes instead of
+trying them one by one.
+"""
+
+import logging
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from reportlab.pdfbase import pdfmetrics
+
+logger = logging.getLogger(__name__)
+
+PRELOADED_FONTS = ("Helvetica", "Helvetica-Bold", "Helvetica-Oblique", "Helvetica-BoldOblique")
+WRAP_CACHE_SIZE = 4096
+
+_WIDTH_TABLES: Dict[str, Optional[Dict[str, int]]] = {}
+
+
+def _glyph_units(char: str, font_name: str) -> int:
+    return int(round(pdfmetrics.stringWidth(char, font_name, 1000)))
+
+
+def _width_table(font_name: str) -> Optional[Dict[str, int]]:
+    """Character -> glyph width (1/1000 em) for Type 1 fonts; None for other font types."""
+    try:
+        return _WIDTH_TABLES[font_name]
+    except KeyError:
+        pass
+    font = pdfmetrics.getFont(font_name)
+    if type(font) is pdfmetrics.Font:
+        table = {chr(code): _glyph_units(chr(code), font_name) for code in range(32, 256)}
+    else:
+        table = None
+    _WIDTH_TABLES[font_name] = table
+    return table
+
+
+def text_units(text: str, font_name: str) -> Optional[int]:
+    """Width of text in glyph units (1/1000 of the font size), or None for non-Type 1 fonts."""
+    table = _width_table(font_name)
+    if table is None:
+        return None
+    total = 0
+    for char in text:
+        units = table.get(char)
+        if units is None:
+            units = table[char] = _glyph_units(char, font_name)
+        total += units
+    return total
+
+
+@lru_cache(maxsize=WRAP_CACHE_SIZE)
+def _fallback_width(text: str, font_name: str, font_size: float) -> float:
+    return pdfmetrics.stringWidth(text, font_name, font_size)
+
+
+def string_width(text: str, font_name: str, font_size: float) -> float:
+    """Same result as pdfmetrics.stringWidth, from the cached glyph tables."""
+    units = text_units(text, font_name)
+    if units is None:
+        return _fallback_width(text, font_name, font_size)
+    return units * 0.001 * font_size
+
+
+def _split_long_word(word: str, font_name: str, font_size: float, max_width: float) -> List[str]:
+    segments = []
+    remaining = word
+    while remaining:
+        low, high = 1, len(remaining)
+        fit_len = 0
+        # Binary search for the longest prefix that fits
+        while low <= high:
+            mid = (low + high) // 2
+            if string_width(remaining[:mid], font_name, font_size) <= max_width:
+                fit_len = mid
+                low = mid + 1
+            else:
+                high = mid - 1
+        if fit_len == 0:
+            # Only when max_width is too small for a single character: force progress.
+            fit_len = 1
+            logger.warning(
+                "[PDF] max_width too small for character in word '%s...', forcing single character",
+                remaining[:10],
+            )
+        segments.append(remaining[:fit_len])
+        remaining = remaining[fit_len:]
+    return segments
+
+
+@lru_cache(maxsize=WRAP_CACHE_SIZE)
+def _wrap(text: str, font_name: str, font_size: float, max_width: float) -> Tuple[str, ...]:
+    if not text:
+        return ("",)
+    if _width_table(font_name) is None:
+        units, scale = (lambda value: _fallback_width(value, font_name, font_size)), 1.0
+    else:
+        # Integer glyph units add up exactly, so the running line width is the
+        # same number stringWidth would return for the joined line.
+        units, scale = (lambda value: text_units(value, font_name)), 0.001 * font_size
+    space_units = units(" ")
+
+    lines: List[str] = []
+    current: List[str] = []
+    current_units = 0
+    for word in text.split():
+        word_units = units(word)
+        tentative_units = current_units + space_units + word_units if current else word_units
+        if tentative_units * scale <= max_width:
+            current.append(word)
+            current_units = tentative_units
+            continue
+        if current:
+            lines.append(" ".join(current))
+            current = []
+        if word_units * scale > max_width:
+            lines.extend(_split_long_word(word, font_name, font_size, max_width))
+        else:
+            current = [word]
+            current_units = word_units
+    if current:
+        lines.append(" ".join(current))
+    return tuple(lines)
+
+
+def wrap_text(text: str, font_name: str, font_size: float, max_width: float) -> List[str]:
+    """
+    Greedy word wrap to max_width points; words wider than a line are split at
+    character boundaries. Returns a new list (the memoized result is a tuple).
+    """
+    return list(_wrap(text or "", font_name, float(font_size), float(max_width)))
+
+
+def largest_fitting(candidates: Sequence, fits: Callable[[object], bool]) -> Optional[int]:
+    """
+    Index of the first candidate for which fits() is true, assuming candidates are
+    ordered so that once one fits every later one does (e.g. font sizes, largest
+    first). None when nothing fits.
+    """
+    low, high = 0, len(candidates) - 1
+    found = None
+    while low <= high:
+        mid = (low + high) // 2
+        if fits(candidates[mid]):
+            found = mid
+            high = mid - 1
+        else:
+            low = mid + 1
+    return found
+
+
+def wrap_cache_info():
+    return _wrap.cache_info()
+
+
+for _font_name in PRELOADED_FONTS:
+    _width_table(_font_name)
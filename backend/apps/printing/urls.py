@@ -7,4 +7,6 @@ urlpatterns = [
     path("config/upload-receipt_logo/", api.upload_receipt_logo),
     path("config/upload-receipt_banner/", api.upload_receipt_banner),
     path("sequence/next/", api.sequence_next),
+    path("render-pool/stats/", api.render_pool_status),
+    path("bundle/", api.print_bundle),
 ]
@@ -0,0 +1,260 @@
+import hashlib
+import json
+import math
+import random
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.reporting.services.narrative_composer import compose_narrative
+from apps.reporting.services.narrative_v2 import generate_narrative_v2
+
+FREE_TEXT = [
+    "",
+    "normal",
+    "Right",
+    "Left",
+    "bowel gas",
+    "measures 3 mm",
+    "not seen",
+    "Mildly echogenic",
+    "Small simple cyst",
+    "Limited by body habitus",
+]
+
+# Fixed template version for benchmark runs so plans are cached like in production.
+BENCHMARK_TEMPLATE_VERSION = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+
+def _percentile(samples, pct):
+    if not samples:
+        return 0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _synthetic_value(spec, rng):
+    if "enum" in spec and isinstance(spec["enum"], list) and spec["enum"]:
+        return rng.choice(spec["enum"] + [""])
+    kind = spec.get("type")
+    if kind == "boolean":
+        return rng.choice([True, False, None])
+    if kind in ("number", "integer"):
+        if rng.random() < 0.15:
+            return rng.choice([None, ""])
+        low = spec.get("minimum", 0)
+        high = spec.get("maximum", max(low, 0) + 30)
+        value = rng.uniform(low, high)
+        return int(value) if kind == "integer" else round(value, 1)
+    if kind == "array":
+        items = spec.get("items") or {}
+        pool = items.get("enum") or FREE_TEXT[1:]
+        return rng.sample(pool, rng.randint(0, min(3, len(pool))))
+    return rng.choice(FREE_TEXT)
+
+
+def synthetic_values(json_schema, rng):
+    """One synthetic values_json document for a template's json_schema."""
+    props = (json_schema or {}).get("properties", {}) or {}
+    values = {}
+    for key, spec in props.items():
+        if rng.random() < 0.8:
+            values[key] = _synthetic_value(spec if isinstance(spec, dict) else {}, rng)
+    return values
+
+
+class Command(BaseCommand):
+    help = "Benchmark V2 narrative generation/composition over the seed template library"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--library", type=str, help="Template library directory (default: seed library)")
+        parser.add_argument("--iterations", type=int, default=1000, help="Synthetic documents per template")
+        parser.add_argument("--seed", type=int, default=1234, help="Random seed for synthetic documents")
+        parser.add_argument(
+            "--alloc-every",
+            type=int,
+            default=10,
+            help="Measure allocations on every Nth document (0 disables; tracing is slow)",
+        )
+        parser.add_argument("--output", type=str, help="Write the JSON report to this path")
+        parser.add_argument("--baseline", type=str, help="Previous JSON report to compare against")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=1.5,
+            help="Fail when a p50/p95 exceeds baseline by this factor (default 1.5)",
+        )
+        parser.add_argument("--expected-digest", type=str, help="Fail unless the golden output digest matches")
+        parser.add_argument(
+            "--allow-drift",
+            action="store_true",
+            help="Do not fail when the output digest differs from the baseline",
+        )
+
+    def handle(self, *args, **options):
+        library = Path(
+            options.get("library")
+            or Path(__file__).resolve().parents[2] / "seed_data" / "templates_v2" / "library"
+        )
+        if not library.exists():
+            raise CommandError(f"Template library not found: {library}")
+
+        templates = self._load_templates(library)
+        if not templates:
+            raise CommandError(f"No templates found under {library}")
+
+        report = self._run(templates, options)
+        self._print_report(report)
+
+        if options.get("output"):
+            Path(options["output"]).write_text(json.dumps(report, indent=2, sort_keys=True))
+            self.stdout.write(f"Report written to {options['output']}")
+
+        failures = self._check(report, options)
+        if failures:
+            for failure in failures:
+                self.stderr.write(self.style.ERROR(failure))
+            raise CommandError(f"Narrative benchmark failed: {len(failures)} check(s)")
+        self.stdout.write(self.style.SUCCESS("Narrative benchmark passed"))
+
+    def _load_templates(self, library):
+        templates = []
+        for path in sorted(library.rglob("*.json")):
+            try:
+                data = json.loads(path.read_text())
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Invalid template file {path}: {exc}")
+            items = data if isinstance(data, list) else [data]
+            for item in items:
+                if not isinstance(item, dict) or not item.get("code"):
+                    continue
+                templates.append(
+                    SimpleNamespace(
+                        pk=uuid.uuid5(uuid.NAMESPACE_URL, f"benchmark:{item['code']}"),
+                        code=item["code"],
+                        updated_at=BENCHMARK_TEMPLATE_VERSION,
+                        json_schema=item.get("json_schema") or {},
+                        narrative_rules=item.get("narrative_rules") or {},
+                    )
+                )
+        return templates
+
+    def _run(self, templates, options):
+        iterations = max(1, options["iterations"])
+        alloc_every = max(0, options["alloc_every"])
+        rng = random.Random(options["seed"])
+
+        generate_ns, compose_ns = [], []
+        generate_alloc, compose_alloc = [], []
+        per_template = {}
+        digest = hashlib.sha256()
+
+        for template in templates:
+            documents = [synthetic_values(template.json_schema, rng) for _ in range(iterations)]
+            # Warm-up compiles and caches the plan outside the measurements.
+            generate_narrative_v2(template, documents[0])
+
+            template_ns = []
+            for values in documents:
+                start = time.perf_counter_ns()
+                narrative = generate_narrative_v2(template, values)
+                elapsed = time.perf_counter_ns() - start
+                generate_ns.append(elapsed)
+                template_ns.append(elapsed)
+
+                compose_input = {"sections": narrative["sections"], "impression": narrative["impression"]}
+                start = time.perf_counter_ns()
+                compose_narrative(compose_input, values_json=values)
+                compose_ns.append(time.perf_counter_ns() - start)
+
+                digest.update(json.dumps(narrative, sort_keys=True).encode("utf-8"))
+                digest.update(b"\n")
+
+            per_template[template.code] = {
+                "generate_p50_us": round(_percentile(template_ns, 50) / 1000, 2),
+                "generate_p95_us": round(_percentile(template_ns, 95) / 1000, 2),
+            }
+
+            if alloc_every:
+                tracemalloc.start()
+                try:
+                    for values in documents[::alloc_every]:
+                        generate_alloc.append(self._peak_bytes(generate_narrative_v2, template, values))
+                        narrative = generate_narrative_v2(template, values)
+                        compose_input = {"sections": narrative["sections"], "impression": narrative["impression"]}
+                        compose_alloc.append(self._peak_bytes(compose_narrative, compose_input, values_json=values))
+                finally:
+                    tracemalloc.stop()
+
+        return {
+            "templates": len(templates),
+            "documents": len(generate_ns),
+            "seed": options["seed"],
+            "generate": self._summary(generate_ns, generate_alloc),
+            "compose": self._summary(compose_ns, compose_alloc),
+            "per_template": per_template,
+            "digest": digest.hexdigest(),
+        }
+
+    @staticmethod
+    def _peak_bytes(func, *args, **kwargs):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        func(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1] - before
+
+    @staticmethod
+    def _summary(samples_ns, alloc_bytes):
+        return {
+            "p50_us": round(_percentile(samples_ns, 50) / 1000, 2),
+            "p95_us": round(_percentile(samples_ns, 95) / 1000, 2),
+            "mean_us": round(sum(samples_ns) / len(samples_ns) / 1000, 2) if samples_ns else 0,
+            "alloc_p50_bytes": _percentile(alloc_bytes, 50),
+            "alloc_p95_bytes": _percentile(alloc_bytes, 95),
+        }
+
+    def _print_report(self, report):
+        self.stdout.write(self.style.MIGRATE_HEADING("Narrative benchmark"))
+        self.stdout.write(f"Templates: {report['templates']}  Documents: {report['documents']}  Seed: {report['seed']}")
+        for name in ("generate", "compose"):
+            stats = report[name]
+            self.stdout.write(
+                f"{name:<9} p50 {stats['p50_us']:>9.2f} us  p95 {stats['p95_us']:>9.2f} us  "
+                f"alloc p50 {stats['alloc_p50_bytes']:>8} B  p95 {stats['alloc_p95_bytes']:>8} B"
+            )
+        self.stdout.write(f"Golden digest: {report['digest']}")
+
+    def _check(self, report, options):
+        failures = []
+        expected = options.get("expected_digest")
+        if expected and expected != report["digest"]:
+            failures.append(f"Output digest {report['digest']} != expected {expected}")
+
+        baseline_path = options.get("baseline")
+        if not baseline_path:
+            return failures
+        try:
+            baseline = json.loads(Path(baseline_path).read_text())
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Cannot read baseline {baseline_path}: {exc}")
+
+        threshold = options["threshold"]
+        for name in ("generate", "compose"):
+            for metric in ("p50_us", "p95_us"):
+                base = (baseline.get(name) or {}).get(metric)
+                current = report[name][metric]
+                if base and current > base * threshold:
+                    failures.append(
+                        f"{name} {metric} regressed: {current} us vs baseline {base} us (threshold x{threshold})"
+                    )
+
+        same_inputs = baseline.get("seed") == report["seed"] and baseline.get("documents") == report["documents"]
+        if same_inputs and baseline.get("digest") and baseline["digest"] != report["digest"] and not options["allow_drift"]:
+            failures.append(f"Output digest changed: {report['digest']} vs baseline {baseline['digest']}")
+        return failures
@@ -0,0 +1,58 @@
+"""
+Move published report PDFs written before content-addressed storage into the
+store (report_snapshots_v2/sha256/...), recording pdf_sha256 on each snapshot.
+Versions whose PDFs are byte-identical end up sharing one file; the dated
+originals are removed once no snapshot points at them.
+
+Usage:
+    python manage.py dedupe_report_snapshots
+    python manage.py dedupe_report_snapshots --dry-run
+"""
+
+from django.core.management.base import BaseCommand
+
+from apps.reporting.models import ReportPublishSnapshotV2
+from apps.reporting.services.snapshot_store import content_address, pdf_sha256, store_pdf
+
+
+class Command(BaseCommand):
+    help = "Move legacy report snapshot PDFs into content-addressed storage and share identical files"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        snapshots = ReportPublishSnapshotV2.objects.filter(pdf_sha256="").exclude(pdf_file="").order_by("published_at")
+
+        moved = shared = missing = 0
+        seen = set(ReportPublishSnapshotV2.objects.exclude(pdf_sha256="").values_list("pdf_sha256", flat=True))
+        for snapshot in snapshots.iterator():
+            old_name = snapshot.pdf_file.name
+            try:
+                with snapshot.pdf_file.open("rb") as handle:
+                    pdf_bytes = handle.read()
+            except (OSError, ValueError):
+                missing += 1
+                self.stderr.write(self.style.WARNING(f"v{snapshot.version} {snapshot.id}: file missing ({old_name})"))
+                continue
+
+            digest = pdf_sha256(pdf_bytes)
+            if digest in seen:
+                shared += 1
+            else:
+                moved += 1
+                seen.add(digest)
+            self.stdout.write(f"v{snapshot.version} {snapshot.id}: {old_name} -> {content_address(digest)}")
+            if dry_run:
+                continue
+
+            name, digest, _ = store_pdf(pdf_bytes)
+            ReportPublishSnapshotV2.objects.filter(pk=snapshot.pk).update(pdf_file=name, pdf_sha256=digest)
+            if old_name != name and not ReportPublishSnapshotV2.objects.filter(pdf_file=old_name).exists():
+                snapshot.pdf_file.storage.delete(old_name)
+
+        prefix = "[dry run] " if dry_run else ""
+        self.stdout.write(
+            self.style.SUCCESS(f"{prefix}{moved} stored, {shared} shared with an identical PDF, {missing} missing")
+        )
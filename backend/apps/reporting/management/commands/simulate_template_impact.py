@@ -0,0 +1,87 @@
+import json
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.reporting.models import ReportTemplateV2
+from apps.reporting.services.template_impact import DEFAULT_CHUNK_SIZE, simulate_template_impact
+
+
+def _get_template(ref):
+    try:
+        return ReportTemplateV2.objects.get(pk=ref)
+    except (ReportTemplateV2.DoesNotExist, ValidationError, ValueError):
+        pass
+    # By code: prefer the active version, else the most recently edited one.
+    by_code = ReportTemplateV2.objects.filter(code=ref).order_by("-updated_at")
+    template = by_code.filter(status="active").first() or by_code.first()
+    if template is None:
+        raise CommandError(f"Template not found: {ref}")
+    return template
+
+
+class Command(BaseCommand):
+    help = "Simulate how a template rule change would alter narratives of existing V2 reports"
+
+    def add_arguments(self, parser):
+        parser.add_argument("template", help="Template id or code whose reports are re-rendered (old rules)")
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument("--candidate", help="Template id or code providing the new rules")
+        source.add_argument("--rules-file", help="JSON file with the new narrative_rules")
+        parser.add_argument("--workers", type=int, help="Process pool size (default: TEMPLATE_IMPACT_WORKERS)")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Documents per worker task")
+        parser.add_argument("--limit", type=int, help="Only simulate the first N documents")
+        parser.add_argument("--no-snapshots", action="store_true", help="Skip published snapshots")
+        parser.add_argument("--samples", type=int, default=20, help="Changed documents to include in the summary")
+        parser.add_argument("--slowest", type=int, default=10, help="Slowest documents to include in the summary")
+        parser.add_argument("--output", help="Write the JSON summary to this path")
+        parser.add_argument("--quiet", action="store_true", help="Do not stream changed documents")
+
+    def handle(self, *args, **options):
+        template = _get_template(options["template"])
+        if options.get("rules_file"):
+            try:
+                new_rules = json.loads(Path(options["rules_file"]).read_text())
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Invalid rules file {options['rules_file']}: {exc}")
+            if not isinstance(new_rules, dict):
+                raise CommandError("Rules file must contain a narrative_rules object")
+        else:
+            new_rules = _get_template(options["candidate"]).narrative_rules or {}
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Template impact: {template.code} ({template.pk})"))
+        summary = simulate_template_impact(
+            template,
+            new_rules,
+            include_snapshots=not options["no_snapshots"],
+            workers=options.get("workers"),
+            chunk_size=options["chunk_size"],
+            limit=options.get("limit"),
+            sample_limit=options["samples"],
+            slowest_limit=options["slowest"],
+            on_result=None if options["quiet"] else self._stream_result,
+        )
+
+        self.stdout.write(
+            f"Documents: {summary['documents']}  Changed: {summary['changed']}  "
+            f"Unchanged: {summary['unchanged']}  Errors: {summary['errors']}  ({summary['elapsed_ms']} ms)"
+        )
+        for kind, counts in sorted(summary["by_kind"].items()):
+            self.stdout.write(f"  {kind:<9} {counts['changed']}/{counts['documents']} changed, {counts['errors']} errors")
+        for entry in summary["slowest"]:
+            self.stdout.write(f"  slow {entry['kind']} {entry['id']}: old {entry['old_us']} us, new {entry['new_us']} us")
+
+        if options.get("output"):
+            Path(options["output"]).write_text(json.dumps(summary, indent=2, sort_keys=True))
+            self.stdout.write(f"Summary written to {options['output']}")
+
+    def _stream_result(self, result):
+        if result["changed"] is None:
+            self.stdout.write(self.style.ERROR(f"ERROR   {result['kind']} {result['id']}: {result['error']}"))
+        elif result["changed"]:
+            self.stdout.write(f"CHANGED {result['kind']} {result['id']}")
+            for line in result["removed"]:
+                self.stdout.write(f"  - {line}")
+            for line in result["added"]:
+                self.stdout.write(f"  + {line}")
@@ -0,0 +1,71 @@
+import json
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.reporting.models import ReportInstanceV2, ReportTemplateV2
+from apps.reporting.services.values_validation import get_values_validator
+
+
+class Command(BaseCommand):
+    help = "Validate stored V2 report values_json against their template schemas"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--template", action="append", help="Template id or code to scan (repeatable)")
+        parser.add_argument("--status", action="append", help="Only scan instances with this status (repeatable)")
+        parser.add_argument("--limit", type=int, help="Stop after scanning N instances")
+        parser.add_argument("--max-errors", type=int, default=5, help="Errors to print per invalid instance")
+        parser.add_argument("--output", help="Write invalid instances and their errors as JSON to this path")
+        parser.add_argument("--fail-on-invalid", action="store_true", help="Exit non-zero when any instance is invalid")
+
+    def handle(self, *args, **options):
+        instances = ReportInstanceV2.objects.all()
+        if options.get("template"):
+            template_ids = set(
+                ReportTemplateV2.objects.filter(code__in=options["template"]).values_list("id", flat=True)
+            )
+            for ref in options["template"]:
+                try:
+                    template_ids.update(ReportTemplateV2.objects.filter(pk=ref).values_list("id", flat=True))
+                except ValidationError:
+                    continue
+            if not template_ids:
+                raise CommandError(f"No templates match {options['template']}")
+            instances = instances.filter(template_v2_id__in=template_ids)
+        if options.get("status"):
+            instances = instances.filter(status__in=options["status"])
+        instances = instances.order_by("pk")
+        if options.get("limit"):
+            instances = instances[: options["limit"]]
+
+        # One template fetch per template version; instances only bring id/values.
+        templates = {template.id: template for template in ReportTemplateV2.objects.all()}
+        scanned, invalid = 0, []
+        rows = instances.values_list("id", "template_v2_id", "status", "values_json").iterator(chunk_size=500)
+        for instance_id, template_id, instance_status, values_json in rows:
+            scanned += 1
+            errors = get_values_validator(templates[template_id]).validate(values_json)
+            if not errors:
+                continue
+            entry = {
+                "instance_id": str(instance_id),
+                "template_code": templates[template_id].code,
+                "status": instance_status,
+                "errors": errors,
+            }
+            invalid.append(entry)
+            self.stdout.write(
+                self.style.WARNING(f"{entry['instance_id']} ({entry['template_code']}, {instance_status}): {len(errors)} error(s)")
+            )
+            for error in errors[: options["max_errors"]]:
+                self.stdout.write(f"  {error['field'] or '<root>'}: {error['code']} - {error['message']}")
+
+        if options.get("output"):
+            Path(options["output"]).write_text(json.dumps({"scanned": scanned, "invalid": invalid}, indent=2, default=str))
+            self.stdout.write(f"Report written to {options['output']}")
+
+        summary = f"Scanned {scanned} instance(s): {len(invalid)} invalid"
+        if invalid and options["fail_on_invalid"]:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary) if not invalid else self.style.WARNING(summary))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reporting', '0015_reportpublishjobv2'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportpublishsnapshotv2',
+            name='pdf_sha256',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='SHA256 of the PDF bytes; the file is stored content-addressed under this hash', max_length=64),
+        ),
+    ]
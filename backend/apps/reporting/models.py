@@ -162,6 +162,13 @@ class ReportPublishSnapshotV2(models.Model):
         help_text="SHA256 hash of template+values+narrative",
         db_index=True,
     )
+    pdf_sha256 = models.CharField(
+        max_length=64,
+        blank=True,
+        default="",
+        db_index=True,
+        help_text="SHA256 of the PDF bytes; the file is stored content-addressed under this hash",
+    )
     published_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL,
@@ -183,6 +190,59 @@ class ReportPublishSnapshotV2(models.Model):
         return f"Snapshot V2 v{self.version} for {self.report_instance_v2_id}"
 
 
+class ReportPublishJobV2(models.Model):
+    """
+    Background publish of a V2 report. The snapshot version is reserved when the
+    job is queued; the snapshot and PUBLISHED item status are written when it succeeds.
+    """
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCEEDED = "succeeded"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = (
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_SUCCEEDED, "Succeeded"),
+        (STATUS_FAILED, "Failed"),
+    )
+    ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    report_instance_v2 = models.ForeignKey(
+        ReportInstanceV2,
+        on_delete=models.CASCADE,
+        related_name="publish_jobs_v2",
+    )
+    version = models.PositiveIntegerField(help_text="Snapshot version reserved for this job")
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    snapshot = models.ForeignKey(
+        ReportPublishSnapshotV2,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="publish_jobs",
+    )
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+    )
+    error_message = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["report_instance_v2", "status"]),
+        ]
+
+    def __str__(self):
+        return f"Publish job v{self.version} for {self.report_instance_v2_id} ({self.status})"
+
+
 class ReportBlockLibrary(models.Model):
     """
     Library of reusable reporting blocks (Phase 3C).
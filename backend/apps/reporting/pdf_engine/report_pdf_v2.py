@@ -14,7 +14,6 @@ from reportlab.lib.colors import HexColor
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
 from reportlab.lib.units import mm
-from reportlab.lib.utils import ImageReader
 from reportlab.platypus import (
     BaseDocTemplate,
     Frame,
@@ -28,7 +27,11 @@ from reportlab.platypus import (
     TableStyle,
 )
 
-from apps.reporting.models import ReportInstanceV2, ReportingOrganizationConfig
+from apps.printing.images import cached_image_reader
+from apps.printing.page_forms import form_name, place_form
+from apps.printing.render_pool import render_pdf
+from apps.reporting.models import ReportInstanceV2
+from apps.reporting.services.render_context import build_report_render_context, load_render_instance
 
 logger = logging.getLogger(__name__)
 
@@ -48,9 +51,10 @@ SOFT_BG = HexColor("#f1f1f1")
 class ReportPDFGeneratorV2:
     """A4 print-first report generator for all radiology modalities."""
 
-    def __init__(self, report_instance_v2_id, narrative_json=None):
+    def __init__(self, report_instance_v2_id, narrative_json=None, document_id=None):
         self.report_id = report_instance_v2_id
         self.input_narrative_json = narrative_json or {}
+        self.document_id = document_id
         self.buffer = BytesIO()
         self.data = None
         self.styles = self._build_styles()
@@ -151,189 +155,22 @@ class ReportPDFGeneratorV2:
             ),
         }
 
-    def _listify(self, value):
-        if value is None:
-            return []
-        if isinstance(value, list):
-            return [str(v).strip() for v in value if str(v).strip()]
-        text = str(value).strip()
-        return [text] if text else []
-
     def fetch_data(self):
         try:
-            report = ReportInstanceV2.objects.select_related(
-                "work_item",
-                "work_item__service",
-                "work_item__service_visit",
-                "work_item__service_visit__patient",
-                "work_item__consultant",
-                "template_v2",
-                "created_by",
-            ).get(id=self.report_id)
+            report = load_render_instance(self.report_id)
         except ReportInstanceV2.DoesNotExist:
             logger.error("ReportInstanceV2 %s not found", self.report_id)
             raise
 
-        item = report.work_item
-        visit = item.service_visit
-        patient = visit.patient
-
-        config = ReportingOrganizationConfig.objects.first()
-        center_lines = []
-        logo_path = ""
-        disclaimer = "This report is based on imaging findings at the time of examination. Clinical correlation is advised."
-        static_signatories = []
-
-        if config:
-            if config.org_name:
-                center_lines.append(config.org_name.strip())
-            if config.address:
-                center_lines.append(str(config.address).strip())
-            if config.phone:
-                center_lines.append(str(config.phone).strip())
-            if config.logo:
-                try:
-                    logo_path = config.logo.path
-                except Exception:
-                    logo_path = ""
-            if config.disclaimer_text:
-                disclaimer = config.disclaimer_text
-            if isinstance(config.signatories_json, list):
-                static_signatories = config.signatories_json
-
-        narrative = self.input_narrative_json or report.narrative_json or {}
-
-        findings = []
-        if isinstance(narrative, dict) and isinstance(narrative.get("narrative_by_organ"), list):
-            for block in narrative.get("narrative_by_organ", []):
-                if not isinstance(block, dict):
-                    continue
-                paragraph = str(block.get("paragraph", "")).strip()
-                if not paragraph:
-                    continue
-                findings.append(
-                    {
-                        "heading": str(block.get("label", "")).strip(),
-                        "paragraphs": [paragraph],
-                    }
-                )
-
-        if not findings:
-            for block in narrative.get("sections", []) if isinstance(narrative, dict) else []:
-                if not isinstance(block, dict):
-                    continue
-                lines = self._listify(block.get("lines"))
-                if lines:
-                    findings.append({"heading": str(block.get("title", "")).strip(), "lines": lines})
-
-        if not findings:
-            fallback_lines = []
-            for key, value in (report.values_json or {}).items():
-                text = str(value).strip()
-                if text:
-                    fallback_lines.append(f"{key.replace('_', ' ').title()}: {text}")
-            if fallback_lines:
-                findings.append({"heading": "", "lines": fallback_lines})
-
-        measurements = []
-        for key, value in (report.values_json or {}).items():
-            if isinstance(value, (int, float)):
-                measurements.append({"label": key.replace("_", " ").title(), "value": str(value), "unit": ""})
-            elif isinstance(value, str):
-                low = key.lower()
-                if ("measurement" in low or "size" in low or "diameter" in low) and value.strip():
-                    measurements.append({"label": key.replace("_", " ").title(), "value": value.strip(), "unit": ""})
-        measurements = measurements[:12]
-
-        clinical_indication = ""
-        for key, value in (report.values_json or {}).items():
-            low = key.lower()
-            if "clinical" in low or "history" in low or "indication" in low:
-                text = str(value).strip()
-                if text:
-                    clinical_indication = text
-                    break
-
-        signatories = []
-        right_lines = []
-        if item.consultant:
-            signatories.append(
-                {
-                    "verification_label": "Electronically Verified",
-                    "name": item.consultant.display_name,
-                    "credentials": item.consultant.degrees,
-                    "registration": "",
-                }
-            )
-            right_lines = [
-                x
-                for x in [
-                    item.consultant.display_name,
-                    item.consultant.degrees,
-                    item.consultant.designation,
-                    item.consultant.mobile_number,
-                ]
-                if x
-            ]
-        elif report.created_by:
-            name = report.created_by.get_full_name() or report.created_by.username
-            signatories.append(
-                {
-                    "verification_label": "Electronically Verified",
-                    "name": name,
-                    "credentials": "",
-                    "registration": "",
-                }
-            )
-            right_lines = [name]
-
-        for raw in static_signatories:
-            if not isinstance(raw, dict):
-                continue
-            nm = str(raw.get("name", "")).strip()
-            ds = str(raw.get("designation", "")).strip()
-            if nm or ds:
-                signatories.append(
-                    {
-                        "verification_label": "Electronically Verified",
-                        "name": nm,
-                        "credentials": ds,
-                        "registration": str(raw.get("registration", "")).strip(),
-                    }
-                )
-
-        self.data = {
-            "header": {
-                "logo_path": logo_path,
-                "center_lines": center_lines,
-                "right_lines": right_lines,
-            },
-            "patient": {
-                "name": patient.name,
-                "age": str(patient.age or ""),
-                "sex": patient.gender or "",
-                "mrn": patient.patient_reg_no or patient.mrn,
-                "mobile": patient.phone or "",
-                "ref_no": visit.visit_id,
-                "referred_by": visit.referring_consultant or patient.referrer or "",
-                "study_datetime": item.created_at.strftime("%Y-%m-%d %H:%M"),
-                "report_datetime": report.updated_at.strftime("%Y-%m-%d %H:%M"),
-                "clinical_indication": clinical_indication,
-            },
-            "report_title": (report.template_v2.name or item.service.name or "Radiology Report").upper(),
-            "sections": {
-                "technique": self._listify(narrative.get("technique")) if isinstance(narrative, dict) else [],
-                "comparison": self._listify(narrative.get("comparison")) if isinstance(narrative, dict) else [],
-                "findings": findings,
-                "measurements": measurements,
-                "impression": self._listify(narrative.get("impression")) if isinstance(narrative, dict) else [],
-                "recommendations": self._listify(narrative.get("recommendations")) if isinstance(narrative, dict) else [],
-            },
-            "signatories": signatories,
-            "footer": {"disclaimer": disclaimer},
-        }
+        self.data = build_report_render_context(report, self.input_narrative_json)
+        if self.document_id:
+            self.data["document_id"] = self.document_id
 
     def draw_header(self, canvas, doc):
+        # Identical on every page: recorded once as a form XObject.
+        place_form(canvas, form_name("report_header", self.data["header"]), self._draw_header_content)
+
+    def _draw_header_content(self, canvas):
         canvas.saveState()
 
         left_x = MARGIN_LEFT
@@ -343,7 +180,7 @@ class ReportPDFGeneratorV2:
         logo_path = self.data["header"].get("logo_path")
         if logo_path and os.path.exists(logo_path):
             try:
-                logo = ImageReader(logo_path)
+                logo = cached_image_reader(logo_path)
                 iw, ih = logo.getSize()
                 max_w = 28 * mm
                 max_h = 18 * mm
@@ -381,6 +218,15 @@ class ReportPDFGeneratorV2:
         canvas.restoreState()
 
     def draw_footer(self, canvas, doc):
+        footer_text = self.data.get("footer", {}).get("disclaimer", "")
+        place_form(canvas, form_name("report_footer", footer_text), self._draw_footer_content)
+
+        canvas.saveState()
+        canvas.setFont("Helvetica", 8)
+        canvas.drawRightString(PAGE_WIDTH - MARGIN_RIGHT, MARGIN_BOTTOM - 3 * mm, f"Page {canvas.getPageNumber()}")
+        canvas.restoreState()
+
+    def _draw_footer_content(self, canvas):
         canvas.saveState()
         y = MARGIN_BOTTOM - 2 * mm
         canvas.setStrokeColor(DIVIDER)
@@ -391,9 +237,6 @@ class ReportPDFGeneratorV2:
         p = Paragraph(footer_text, self.styles["footer"])
         w, h = p.wrap(PAGE_WIDTH - MARGIN_LEFT - MARGIN_RIGHT, 10 * mm)
         p.drawOn(canvas, MARGIN_LEFT, y + 2 * mm)
-
-        canvas.setFont("Helvetica", 8)
-        canvas.drawRightString(PAGE_WIDTH - MARGIN_RIGHT, y - 1 * mm, f"Page {canvas.getPageNumber()}")
         canvas.restoreState()
 
     def _patient_table(self):
@@ -516,8 +359,30 @@ class ReportPDFGeneratorV2:
         return KeepTogether([Spacer(1, 10), table])
 
     def generate(self) -> bytes:
+        """Fetch report data in-process, then lay the PDF out in the render pool."""
         self.fetch_data()
+        return render_pdf(render_report_pdf_v2, self.data, label="report_v2")
+
+    def _document_options(self) -> dict:
+        """
+        With a document_id (the snapshot content hash) the PDF is deterministic:
+        ReportLab's invariant mode fixes the creation/modification dates, and the
+        file ID is a digest of the metadata, which includes the document_id.
+        """
+        document_id = self.data.get("document_id")
+        if not document_id:
+            return {}
+        return {
+            "invariant": 1,
+            "title": self.data.get("report_title", "RADIOLOGY REPORT"),
+            "author": "",
+            "subject": "Radiology report",
+            "keywords": [str(document_id)],
+            "creator": "RIMS",
+        }
 
+    def build(self) -> bytes:
+        """Lay out self.data (plain data from fetch_data) and return the PDF bytes."""
         doc = BaseDocTemplate(
             self.buffer,
             pagesize=A4,
@@ -525,6 +390,7 @@ class ReportPDFGeneratorV2:
             rightMargin=MARGIN_RIGHT,
             topMargin=MARGIN_TOP + HEADER_HEIGHT + 2 * mm,
             bottomMargin=MARGIN_BOTTOM + FOOTER_RESERVED,
+            **self._document_options(),
         )
 
         frame = Frame(doc.leftMargin, doc.bottomMargin, doc.width, doc.height, id="main")
@@ -580,9 +446,13 @@ class ReportPDFGeneratorV2:
                 Spacer(1, 2),
                 self._render_bullets(impression),
             ]
+            # The cell holds the flowables directly (a KeepTogether inside a cell
+            # reports an unbounded height); splitInRow lets a long impression
+            # continue on the next page.
             impression_table = Table(
-                [[KeepTogether(impression_block)]],
+                [[impression_block]],
                 colWidths=[PAGE_WIDTH - MARGIN_LEFT - MARGIN_RIGHT],
+                splitInRow=1,
                 style=TableStyle(
                     [
                         ("BACKGROUND", (0, 0), (-1, -1), SOFT_BG),
@@ -611,6 +481,14 @@ class ReportPDFGeneratorV2:
         return pdf_bytes
 
 
-def generate_report_pdf_v2(report_instance_v2_id, narrative_json=None) -> bytes:
-    generator = ReportPDFGeneratorV2(report_instance_v2_id, narrative_json)
+def render_report_pdf_v2(data: dict) -> bytes:
+    """Render pre-fetched report data; runs inside render pool workers."""
+    generator = ReportPDFGeneratorV2(None)
+    generator.data = data
+    return generator.build()
+
+
+def generate_report_pdf_v2(report_instance_v2_id, narrative_json=None, content_hash=None) -> bytes:
+    """Report PDF; passing the publish content_hash makes the output byte-for-byte reproducible."""
+    generator = ReportPDFGeneratorV2(report_instance_v2_id, narrative_json, document_id=content_hash)
     return generator.generate()
@@ -0,0 +1,262 @@
+"""
+Safe expression compiler for narrative computed_fields.
+
+Expressions are parsed and validated once and turned into nested closures, so
+evaluating a computed field is a plain function call per generation instead of
+an ast.parse plus tree walk.
+
+Supported (same as the previous SafeEvaluator):
+- Arithmetic: + - * / ** and unary -
+- Comparisons: == != < <= > >= (chained)
+- Functions: abs, round, min, max (keyword arguments are ignored)
+- Names resolve against the values dict: missing/None -> 0, numeric strings -> float
+- Literal constants
+
+Anything else is rejected at compile time with ExpressionError.
+"""
+
+import ast
+import logging
+import operator
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Pow: operator.pow,
+}
+
+_UNARY_OPERATORS = {
+    ast.USub: operator.neg,
+}
+
+_COMPARE_OPERATORS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+
+_FUNCTIONS = {
+    "abs": abs,
+    "round": round,
+    "min": min,
+    "max": max,
+}
+
+
+class ExpressionError(ValueError):
+    """Raised when an expression uses syntax outside the safe subset."""
+
+
+class CompiledExpression:
+    """A validated expression; call it with a values dict."""
+
+    __slots__ = ("source", "names", "_fn")
+
+    def __init__(self, source: str, names: FrozenSet[str], fn: Callable[[dict], Any]):
+        self.source = source
+        self.names = names
+        self._fn = fn
+
+    def __call__(self, context: Dict[str, Any]):
+        return self._fn(context)
+
+    def __repr__(self):
+        return f"CompiledExpression({self.source!r})"
+
+
+def _compile_node(node, names: set) -> Callable[[dict], Any]:
+    if isinstance(node, ast.BinOp):
+        op = _BINARY_OPERATORS.get(type(node.op))
+        if op is None:
+            raise ExpressionError(f"Operator not allowed: {type(node.op).__name__}")
+        left = _compile_node(node.left, names)
+        right = _compile_node(node.right, names)
+        return lambda ctx: op(left(ctx), right(ctx))
+
+    if isinstance(node, ast.UnaryOp):
+        op = _UNARY_OPERATORS.get(type(node.op))
+        if op is None:
+            raise ExpressionError(f"Operator not allowed: {type(node.op).__name__}")
+        operand = _compile_node(node.operand, names)
+        return lambda ctx: op(operand(ctx))
+
+    if isinstance(node, ast.Compare):
+        left = _compile_node(node.left, names)
+        steps = []
+        for op_node, comparator in zip(node.ops, node.comparators):
+            op = _COMPARE_OPERATORS.get(type(op_node))
+            if op is None:
+                raise ExpressionError(f"Operator not allowed: {type(op_node).__name__}")
+            steps.append((op, _compile_node(comparator, names)))
+        steps = tuple(steps)
+
+        def compare(ctx):
+            current = left(ctx)
+            for op, comparator in steps:
+                right = comparator(ctx)
+                if not op(current, right):
+                    return False
+                current = right
+            return True
+
+        return compare
+
+    if isinstance(node, ast.Call):
+        func_name = getattr(node.func, "id", None)
+        if not func_name or func_name not in _FUNCTIONS:
+            raise ExpressionError(f"Function {func_name} not allowed")
+        func = _FUNCTIONS[func_name]
+        args = tuple(_compile_node(arg, names) for arg in node.args)
+        return lambda ctx: func(*[arg(ctx) for arg in args])
+
+    if isinstance(node, ast.Name):
+        name = node.id
+        names.add(name)
+
+        def lookup(ctx):
+            val = ctx.get(name)
+            if val is None:
+                # For computed fields we prefer safe behavior over crashes.
+                return 0
+            try:
+                return float(val)
+            except (ValueError, TypeError):
+                return val
+
+        return lookup
+
+    if isinstance(node, ast.Constant):
+        value = node.value
+        return lambda ctx: value
+
+    raise ExpressionError(f"Operation not allowed: {type(node).__name__}")
+
+
+def compile_expression(expr: str) -> CompiledExpression:
+    """Parse and validate an expression. Raises ExpressionError (or SyntaxError)."""
+    if not isinstance(expr, str):
+        raise ExpressionError(f"Expression must be a string, got {type(expr).__name__}")
+    tree = ast.parse(expr, mode="eval")
+    names: set = set()
+    fn = _compile_node(tree.body, names)
+    return CompiledExpression(expr, frozenset(names), fn)
+
+
+@lru_cache(maxsize=512)
+def _compile_cached(expr: str) -> Tuple[Optional[CompiledExpression], Optional[str]]:
+    try:
+        return compile_expression(expr), None
+    except Exception as e:
+        return None, str(e)
+
+
+def safe_eval(expr: str, context: Dict[str, Any]):
+    """Evaluate an expression against context; returns None on any failure."""
+    if not expr:
+        return None
+    try:
+        compiled, error = _compile_cached(expr)
+    except TypeError as e:
+        # unhashable (non-string) expression
+        compiled, error = None, str(e)
+    if compiled is None:
+        logger.warning(f"Failed to evaluate expression '{expr}': {error}")
+        return None
+    try:
+        return compiled(context)
+    except Exception as e:
+        logger.warning(f"Failed to evaluate expression '{expr}': {e}")
+        return None
+
+
+# --- computed_fields ---
+
+
+class ComputedField:
+    __slots__ = ("name", "expression", "depends_on")
+
+    def __init__(self, name: str, expression: Optional[CompiledExpression], depends_on: Tuple[str, ...]):
+        self.name = name
+        self.expression = expression
+        self.depends_on = depends_on
+
+
+def _topological_order(names: List[str], deps: Dict[str, Tuple[str, ...]]) -> List[str]:
+    """Kahn's algorithm, always picking the earliest-declared ready field."""
+    position = {name: i for i, name in enumerate(names)}
+    remaining = {name: set(deps[name]) for name in names}
+    dependents: Dict[str, List[str]] = {name: [] for name in names}
+    for name in names:
+        for dep in deps[name]:
+            dependents[dep].append(name)
+
+    ready = sorted((name for name in names if not remaining[name]), key=position.get)
+    order: List[str] = []
+    while ready:
+        name = ready.pop(0)
+        order.append(name)
+        for dependent in dependents[name]:
+            remaining[dependent].discard(name)
+            if not remaining[dependent] and dependent not in order and dependent not in ready:
+                ready.append(dependent)
+        ready.sort(key=position.get)
+
+    if len(order) < len(names):
+        cyclic = [name for name in names if name not in order]
+        logger.warning(f"Cyclic computed_fields dependency: {', '.join(cyclic)}; using declaration order")
+        order.extend(cyclic)
+    return order
+
+
+def compile_computed_fields(computed_defs: Optional[dict]) -> Tuple[ComputedField, ...]:
+    """Compile computed_fields into evaluation order.
+
+    A computed field may reference other computed fields regardless of
+    declaration order; references to its own name read the input value.
+    Invalid expressions are reported once here and never produce a value.
+    """
+    computed_defs = computed_defs or {}
+    names = list(computed_defs.keys())
+    declared = set(names)
+
+    compiled: Dict[str, Optional[CompiledExpression]] = {}
+    deps: Dict[str, Tuple[str, ...]] = {}
+    for name in names:
+        expr = computed_defs[name]
+        expression = None
+        if expr:
+            try:
+                expression = compile_expression(expr)
+            except Exception as e:
+                logger.warning(f"Failed to compile expression '{expr}' for computed field '{name}': {e}")
+        compiled[name] = expression
+        refs = expression.names if expression is not None else ()
+        deps[name] = tuple(sorted(ref for ref in refs if ref in declared and ref != name))
+
+    return tuple(
+        ComputedField(name, compiled[name], deps[name]) for name in _topological_order(names, deps)
+    )
+
+
+def evaluate_computed_fields(fields: Tuple[ComputedField, ...], context_values: dict) -> dict:
+    """Evaluate compiled computed fields into context_values (in place) and return it."""
+    for field in fields:
+        if field.expression is None:
+            continue
+        try:
+            val = field.expression(context_values)
+        except Exception as e:
+            logger.warning(f"Failed to evaluate expression '{field.expression.source}': {e}")
+            continue
+        if val is not None:
+            context_values[field.name] = val
+    return context_values
@@ -0,0 +1,193 @@
+"""
+Content-addressed memoization of generated narratives.
+
+Key: sha256 over canonical JSON of (template id, template updated_at, values_json,
+mode, engine fingerprint). The fingerprint hashes the narrative engine sources so
+a deploy that changes generation never serves narratives from the old code.
+Narratives are stored as JSON text so every hit returns a fresh, independent dict.
+
+Tiers:
+- in-process LRU (settings.NARRATIVE_CACHE_SIZE entries, default 512; 0 disables)
+- optional shared on-disk tier (settings.NARRATIVE_CACHE_DIR; unset disables),
+  safe to share between workers: entries are immutable and written atomically.
+
+Counters are exposed via narrative_cache_stats() for ops.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE = 512
+
+_LOCK = threading.Lock()
+_MEMORY: "OrderedDict[str, str]" = OrderedDict()
+_STATS = {
+    "memory_hits": 0,
+    "disk_hits": 0,
+    "misses": 0,
+    "stores": 0,
+    "evictions": 0,
+    "disk_errors": 0,
+}
+
+_ENGINE_MODULES = ("expressions.py", "narrative_plan.py", "narrative_composer.py", "narrative_v2.py")
+_engine_fingerprint: Optional[str] = None
+
+
+def _get_engine_fingerprint() -> str:
+    global _engine_fingerprint
+    if _engine_fingerprint is None:
+        digest = hashlib.sha256()
+        here = Path(__file__).resolve().parent
+        for name in _ENGINE_MODULES:
+            digest.update((here / name).read_bytes())
+        _engine_fingerprint = digest.hexdigest()[:16]
+    return _engine_fingerprint
+
+
+def _memory_size() -> int:
+    return int(getattr(settings, "NARRATIVE_CACHE_SIZE", DEFAULT_CACHE_SIZE) or 0)
+
+
+def _disk_dir() -> Optional[Path]:
+    path = getattr(settings, "NARRATIVE_CACHE_DIR", None)
+    return Path(path) if path else None
+
+
+def narrative_cache_key(template_v2, values_json: Optional[dict], mode: str = "") -> Optional[str]:
+    """Canonical content hash for a generation, or None when it can't be keyed."""
+    template_id = getattr(template_v2, "pk", None)
+    updated_at = getattr(template_v2, "updated_at", None)
+    if template_id is None or updated_at is None:
+        return None
+    try:
+        canonical = json.dumps(
+            {
+                "template_id": str(template_id),
+                "template_version": updated_at.isoformat() if hasattr(updated_at, "isoformat") else str(updated_at),
+                "values": values_json or {},
+                "mode": mode,
+                "engine": _get_engine_fingerprint(),
+            },
+            sort_keys=True,
+            separators=(",", ":"),
+            ensure_ascii=True,
+        )
+    except (TypeError, ValueError):
+        # Non-JSON values are never persisted; don't memoize them either.
+        return None
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _disk_path(root: Path, key: str) -> Path:
+    return root / key[:2] / f"{key}.json"
+
+
+def get_cached_narrative(key: Optional[str]) -> Optional[dict]:
+    if key is None:
+        return None
+
+    with _LOCK:
+        payload = _MEMORY.get(key)
+        if payload is not None:
+            _MEMORY.move_to_end(key)
+            _STATS["memory_hits"] += 1
+            return json.loads(payload)
+
+    root = _disk_dir()
+    if root is not None:
+        try:
+            payload = _disk_path(root, key).read_text(encoding="utf-8")
+        except FileNotFoundError:
+            payload = None
+        except OSError as exc:
+            payload = None
+            with _LOCK:
+                _STATS["disk_errors"] += 1
+            logger.warning("narrative_cache_read_failed", extra={"event": "narrative_cache_read_failed", "error": str(exc)})
+        if payload is not None:
+            _remember(key, payload)
+            with _LOCK:
+                _STATS["disk_hits"] += 1
+            return json.loads(payload)
+
+    with _LOCK:
+        _STATS["misses"] += 1
+    return None
+
+
+def store_narrative(key: Optional[str], narrative_json: dict) -> None:
+    if key is None:
+        return
+    try:
+        payload = json.dumps(narrative_json, ensure_ascii=False)
+    except (TypeError, ValueError):
+        return
+
+    _remember(key, payload)
+    with _LOCK:
+        _STATS["stores"] += 1
+
+    root = _disk_dir()
+    if root is None:
+        return
+    path = _disk_path(root, key)
+    if path.exists():
+        return
+    tmp_name = None
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            handle.write(payload)
+        os.replace(tmp_name, path)
+    except OSError as exc:
+        if tmp_name and os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        with _LOCK:
+            _STATS["disk_errors"] += 1
+        logger.warning("narrative_cache_write_failed", extra={"event": "narrative_cache_write_failed", "error": str(exc)})
+
+
+def _remember(key: str, payload: str) -> None:
+    size = _memory_size()
+    if size <= 0:
+        return
+    with _LOCK:
+        _MEMORY[key] = payload
+        _MEMORY.move_to_end(key)
+        while len(_MEMORY) > size:
+            _MEMORY.popitem(last=False)
+            _STATS["evictions"] += 1
+
+
+def narrative_cache_stats() -> dict:
+    with _LOCK:
+        stats = dict(_STATS)
+        stats["memory_entries"] = len(_MEMORY)
+    lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+    stats["hit_ratio"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+    stats["memory_capacity"] = _memory_size()
+    root = _disk_dir()
+    stats["disk_enabled"] = root is not None
+    return stats
+
+
+def clear_narrative_cache(reset_stats: bool = True) -> None:
+    """Drop the in-process tier (the disk tier is content-addressed and left alone)."""
+    with _LOCK:
+        _MEMORY.clear()
+        if reset_stats:
+            for name in _STATS:
+                _STATS[name] = 0
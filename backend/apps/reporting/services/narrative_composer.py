@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import re
 from dataclasses import asdict, dataclass
+from functools import lru_cache
 from typing import Dict, Iterable, List, Optional, Tuple, Any
 
 # --- Composition Configuration (safe defaults) ---
@@ -109,8 +110,83 @@ TOPIC_ORDER_BY_ORGAN = {
 
 MAX_NEGATIVE_ITEMS = 6
 
+# --- Precompiled classifier (built from the tables above) ---
+#
+# One zero-width scan classifies a line: each alternative of the lookahead is a
+# TOPIC_HINTS pattern in precedence order (plus the kind hints), so at every
+# position the regex reports only the first alternative that matches there. For
+# the current tables, whose alternatives never start a match at the same place
+# with different meanings, that gives the same answer as testing the patterns in
+# turn. This is not true of arbitrary tables: NarrativeClassifierEquivalenceTests
+# checks it against the one-by-one evaluation, and anyone adding or changing a
+# pattern must extend that test with words that exercise it.
+
+
+def _build_classifier():
+    alternatives = []
+    group_topics: Dict[str, Tuple[int, str]] = {}
+    measurement_group = None
+    for rank, (topic, rx) in enumerate(TOPIC_HINTS):
+        name = f"topic{rank}"
+        alternatives.append(f"(?P<{name}>{rx.pattern})")
+        group_topics[name] = (rank, topic)
+        if rx.pattern == MEASUREMENT_HINT.pattern:
+            measurement_group = name
+    if measurement_group is None:
+        alternatives.append(f"(?P<measurement>{MEASUREMENT_HINT.pattern})")
+        measurement_group = "measurement"
+    alternatives.append(f"(?P<status>{STATUS_HINT.pattern})")
+    rx = re.compile("(?=" + "|".join(alternatives) + ")", re.IGNORECASE)
+    return rx, group_topics, measurement_group
+
+
+_CLASSIFIER_RX, _CLASSIFIER_TOPICS, _MEASUREMENT_GROUP = _build_classifier()
+_WHITESPACE_RX = re.compile(r"\s+")
+_SPACE_BEFORE_PUNCT_RX = re.compile(r"\s+([,.;:])")
+_NEGATION_RX = re.compile(r"^no\s+", re.IGNORECASE)
+_SIZE_VALUE_RX = re.compile(r"(\d+(?:\.\d+)?\s?(?:cm|mm))", re.IGNORECASE)
+_LEADING_IS_RX = re.compile(r"\bis\b\s+")
+_SUBJECT_PREFIX_RXS = tuple(
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (
+        r"^the\s+liver\s+",
+        r"^liver\s+",
+        r"^the\s+gallbladder\s+",
+        r"^gallbladder\s+",
+        r"^the\s+pancreas\s+",
+        r"^pancreas\s+",
+        r"^the\s+spleen\s+",
+        r"^spleen\s+",
+        r"^the\s+right\s+kidney\s+",
+        r"^the\s+left\s+kidney\s+",
+        r"^right\s+kidney\s+",
+        r"^left\s+kidney\s+",
+        r"^the\s+kidneys\s+",
+        r"^kidneys\s+",
+        r"^common\s+bile\s+duct\s+",
+        r"^the\s+common\s+bile\s+duct\s+",
+        r"^the\s+cbd\s+",
+        r"^cbd\s+",
+    )
+)
+
+
+def _build_prefix_trie() -> dict:
+    # Each node: {char: node, ..., None: rank of the ORGAN_PREFIX_MAP entry ending here}.
+    root: dict = {}
+    for rank, prefix in enumerate(ORGAN_PREFIX_MAP):
+        node = root
+        for ch in prefix:
+            node = node.setdefault(ch, {})
+        node.setdefault(None, rank)
+    return root
 
-@dataclass
+
+_PREFIX_TRIE = _build_prefix_trie()
+_PREFIX_ORGANS = list(ORGAN_PREFIX_MAP.values())
+
+
+@dataclass(slots=True)
 class NarrativeAtom:
     organ: str
     side: str
@@ -137,25 +213,17 @@ def compose_narrative(narrative_json: dict, values_json: Optional[dict] = None,
         organ_atoms = grouped.get(organ, [])
         if not organ_atoms:
             continue
-        paragraph = compose_organ_paragraph(organ_atoms, organ)
-        if not paragraph:
+        entry = _compose_organ_entry(organ_atoms, organ)
+        if entry is None:
             continue
-        narrative_by_organ.append(
-            {
-                "organ": organ,
-                "label": ORGAN_LABELS.get(organ, organ.title()),
-                "paragraph": paragraph,
-            }
-        )
+        narrative_by_organ.append(entry)
         if include_debug:
             debug_atoms[organ] = [asdict(a) for a in organ_atoms]
-            debug_paragraphs[organ] = paragraph
-
-    narrative_text = "\n".join(f"{item['label']}: {item['paragraph']}" for item in narrative_by_organ)
+            debug_paragraphs[organ] = entry["paragraph"]
 
     out = dict(narrative_json or {})
     out["narrative_by_organ"] = narrative_by_organ
-    out["narrative_text"] = narrative_text
+    out["narrative_text"] = _narrative_text(narrative_by_organ)
     if include_debug:
         out["composer_debug"] = {
             "atoms_by_organ": debug_atoms,
@@ -164,13 +232,79 @@ def compose_narrative(narrative_json: dict, values_json: Optional[dict] = None,
     return out
 
 
-def _sections_to_atoms(sections: Iterable[dict]) -> List[NarrativeAtom]:
+def recompose_narrative(narrative_json: dict, previous_by_organ: List[dict], organs: Iterable[str]) -> dict:
+    """Compose only the given organs; reuse previous_by_organ entries for the rest.
+
+    The caller guarantees that atoms of every other organ are unchanged (same
+    texts in the same relative order) since previous_by_organ was composed.
+    """
+    organs = set(organs)
+    sections = narrative_json.get("sections", []) if isinstance(narrative_json, dict) else []
+    grouped: Dict[str, List[NarrativeAtom]] = {}
+    if organs:
+        for atom in _sections_to_atoms(sections, organs=organs):
+            grouped.setdefault(atom.organ, []).append(atom)
+    previous = {entry.get("organ"): entry for entry in previous_by_organ or []}
+
+    narrative_by_organ = []
+    for organ in ORGAN_ORDER:
+        if organ in organs:
+            organ_atoms = grouped.get(organ, [])
+            entry = _compose_organ_entry(organ_atoms, organ) if organ_atoms else None
+        else:
+            entry = dict(previous[organ]) if organ in previous else None
+        if entry is not None:
+            narrative_by_organ.append(entry)
+
+    out = dict(narrative_json or {})
+    out["narrative_by_organ"] = narrative_by_organ
+    out["narrative_text"] = _narrative_text(narrative_by_organ)
+    return out
+
+
+def organs_for_lines(section_title: str, lines: Iterable[Any]) -> set:
+    """Organs the given section lines are grouped under by compose_narrative."""
+    title = str(section_title)
+    static = organ_for_section_title(title)
+    organs = set()
+    for raw_line in lines:
+        if isinstance(raw_line, dict):
+            # Structured lines may carry their own organ/source_key; classify like _sections_to_atoms.
+            text = _normalize_text(str(raw_line.get("text", "") or ""))
+            if text:
+                source_key = str(raw_line.get("source_key", "") or "")
+                organs.add(str(raw_line.get("organ") or _infer_organ(title, text, source_key)))
+            continue
+        text = _normalize_text(str(raw_line or ""))
+        if text:
+            organs.add(static or _infer_organ(title, text))
+    return organs
+
+
+def _compose_organ_entry(organ_atoms: List[NarrativeAtom], organ: str) -> Optional[dict]:
+    paragraph = compose_organ_paragraph(organ_atoms, organ)
+    if not paragraph:
+        return None
+    return {
+        "organ": organ,
+        "label": ORGAN_LABELS.get(organ, organ.title()),
+        "paragraph": paragraph,
+    }
+
+
+def _narrative_text(narrative_by_organ: List[dict]) -> str:
+    return "\n".join(f"{item['label']}: {item['paragraph']}" for item in narrative_by_organ)
+
+
+def _sections_to_atoms(sections: Iterable[dict], organs: Optional[set] = None) -> List[NarrativeAtom]:
     """Convert generator sections into NarrativeAtoms.
 
     Backward compatible:
     - legacy sections: lines are strings
     Forward compatible:
     - lines can also be dicts: {text, source_key, organ, side, kind, priority, topic, role}
+
+    When organs is given, atoms for other organs are skipped (priorities are unaffected).
     """
     atoms: List[NarrativeAtom] = []
     for section_idx, section in enumerate(sections):
@@ -196,6 +330,8 @@ def _sections_to_atoms(sections: Iterable[dict]) -> List[NarrativeAtom]:
 
             source_key = str(payload.get("source_key", "") or "")
             organ = str(payload.get("organ") or _infer_organ(title, text, source_key))
+            if organs is not None and organ not in organs:
+                continue
             kind = str(payload.get("kind") or _infer_kind(text))
             side = str(payload.get("side") or _infer_side(source_key, text))
             topic = str(payload.get("topic") or _infer_topic(text, organ))
@@ -223,15 +359,14 @@ def _sections_to_atoms(sections: Iterable[dict]) -> List[NarrativeAtom]:
 
 
 def _infer_organ(section_title: str, text: str, source_key: str = "") -> str:
-    key = (source_key or "").lower()
-    for prefix, organ in ORGAN_PREFIX_MAP.items():
-        if key.startswith(prefix) or f"_{prefix}" in key:
+    if source_key:
+        organ = _organ_for_source_key(source_key.lower())
+        if organ:
             return organ
 
-    lowered_title = (section_title or "").lower()
-    for hint, organ in SECTION_TITLE_MAP.items():
-        if hint in lowered_title:
-            return organ
+    organ = organ_for_section_title(section_title)
+    if organ:
+        return organ
 
     lowered = text.lower()
     if "common bile duct" in lowered or " cbd" in f" {lowered} " or "gallbladder" in lowered:
@@ -257,27 +392,89 @@ def _infer_organ(section_title: str, text: str, source_key: str = "") -> str:
     return "misc"
 
 
+@lru_cache(maxsize=1024)
+def _organ_for_source_key(key: str) -> Optional[str]:
+    """First ORGAN_PREFIX_MAP entry (in map order) found at the start of key or after an underscore."""
+    best = None
+    for start in range(len(key)):
+        if start and key[start - 1] != "_":
+            continue
+        node = _PREFIX_TRIE
+        for ch in key[start:]:
+            node = node.get(ch)
+            if node is None:
+                break
+            rank = node.get(None)
+            if rank is not None and (best is None or rank < best):
+                best = rank
+        if best == 0:
+            break
+    return _PREFIX_ORGANS[best] if best is not None else None
+
+
+@lru_cache(maxsize=1024)
+def organ_for_section_title(section_title: str) -> Optional[str]:
+    """Organ implied by a section title alone, or None when lines decide."""
+    lowered_title = (section_title or "").lower()
+    for hint, organ in SECTION_TITLE_MAP.items():
+        if hint in lowered_title:
+            return organ
+    return None
+
+
 def _normalize_text(text: str) -> str:
-    cleaned = re.sub(r"\s+", " ", text).strip()
+    cleaned = _WHITESPACE_RX.sub(" ", text).strip()
     cleaned = cleaned.rstrip(".").strip()
     return cleaned
 
 
-def _infer_kind(text: str) -> str:
+@lru_cache(maxsize=4096)
+def _classify_text(text: str) -> Tuple[str, Optional[str]]:
+    """(kind, hinted topic or None) for a normalized line, in one regex pass."""
+    if not text.isascii():
+        # lower() and IGNORECASE can disagree outside ASCII; use the tables directly.
+        low = text.lower()
+        topic = next((t for t, rx in TOPIC_HINTS if rx.search(low)), None)
+        if NEGATIVE_PREFIX.match(text):
+            return "negative", topic
+        if MEASUREMENT_HINT.search(text):
+            return "measurement", topic
+        if STATUS_HINT.search(text):
+            return "status", topic
+        return "positive", topic
+
+    best_rank = len(TOPIC_HINTS)
+    measurement = status = False
+    for match in _CLASSIFIER_RX.finditer(text):
+        group = match.lastgroup
+        if group == "status":
+            status = True
+            continue
+        if group == _MEASUREMENT_GROUP:
+            measurement = True
+        hinted = _CLASSIFIER_TOPICS.get(group)
+        if hinted is not None and hinted[0] < best_rank:
+            best_rank = hinted[0]
+    topic = TOPIC_HINTS[best_rank][0] if best_rank < len(TOPIC_HINTS) else None
+
     if NEGATIVE_PREFIX.match(text):
-        return "negative"
-    if MEASUREMENT_HINT.search(text):
-        return "measurement"
-    if STATUS_HINT.search(text):
-        return "status"
-    return "positive"
+        return "negative", topic
+    if measurement:
+        return "measurement", topic
+    if status:
+        return "status", topic
+    return "positive", topic
+
+
+def _infer_kind(text: str) -> str:
+    return _classify_text(text)[0]
 
 
 def _infer_topic(text: str, organ: str) -> str:
+    hinted = _classify_text(text)[1]
+    if hinted:
+        return hinted
     low = text.lower()
-    for topic, rx in TOPIC_HINTS:
-        if rx.search(low):
-            return topic
     # organ-specific soft fallbacks
     if organ == "gallbladder_cbd" and ("stone" in low or "calculus" in low):
         return "stones"
@@ -492,54 +689,69 @@ def _dedupe_atoms(atoms: List[NarrativeAtom]) -> List[NarrativeAtom]:
     seen = set()
     deduped: List[NarrativeAtom] = []
     for atom in sorted(atoms, key=lambda x: x.priority):
-        key = re.sub(r"\s+", " ", atom.text.lower()).strip()
+        key = _WHITESPACE_RX.sub(" ", atom.text.lower()).strip()
         if key in seen:
             continue
         seen.add(key)
         deduped.append(atom)
 
-    # Substring prune: if a short statement is fully contained in a longer one, drop the short one.
+    # Substring prune: if a short statement (14+ chars) is fully contained in one
+    # more than 8 chars longer, drop the short one.
     texts = [a.text.lower() for a in deduped]
-    drop = set()
-    for i, ti in enumerate(texts):
-        if i in drop:
-            continue
-        for j, tj in enumerate(texts):
-            if i == j:
-                continue
-            if len(ti) < 14:
-                continue
-            if ti in tj and len(tj) > len(ti) + 8:
-                drop.add(i)
-                break
-
+    drop = _contained_indexes(texts)
     return [a for idx, a in enumerate(deduped) if idx not in drop]
 
 
+def _contained_indexes(texts: List[str]) -> set:
+    """Indexes i with len(texts[i]) >= 14 contained in some text longer by more than 8."""
+    candidates = [i for i, t in enumerate(texts) if len(t) >= 14]
+    if not candidates:
+        return set()
+    if any("\x00" in t for t in texts):
+        return {
+            i for i in candidates
+            if any(texts[i] in tj and len(tj) > len(texts[i]) + 8 for tj in texts)
+        }
+
+    # Containment index: all texts joined longest-first, so the texts long enough
+    # to contain texts[i] form a prefix of the haystack and one bounded find()
+    # covers them. "\x00" separators keep matches inside a single text.
+    by_length = sorted(texts, key=len, reverse=True)
+    haystack = "\x00".join(by_length)
+    ends = []
+    offset = 0
+    for t in by_length:
+        offset += len(t)
+        ends.append(offset)
+        offset += 1
+    lengths = [len(t) for t in by_length]
+
+    drop = set()
+    for i in candidates:
+        ti = texts[i]
+        # number of texts with len > len(ti) + 8 (lengths are descending)
+        lo, hi = 0, len(lengths)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if lengths[mid] > len(ti) + 8:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo and haystack.find(ti, 0, ends[lo - 1]) != -1:
+            drop.add(i)
+    return drop
+
+
 def _to_phrase(text: str, organ: str) -> str:
+    return _strip_subject(text)
+
+
+@lru_cache(maxsize=4096)
+def _strip_subject(text: str) -> str:
     t = _normalize_text(text)
-    patterns = [
-        r"^the\s+liver\s+",
-        r"^liver\s+",
-        r"^the\s+gallbladder\s+",
-        r"^gallbladder\s+",
-        r"^the\s+pancreas\s+",
-        r"^pancreas\s+",
-        r"^the\s+spleen\s+",
-        r"^spleen\s+",
-        r"^the\s+right\s+kidney\s+",
-        r"^the\s+left\s+kidney\s+",
-        r"^right\s+kidney\s+",
-        r"^left\s+kidney\s+",
-        r"^the\s+kidneys\s+",
-        r"^kidneys\s+",
-        r"^common\s+bile\s+duct\s+",
-        r"^the\s+common\s+bile\s+duct\s+",
-        r"^the\s+cbd\s+",
-        r"^cbd\s+",
-    ]
-    for p in patterns:
-        t = re.sub(p, "", t, flags=re.IGNORECASE)
+    # Applied in sequence: an earlier strip can expose a later prefix.
+    for rx in _SUBJECT_PREFIX_RXS:
+        t = rx.sub("", t)
 
     t = t.strip()
     if t and t[0].isupper():
@@ -578,7 +790,7 @@ def _compress_negatives(negatives: List[NarrativeAtom], standalone: bool = True)
     items: List[str] = []
     for atom in negatives:
         txt = _to_phrase(atom.text, atom.organ)
-        txt = re.sub(r"^no\s+", "", txt, flags=re.IGNORECASE).strip(" .,")
+        txt = _NEGATION_RX.sub("", txt).strip(" .,")
         if txt:
             items.append(txt)
 
@@ -619,7 +831,7 @@ def _extract_side_measurement(measurements: List[NarrativeAtom], side: str) -> s
             continue
         if side == "L" and "right" in atom.text.lower():
             continue
-        match = re.search(r"(\d+(?:\.\d+)?\s?(?:cm|mm))", atom.text, flags=re.IGNORECASE)
+        match = _SIZE_VALUE_RX.search(atom.text)
         if match:
             return match.group(1)
     return ""
@@ -637,7 +849,7 @@ def _common_phrase(texts: List[str], needle: str) -> str:
             phrase = _to_phrase(text, "kidneys")
             if phrase.startswith("is "):
                 phrase = phrase[3:]
-            phrase = re.sub(r"\bis\b\s+", "", phrase, count=1)
+            phrase = _LEADING_IS_RX.sub("", phrase, count=1)
             return phrase
     return ""
 
@@ -666,7 +878,7 @@ def _cap_sentences(sentences: List[str]) -> str:
         if not sentence.endswith("."):
             sentence += "."
         # Normalize spacing around punctuation
-        sentence = re.sub(r"\s+", " ", sentence)
-        sentence = re.sub(r"\s+([,.;:])", r"\1", sentence)
+        sentence = _WHITESPACE_RX.sub(" ", sentence)
+        sentence = _SPACE_BEFORE_PUNCT_RX.sub(r"\1", sentence)
         clean.append(sentence)
     return " ".join(clean).strip()
@@ -0,0 +1,874 @@
+"""
+Compiled narrative plans for ReportTemplateV2.
+
+A template's narrative_rules (sections, impression_rules, placeholders) are
+compiled once into an immutable executable plan. Executing a plan only
+evaluates conditions and fills placeholders; sorting, placeholder parsing and
+rule-shape dispatch all happen at compile time.
+
+Plans are cached per template version, keyed by (template.id, template.updated_at).
+Every save of a template bumps updated_at, so an edited template is recompiled
+on its next use. Unsaved, in-memory templates are never cached.
+
+Semantics are identical to the interpretive helpers kept in this module
+(_evaluate_condition, _render_template), which also serve as the fallback for
+rule shapes the compiler does not specialise.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from .expressions import ComputedField, compile_computed_fields, evaluate_computed_fields
+
+PLAN_CACHE_SIZE = 64
+
+# Template placeholders:
+#   - required: {{field}}
+#   - optional: {{field?}}
+#   - default:  {{field|N/A}} or {{field?|N/A}}
+_PLACEHOLDER_RX = re.compile(r"\{\{([^}]+)\}\}")
+_WHITESPACE_RX = re.compile(r"\s+")
+_SPACE_BEFORE_PUNCT_RX = re.compile(r"\s+([,.;:])")
+_EMPTY_PARENS_RX = re.compile(r"\(\s*\)")
+
+
+# --- Value helpers (shared with narrative_v2) ---
+
+
+def _is_empty(val: Any) -> bool:
+    if val is None:
+        return True
+    if isinstance(val, str) and val.strip() == "":
+        return True
+    if isinstance(val, (list, tuple, set, dict)) and len(val) == 0:
+        return True
+    return False
+
+
+def _coerce_number(val: Any) -> Optional[float]:
+    if val is None:
+        return None
+    if isinstance(val, (int, float)):
+        return float(val)
+    if isinstance(val, bool):
+        return 1.0 if val else 0.0
+    if isinstance(val, str):
+        s = val.strip()
+        if s == "":
+            return None
+        try:
+            return float(s)
+        except ValueError:
+            return None
+    return None
+
+
+def _format_value(value, field_name: str, json_schema: dict) -> str:
+    if value is None:
+        return ""
+
+    if isinstance(value, bool):
+        return "Present" if value else "Absent"
+
+    if isinstance(value, list):
+        return ", ".join(str(v) for v in value)
+
+    return str(value)
+
+
+def _parse_placeholder(token: str) -> Dict[str, Any]:
+    token = (token or "").strip()
+    default = None
+    if "|" in token:
+        token, default = token.split("|", 1)
+        token = token.strip()
+        default = default.strip()
+
+    optional = False
+    if token.startswith("?"):
+        optional = True
+        token = token[1:].strip()
+    if token.endswith("?"):
+        optional = True
+        token = token[:-1].strip()
+
+    return {"field": token, "optional": optional, "default": default}
+
+
+# --- Interpretive reference implementations ---
+
+
+def _evaluate_condition(condition, values):
+    """Evaluate condition dict.
+
+    Backward compatible with existing schema.
+    New (optional) composite operators:
+      - {"all": [cond1, cond2, ...]}
+      - {"any": [cond1, cond2, ...]}
+      - {"not": cond}
+    """
+    if not condition:
+        return True
+
+    if isinstance(condition, dict):
+        if "all" in condition and isinstance(condition["all"], list):
+            return all(_evaluate_condition(c, values) for c in condition["all"])
+        if "any" in condition and isinstance(condition["any"], list):
+            return any(_evaluate_condition(c, values) for c in condition["any"])
+        if "not" in condition:
+            return not _evaluate_condition(condition["not"], values)
+
+    field = condition.get("field") if isinstance(condition, dict) else None
+    val = values.get(field) if field else None
+
+    # Operators
+    if "equals" in condition:
+        return val == condition["equals"]
+    if "not_equals" in condition:
+        return val != condition["not_equals"]
+
+    if "gt" in condition:
+        left = _coerce_number(val)
+        right = _coerce_number(condition["gt"])
+        return left is not None and right is not None and left > right
+    if "gte" in condition:
+        left = _coerce_number(val)
+        right = _coerce_number(condition["gte"])
+        return left is not None and right is not None and left >= right
+    if "lt" in condition:
+        left = _coerce_number(val)
+        right = _coerce_number(condition["lt"])
+        return left is not None and right is not None and left < right
+    if "lte" in condition:
+        left = _coerce_number(val)
+        right = _coerce_number(condition["lte"])
+        return left is not None and right is not None and left <= right
+
+    if "is_empty" in condition:
+        return _is_empty(val)
+    if "is_not_empty" in condition:
+        return not _is_empty(val)
+
+    if "in" in condition:
+        pool = condition["in"]
+        if isinstance(val, list):
+            return any(v in pool for v in val)
+        return val in pool
+
+    if "not_in" in condition:
+        pool = condition["not_in"]
+        if isinstance(val, list):
+            return all(v not in pool for v in val)
+        return val not in pool
+
+    # New lightweight string operator
+    if "contains" in condition:
+        needle = str(condition["contains"]).lower()
+        return isinstance(val, str) and needle in val.lower()
+
+    return False
+
+
+def _normalize_rendered(rendered: str) -> str:
+    # Normalize whitespace/punctuation artifacts from optional blanks.
+    # " ".join(split()) is equivalent to collapsing \s+ and stripping.
+    rendered = " ".join(rendered.split())
+    rendered = _SPACE_BEFORE_PUNCT_RX.sub(r"\1", rendered)
+    if "(" in rendered:
+        rendered = _EMPTY_PARENS_RX.sub("", rendered)
+    return rendered.strip()
+
+
+def _render_template(template: str, values: dict, json_schema: dict) -> str:
+    # Find all {{...}} placeholders (supports optional/default).
+    tokens = _PLACEHOLDER_RX.findall(template or "")
+    if not tokens:
+        return (template or "").strip()
+
+    placeholders = [_parse_placeholder(t) for t in tokens]
+
+    # Skip if any required placeholder is missing AND no default is provided.
+    for ph in placeholders:
+        if ph["optional"]:
+            continue
+        field = ph["field"]
+        if not field:
+            continue
+        val = values.get(field)
+        if _is_empty(val) and not ph["default"]:
+            return ""
+
+    def replace_field(match):
+        ph = _parse_placeholder(match.group(1))
+        field_name = ph["field"]
+        val = values.get(field_name)
+        if _is_empty(val):
+            return ph["default"] or ""
+        return _format_value(val, field_name, json_schema)
+
+    rendered = _PLACEHOLDER_RX.sub(replace_field, template or "")
+    return _normalize_rendered(rendered)
+
+
+# --- Compiled conditions ---
+
+
+Condition = Callable[[dict], bool]
+
+
+def _always_true(values) -> bool:
+    return True
+
+
+def _always_false(values) -> bool:
+    return False
+
+
+def compile_condition(condition) -> Condition:
+    """Compile a condition into a predicate over a values dict."""
+    if not condition:
+        return _always_true
+
+    if not isinstance(condition, dict):
+        # Unusual shapes keep the interpretive semantics.
+        return lambda values: _evaluate_condition(condition, values)
+
+    if "all" in condition and isinstance(condition["all"], list):
+        subs = tuple(compile_condition(c) for c in condition["all"])
+        return lambda values: all(sub(values) for sub in subs)
+    if "any" in condition and isinstance(condition["any"], list):
+        subs = tuple(compile_condition(c) for c in condition["any"])
+        return lambda values: any(sub(values) for sub in subs)
+    if "not" in condition:
+        sub = compile_condition(condition["not"])
+        return lambda values: not sub(values)
+
+    field = condition.get("field") or None
+
+    if field is None:
+        def get(values):
+            return None
+    else:
+        def get(values):
+            return values.get(field)
+
+    if "equals" in condition:
+        expected = condition["equals"]
+        return lambda values: get(values) == expected
+    if "not_equals" in condition:
+        expected = condition["not_equals"]
+        return lambda values: get(values) != expected
+
+    for key, compare in (
+        ("gt", float.__gt__),
+        ("gte", float.__ge__),
+        ("lt", float.__lt__),
+        ("lte", float.__le__),
+    ):
+        if key in condition:
+            right = _coerce_number(condition[key])
+            if right is None:
+                return _always_false
+
+            def numeric(values, right=right, compare=compare):
+                left = _coerce_number(get(values))
+                return left is not None and compare(left, right)
+
+            return numeric
+
+    if "is_empty" in condition:
+        return lambda values: _is_empty(get(values))
+    if "is_not_empty" in condition:
+        return lambda values: not _is_empty(get(values))
+
+    if "in" in condition:
+        pool = condition["in"]
+
+        def is_in(values):
+            val = get(values)
+            if isinstance(val, list):
+                return any(v in pool for v in val)
+            return val in pool
+
+        return is_in
+
+    if "not_in" in condition:
+        pool = condition["not_in"]
+
+        def not_in(values):
+            val = get(values)
+            if isinstance(val, list):
+                return all(v not in pool for v in val)
+            return val not in pool
+
+        return not_in
+
+    if "contains" in condition:
+        needle = str(condition["contains"]).lower()
+
+        def contains(values):
+            val = get(values)
+            return isinstance(val, str) and needle in val.lower()
+
+        return contains
+
+    return _always_false
+
+
+# --- Field dependencies ---
+#
+# Dependency sets are frozensets of values_json/computed field names. None means
+# "may read any field" (used for shapes that cannot be analysed statically).
+
+Fields = Optional[FrozenSet[str]]
+_NO_FIELDS: FrozenSet[str] = frozenset()
+
+
+def _union_fields(*field_sets: Fields) -> Fields:
+    merged = set()
+    for fields in field_sets:
+        if fields is None:
+            return None
+        merged.update(fields)
+    return frozenset(merged)
+
+
+def condition_fields(condition) -> Fields:
+    """Fields a condition reads, mirroring compile_condition's dispatch."""
+    if not condition:
+        return _NO_FIELDS
+    if not isinstance(condition, dict):
+        return None
+    if "all" in condition and isinstance(condition["all"], list):
+        return _union_fields(*(condition_fields(c) for c in condition["all"]))
+    if "any" in condition and isinstance(condition["any"], list):
+        return _union_fields(*(condition_fields(c) for c in condition["any"]))
+    if "not" in condition:
+        return condition_fields(condition["not"])
+    field = condition.get("field")
+    if not field:
+        return _NO_FIELDS
+    try:
+        return frozenset([field])
+    except TypeError:
+        return None
+
+
+def _elapsed_us(start_ns: int) -> float:
+    return round((time.perf_counter_ns() - start_ns) / 1000, 1)
+
+
+def trace_condition(condition, values) -> Tuple[bool, Dict[str, Any]]:
+    """Evaluate a condition like compile_condition, also describing how it was decided.
+
+    all/any report how many sub-conditions ran before short-circuiting.
+    """
+    if not condition:
+        return True, {"op": "always"}
+    if not isinstance(condition, dict):
+        result = _evaluate_condition(condition, values)
+        return result, {"op": "raw", "result": result}
+
+    for op in ("all", "any"):
+        if op in condition and isinstance(condition[op], list):
+            children = []
+            result = op == "all"
+            for child in condition[op]:
+                child_result, detail = trace_condition(child, values)
+                children.append(detail)
+                if child_result != (op == "all"):
+                    result = child_result
+                    break
+            return result, {
+                "op": op,
+                "result": result,
+                "evaluated": len(children),
+                "of": len(condition[op]),
+                "short_circuited": len(children) < len(condition[op]),
+                "children": children,
+            }
+    if "not" in condition:
+        child_result, detail = trace_condition(condition["not"], values)
+        return not child_result, {"op": "not", "result": not child_result, "children": [detail]}
+
+    result = compile_condition(condition)(values)
+    field = condition.get("field")
+    operator_name = next(
+        (
+            key
+            for key in ("equals", "not_equals", "gt", "gte", "lt", "lte", "is_empty", "is_not_empty", "in", "not_in", "contains")
+            if key in condition
+        ),
+        None,
+    )
+    detail = {"op": operator_name or "unknown", "field": field, "result": result}
+    if operator_name and operator_name not in ("is_empty", "is_not_empty"):
+        detail["expected"] = condition[operator_name]
+    detail["value"] = values.get(field) if field else None
+    return result, detail
+
+
+# --- Compiled templates ---
+
+
+class CompiledTemplate:
+    """A placeholder template split into literal and placeholder parts."""
+
+    __slots__ = ("source", "constant", "parts", "required", "fields")
+
+    def __init__(self, template: str):
+        self.source = template
+        tokens = _PLACEHOLDER_RX.findall(template or "")
+        # Constant templates render to their stripped text without normalization.
+        self.constant = None if tokens else (template or "").strip()
+
+        parts: List[Any] = []
+        required: List[str] = []
+        fields: List[str] = []
+        pos = 0
+        for match in _PLACEHOLDER_RX.finditer(template or ""):
+            if match.start() > pos:
+                parts.append(template[pos:match.start()])
+            ph = _parse_placeholder(match.group(1))
+            parts.append((ph["field"], ph["default"] or ""))
+            if ph["field"]:
+                fields.append(ph["field"])
+                if not ph["optional"] and not ph["default"] and ph["field"] not in required:
+                    required.append(ph["field"])
+            pos = match.end()
+        if template and pos < len(template):
+            parts.append(template[pos:])
+
+        self.parts = tuple(parts)
+        self.required = tuple(required)
+        self.fields = tuple(dict.fromkeys(fields))
+
+    def render(self, values: dict) -> str:
+        if self.constant is not None:
+            return self.constant
+
+        for field in self.required:
+            if _is_empty(values.get(field)):
+                return ""
+
+        chunks = []
+        for part in self.parts:
+            if part.__class__ is str:
+                chunks.append(part)
+                continue
+            field_name, default = part
+            val = values.get(field_name)
+            if _is_empty(val):
+                chunks.append(default)
+            else:
+                chunks.append(_format_value(val, field_name, None))
+        return _normalize_rendered("".join(chunks))
+
+    def trace(self, values: dict) -> Tuple[str, Dict[str, Any]]:
+        text = self.render(values)
+        missing = [field for field in self.fields if _is_empty(values.get(field))]
+        entry: Dict[str, Any] = {"template": self.source, "output": text or None}
+        if missing:
+            entry["missing"] = missing
+            entry["skipped"] = any(field in self.required for field in missing)
+        return text, entry
+
+
+# --- Compiled rule nodes ---
+
+
+class _TemplateNode:
+    __slots__ = ("template",)
+
+    def __init__(self, template: CompiledTemplate):
+        self.template = template
+
+    def run(self, values: dict, out: List[str]) -> None:
+        text = self.template.render(values)
+        if text:
+            out.append(text)
+
+    def fields(self) -> Fields:
+        return frozenset(self.template.fields)
+
+    def trace(self, values: dict, out: List[str]) -> Dict[str, Any]:
+        text, entry = self.template.trace(values)
+        if text:
+            out.append(text)
+        return {"rule": "text", **entry}
+
+
+class _SequenceNode:
+    __slots__ = ("nodes",)
+
+    def __init__(self, nodes):
+        self.nodes = tuple(nodes)
+
+    def run(self, values: dict, out: List[str]) -> None:
+        for node in self.nodes:
+            node.run(values, out)
+
+    def fields(self) -> Fields:
+        return _union_fields(*(node.fields() for node in self.nodes))
+
+    def trace(self, values: dict, out: List[str]) -> Dict[str, Any]:
+        return {"rule": "list", "children": [node.trace(values, out) for node in self.nodes]}
+
+
+class _ConditionalNode:
+    """{"if": cond, "then": rule, "else": rule, "rules": rule} with fall-through to "rules"."""
+
+    __slots__ = ("source", "condition", "has_if", "then", "has_then", "otherwise", "has_else", "rules", "has_rules")
+
+    def __init__(self, rule: dict):
+        self.source = rule
+        self.has_if = "if" in rule
+        self.condition = compile_condition(rule.get("if")) if self.has_if else None
+        self.has_then = "then" in rule
+        self.then = _compile_rule(rule.get("then"))
+        self.has_else = "else" in rule
+        self.otherwise = _compile_rule(rule.get("else"))
+        self.has_rules = "rules" in rule
+        self.rules = _compile_rule(rule.get("rules"))
+
+    def run(self, values: dict, out: List[str]) -> None:
+        if self.has_if:
+            if self.condition(values):
+                if self.has_then:
+                    if self.then is not None:
+                        self.then.run(values, out)
+                    return
+            elif self.has_else:
+                if self.otherwise is not None:
+                    self.otherwise.run(values, out)
+                return
+
+        if self.has_rules and self.rules is not None:
+            self.rules.run(values, out)
+
+    def trace(self, values: dict, out: List[str]) -> Dict[str, Any]:
+        entry: Dict[str, Any] = {"rule": "if" if self.has_if else "rules"}
+        branch = None
+        if self.has_if:
+            result, detail = trace_condition(self.source.get("if"), values)
+            entry["condition"] = detail
+            entry["result"] = result
+            if result and self.has_then:
+                branch = "then"
+            elif not result and self.has_else:
+                branch = "else"
+        if branch is None and self.has_rules:
+            branch = "rules"
+
+        node = {"then": self.then, "else": self.otherwise, "rules": self.rules}.get(branch)
+        entry["branch"] = branch
+        if node is not None:
+            entry["children"] = [node.trace(values, out)]
+        return entry
+
+    def fields(self) -> Fields:
+        parts = [condition_fields(self.source.get("if")) if self.has_if else _NO_FIELDS]
+        parts.extend(node.fields() for node in (self.then, self.otherwise, self.rules) if node is not None)
+        return _union_fields(*parts)
+
+
+def _compile_rule(rule):
+    """Compile a single rule (string, list, or dict condition) into a node, or None."""
+    if isinstance(rule, str):
+        return _TemplateNode(CompiledTemplate(rule))
+
+    if isinstance(rule, list):
+        nodes = [node for node in (_compile_rule(r) for r in rule) if node is not None]
+        return _SequenceNode(nodes) if nodes else None
+
+    if isinstance(rule, dict):
+        if "if" in rule or "rules" in rule:
+            return _ConditionalNode(rule)
+
+    return None
+
+
+class CompiledSection:
+    __slots__ = ("index", "title", "nodes")
+
+    def __init__(self, index: int, title, content_rules):
+        self.index = index
+        self.title = title
+        nodes = []
+        for rule in content_rules:
+            node = _compile_rule(rule)
+            if node is not None:
+                nodes.append(node)
+        self.nodes = tuple(nodes)
+
+    def render(self, values: dict) -> List[str]:
+        lines: List[str] = []
+        for node in self.nodes:
+            node.run(values, lines)
+        return lines
+
+    def fields(self) -> Fields:
+        return _union_fields(*(node.fields() for node in self.nodes))
+
+    def trace(self, values: dict) -> Tuple[List[str], Dict[str, Any]]:
+        start = time.perf_counter_ns()
+        lines: List[str] = []
+        rules = [node.trace(values, lines) for node in self.nodes]
+        return lines, {"title": self.title, "lines": len(lines), "us": _elapsed_us(start), "rules": rules}
+
+
+class CompiledImpressionRule:
+    __slots__ = ("source", "index", "condition", "template", "stop")
+
+    def __init__(self, rule: dict, index: int = 0):
+        self.source = rule
+        self.index = index
+        self.condition = compile_condition(rule.get("when"))
+        text = rule.get("text", "")
+        if not text:
+            self.template = None
+        elif isinstance(text, str):
+            self.template = CompiledTemplate(text)
+        else:
+            self.template = text
+        # allow multiple matches; only stop when explicitly requested
+        self.stop = not rule.get("continue", False)
+
+    def render(self, values: dict) -> str:
+        if self.template is None:
+            return ""
+        if isinstance(self.template, CompiledTemplate):
+            return self.template.render(values)
+        return _render_template(self.template, values, None)
+
+    def fields(self) -> Fields:
+        if self.template is None:
+            text_fields = _NO_FIELDS
+        elif isinstance(self.template, CompiledTemplate):
+            text_fields = frozenset(self.template.fields)
+        else:
+            text_fields = None
+        return _union_fields(condition_fields(self.source.get("when")), text_fields)
+
+    def trace(self, values: dict) -> Tuple[bool, str, Dict[str, Any]]:
+        start = time.perf_counter_ns()
+        matched, detail = trace_condition(self.source.get("when"), values)
+        entry: Dict[str, Any] = {
+            "index": self.index,
+            "priority": self.source.get("priority", 999),
+            "condition": detail,
+            "matched": matched,
+        }
+        rendered = ""
+        if matched:
+            if isinstance(self.template, CompiledTemplate):
+                rendered, template_entry = self.template.trace(values)
+                entry.update(template_entry)
+            else:
+                rendered = self.render(values)
+                entry["output"] = rendered or None
+            entry["stopped"] = self.stop
+        entry["us"] = _elapsed_us(start)
+        return matched, rendered, entry
+
+
+class NarrativeDependencies:
+    """Which fields each section and the impression block of a plan read.
+
+    Organ paragraphs are derived from section output: a section whose title maps
+    to an organ (see narrative_composer.organ_for_section_title) always feeds that
+    organ; other sections are classified per rendered line.
+    """
+
+    __slots__ = ("sections", "impression", "computed", "section_organs", "unique_titles")
+
+    def __init__(self, sections: Iterable["CompiledSection"], impression_rules, computed):
+        from .narrative_composer import organ_for_section_title
+
+        sections = tuple(sections)
+        self.sections: Tuple[Fields, ...] = tuple(section.fields() for section in sections)
+        # Impression rules short-circuit on the first stopping match, so they are one unit.
+        self.impression: Fields = _union_fields(*(rule.fields() for rule in impression_rules))
+        self.computed: Tuple[ComputedField, ...] = tuple(computed)
+        self.section_organs: Tuple[Optional[str], ...] = tuple(
+            organ_for_section_title(str(section.title)) for section in sections
+        )
+        titles = [section.title for section in sections]
+        self.unique_titles = all(isinstance(t, str) for t in titles) and len(set(titles)) == len(titles)
+
+    def expand(self, changed_fields: Iterable[str]) -> FrozenSet[str]:
+        """Changed fields plus every computed field that (transitively) reads them."""
+        affected = set(changed_fields)
+        grew = True
+        while grew:
+            grew = False
+            for field in self.computed:
+                if field.name in affected or field.expression is None:
+                    continue
+                if field.expression.names & affected:
+                    affected.add(field.name)
+                    grew = True
+        return frozenset(affected)
+
+    def section_affected(self, index: int, affected: FrozenSet[str]) -> bool:
+        fields = self.sections[index]
+        return fields is None or not fields.isdisjoint(affected)
+
+    def impression_affected(self, affected: FrozenSet[str]) -> bool:
+        return self.impression is None or not self.impression.isdisjoint(affected)
+
+
+class NarrativePlan:
+    """Immutable executable form of a template's narrative_rules."""
+
+    __slots__ = ("computed", "computed_names", "sections", "impression_rules", "dependencies")
+
+    def __init__(self, computed, computed_names, sections, impression_rules):
+        # computed is in dependency order; computed_names keeps declaration order for output.
+        self.computed: Tuple[ComputedField, ...] = tuple(computed)
+        self.computed_names: Tuple[str, ...] = tuple(computed_names)
+        self.sections: Tuple[CompiledSection, ...] = tuple(sections)
+        self.impression_rules: Tuple[CompiledImpressionRule, ...] = tuple(impression_rules)
+        self.dependencies = NarrativeDependencies(self.sections, self.impression_rules, self.computed)
+
+    # Each render step takes an optional trace dict; tracing runs separate code
+    # paths so the untraced path pays a single "is None" check.
+
+    def compute_values(self, values_json: Optional[dict], trace: Optional[dict] = None) -> dict:
+        """Return a copy of values_json with computed fields applied."""
+        if trace is not None:
+            return self._compute_values_traced(dict(values_json or {}), trace)
+        return evaluate_computed_fields(self.computed, dict(values_json or {}))
+
+    def _compute_values_traced(self, context_values: dict, trace: dict) -> dict:
+        entries = trace.setdefault("computed", [])
+        for field in self.computed:
+            start = time.perf_counter_ns()
+            entry: Dict[str, Any] = {"field": field.name, "depends_on": list(field.depends_on)}
+            if field.expression is None:
+                entry["error"] = "invalid expression"
+            else:
+                try:
+                    value = field.expression(context_values)
+                except Exception as e:
+                    entry["error"] = str(e)
+                else:
+                    entry["value"] = value
+                    if value is not None:
+                        context_values[field.name] = value
+            entry["us"] = _elapsed_us(start)
+            entries.append(entry)
+        return context_values
+
+    def render_sections(self, values: dict, trace: Optional[dict] = None) -> List[dict]:
+        rendered_sections = []
+        section_traces = trace.setdefault("sections", []) if trace is not None else None
+        for section in self.sections:
+            if section_traces is None:
+                lines = section.render(values)
+            else:
+                lines, section_trace = section.trace(values)
+                section_traces.append(section_trace)
+            if lines:
+                rendered_sections.append({"title": section.title, "lines": lines})
+        # Preserve definition order; deterministic output aligned to the template.
+        return rendered_sections
+
+    def render_impression(self, values: dict, trace: Optional[dict] = None) -> List[str]:
+        if trace is not None:
+            return self._render_impression_traced(values, trace)
+        impressions = []
+        for rule in self.impression_rules:
+            if rule.condition(values):
+                rendered = rule.render(values)
+                if rendered:
+                    impressions.append(rendered)
+                if rule.stop:
+                    break
+        return impressions
+
+    def _render_impression_traced(self, values: dict, trace: dict) -> List[str]:
+        impressions = []
+        entries = trace.setdefault("impression", [])
+        stopped = False
+        for rule in self.impression_rules:
+            if stopped:
+                entries.append({"index": rule.index, "priority": rule.source.get("priority", 999), "evaluated": False})
+                continue
+            matched, rendered, entry = rule.trace(values)
+            entries.append(entry)
+            if matched:
+                if rendered:
+                    impressions.append(rendered)
+                if rule.stop:
+                    stopped = True
+        return impressions
+
+
+def compile_narrative_plan(narrative_rules: Optional[dict]) -> NarrativePlan:
+    """Compile raw narrative_rules into a NarrativePlan (uncached)."""
+    narrative_rules = narrative_rules or {}
+
+    computed_defs = narrative_rules.get("computed_fields", {}) or {}
+
+    sections = []
+    for section in narrative_rules.get("sections", []) or []:
+        if not isinstance(section, dict):
+            continue
+        sections.append(CompiledSection(len(sections), section.get("title", ""), section.get("content", [])))
+
+    rules = narrative_rules.get("impression_rules", []) or []
+    # Sort deterministically by priority (ascending). Stable sort preserves author order for ties.
+    sorted_rules = sorted(enumerate(rules), key=lambda x: (x[1].get("priority", 999), x[0]))
+
+    return NarrativePlan(
+        computed=compile_computed_fields(computed_defs),
+        computed_names=list(computed_defs.keys()),
+        sections=sections,
+        impression_rules=[CompiledImpressionRule(rule, index) for index, rule in sorted_rules],
+    )
+
+
+# --- Plan cache ---
+
+_PLAN_CACHE: "OrderedDict[tuple, NarrativePlan]" = OrderedDict()
+_PLAN_CACHE_LOCK = threading.Lock()
+
+
+def _plan_cache_key(template_v2) -> Optional[tuple]:
+    pk = getattr(template_v2, "pk", None)
+    updated_at = getattr(template_v2, "updated_at", None)
+    if pk is None or updated_at is None:
+        return None
+    # UUID/datetime are hashable as-is; formatting them would cost more than the lookup.
+    return (pk, updated_at)
+
+
+def get_narrative_plan(template_v2) -> NarrativePlan:
+    """Return the compiled plan for a template version, compiling on first use."""
+    key = _plan_cache_key(template_v2)
+    if key is None:
+        return compile_narrative_plan(template_v2.narrative_rules)
+
+    with _PLAN_CACHE_LOCK:
+        plan = _PLAN_CACHE.get(key)
+        if plan is not None:
+            _PLAN_CACHE.move_to_end(key)
+            return plan
+
+    plan = compile_narrative_plan(template_v2.narrative_rules)
+
+    with _PLAN_CACHE_LOCK:
+        _PLAN_CACHE[key] = plan
+        _PLAN_CACHE.move_to_end(key)
+        while len(_PLAN_CACHE) > PLAN_CACHE_SIZE:
+            _PLAN_CACHE.popitem(last=False)
+    return plan
+
+
+def clear_narrative_plan_cache() -> None:
+    with _PLAN_CACHE_LOCK:
+        _PLAN_CACHE.clear()
@@ -15,378 +15,251 @@ Supports:
 - Impression rule synthesis
 - Optional placeholders and defaults in templates (new)
 - Composite conditions (all/any/not) (new)
+- Opt-in per-rule execution tracing for debugging (include_trace)
 """
 
+import copy
 import logging
-import re
-import ast
-import operator
-from typing import Any, Dict, Optional, Sequence
-
-from .narrative_composer import compose_narrative
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+from .expressions import safe_eval  # noqa: F401 - re-exported for existing callers
+from .narrative_cache import get_cached_narrative, narrative_cache_key, store_narrative
+from .narrative_composer import compose_narrative, organs_for_lines, recompose_narrative
+from .narrative_plan import (  # noqa: F401 - re-exported for existing callers
+    _PLACEHOLDER_RX,
+    _coerce_number,
+    _evaluate_condition,
+    _format_value,
+    _is_empty,
+    _parse_placeholder,
+    _render_template,
+    _plan_cache_key,
+    get_narrative_plan,
+)
 
 logger = logging.getLogger(__name__)
 
-# --- Safe Expression Evaluator for Computed Fields ---
-
-
-class SafeEvaluator(ast.NodeVisitor):
-    def __init__(self, names: Dict[str, Any]):
-        self.names = names
-        self.operators = {
-            ast.Add: operator.add,
-            ast.Sub: operator.sub,
-            ast.Mult: operator.mul,
-            ast.Div: operator.truediv,
-            ast.Pow: operator.pow,
-            ast.USub: operator.neg,
-            ast.Eq: operator.eq,
-            ast.NotEq: operator.ne,
-            ast.Lt: operator.lt,
-            ast.LtE: operator.le,
-            ast.Gt: operator.gt,
-            ast.GtE: operator.ge,
-        }
-        self.functions = {
-            "abs": abs,
-            "round": round,
-            "min": min,
-            "max": max,
-        }
-
-    def visit_BinOp(self, node):
-        return self.operators[type(node.op)](self.visit(node.left), self.visit(node.right))
-
-    def visit_UnaryOp(self, node):
-        return self.operators[type(node.op)](self.visit(node.operand))
-
-    def visit_Compare(self, node):
-        left = self.visit(node.left)
-        for op, comparator in zip(node.ops, node.comparators):
-            right = self.visit(comparator)
-            if not self.operators[type(op)](left, right):
-                return False
-            left = right
-        return True
-
-    def visit_Call(self, node):
-        func_name = getattr(node.func, "id", None)
-        if not func_name or func_name not in self.functions:
-            raise ValueError(f"Function {func_name} not allowed")
-        args = [self.visit(arg) for arg in node.args]
-        return self.functions[func_name](*args)
-
-    def visit_Name(self, node):
-        val = self.names.get(node.id)
-        if val is None:
-            # For computed fields we prefer safe behavior over crashes.
-            return 0
-        try:
-            return float(val)
-        except (ValueError, TypeError):
-            return val
-
-    def visit_Constant(self, node):
-        return node.value
-
-    def generic_visit(self, node):
-        raise ValueError(f"Operation not allowed: {type(node).__name__}")
-
-
-def safe_eval(expr: str, context: Dict[str, Any]):
-    try:
-        if not expr:
-            return None
-        node = ast.parse(expr, mode="eval")
-        evaluator = SafeEvaluator(context)
-        return evaluator.visit(node.body)
-    except Exception as e:
-        logger.warning(f"Failed to evaluate expression '{expr}': {e}")
-        return None
-
-
 # --- Main Engine ---
 
 
-def generate_narrative_v2(template_v2, values_json: dict, include_composer_debug: bool = False) -> dict:
-    narrative_rules = template_v2.narrative_rules or {}
+def generate_narrative_v2(
+    template_v2,
+    values_json: dict,
+    include_composer_debug: bool = False,
+    include_trace: bool = False,
+) -> dict:
+    """Generate the V2 narrative.
 
-    # 1. Computed Fields
-    computed_defs = narrative_rules.get("computed_fields", {}) or {}
-    context_values = dict(values_json or {})
+    include_trace adds a "trace" entry with per-rule timings, condition outcomes
+    (including all/any short-circuits) and placeholder misses. Timings make traced
+    output nondeterministic, so traced runs must not be memoized.
+    """
+    started = time.perf_counter_ns() if include_trace else 0
+    trace: Optional[Dict[str, Any]] = {} if include_trace else None
+
+    # Rules are compiled once per template version (see narrative_plan).
+    plan = get_narrative_plan(template_v2)
 
-    for field_name, expr in computed_defs.items():
-        val = safe_eval(expr, context_values)
-        if val is not None:
-            context_values[field_name] = val
+    # 1. Computed Fields (compiled, evaluated in dependency order)
+    context_values = plan.compute_values(values_json, trace)
 
     result: Dict[str, Any] = {}
 
     # 2. Process Sections (Conditional Narrative) with deterministic ordering
-    sections_def = narrative_rules.get("sections", []) or []
-    result["sections"] = _process_sections(sections_def, context_values, template_v2.json_schema)
+    result["sections"] = plan.render_sections(context_values, trace)
 
     # 3. Impression Synthesis (multiple matches allowed)
-    impression_rules = narrative_rules.get("impression_rules", []) or []
-    result["impression"] = _process_impression(impression_rules, context_values, template_v2.json_schema)
+    result["impression"] = plan.render_impression(context_values, trace)
 
     # Store computed values for reference
-    computed_values = {k: context_values[k] for k in computed_defs.keys() if k in context_values}
+    computed_values = {k: context_values[k] for k in plan.computed_names if k in context_values}
     if computed_values:
         result["computed"] = computed_values
 
-    return compose_narrative(result, values_json=values_json, include_debug=include_composer_debug)
-
-
-def _process_sections(sections_def, values, schema):
-    rendered_sections = []
-
-    for section in sections_def:
-        if not isinstance(section, dict):
-            continue
-        title = section.get("title", "")
-        content_rules = section.get("content", [])
-
-        rendered_lines = []
-        for rule in content_rules:
-            text = _process_rule(rule, values, schema)
-            if text:
-                if isinstance(text, list):
-                    rendered_lines.extend(text)
-                else:
-                    rendered_lines.append(text)
-
-        if rendered_lines:
-            rendered_sections.append({"title": title, "lines": rendered_lines})
-
-    # Preserve input ordering; no further sort here to keep deterministic output aligned to definition order.
-    return rendered_sections
-
-
-def _process_rule(rule, values, schema):
-    """Process a single rule (string, list, or dict condition)."""
-    if isinstance(rule, str):
-        return _render_template(rule, values, schema)
-
-    if isinstance(rule, list):
-        results = []
-        for r in rule:
-            res = _process_rule(r, values, schema)
-            if res:
-                if isinstance(res, list):
-                    results.extend(res)
-                else:
-                    results.append(res)
-        return results if results else None
-
-    if isinstance(rule, dict):
-        # Conditional
-        if "if" in rule:
-            cond = rule.get("if")
-            if _evaluate_condition(cond, values):
-                if "then" in rule:
-                    return _process_rule(rule.get("then"), values, schema)
-            else:
-                if "else" in rule:
-                    return _process_rule(rule.get("else"), values, schema)
-
-        # Or recursive list via "rules" key
-        if "rules" in rule:
-            return _process_rule(rule.get("rules"), values, schema)
+    if trace is None:
+        return compose_narrative(result, values_json=values_json, include_debug=include_composer_debug)
 
-    return None
+    compose_started = time.perf_counter_ns()
+    out = compose_narrative(result, values_json=values_json, include_debug=include_composer_debug)
+    finished = time.perf_counter_ns()
+    trace["compose_us"] = round((finished - compose_started) / 1000, 1)
+    trace["total_us"] = round((finished - started) / 1000, 1)
+    out["trace"] = trace
+    return out
 
 
-def _process_impression(rules, values, schema):
-    impressions = []
+def generate_narrative_v2_cached(template_v2, values_json: dict, include_composer_debug: bool = False) -> dict:
+    """generate_narrative_v2 memoized by template version + values (see narrative_cache)."""
+    key = narrative_cache_key(template_v2, values_json, mode="debug" if include_composer_debug else "")
+    narrative_json = get_cached_narrative(key)
+    if narrative_json is None:
+        narrative_json = generate_narrative_v2(template_v2, values_json, include_composer_debug=include_composer_debug)
+        store_narrative(key, narrative_json)
+    return narrative_json
 
-    # Sort deterministically by priority (ascending). Stable sort preserves author order for ties.
-    sorted_rules = sorted(enumerate(rules), key=lambda x: (x[1].get("priority", 999), x[0]))
 
-    for _, rule in sorted_rules:
-        when = rule.get("when")
-        if _evaluate_condition(when, values):
-            text = rule.get("text", "")
-            if text:
-                rendered = _render_template(text, values, schema)
-                if rendered:
-                    impressions.append(rendered)
+# --- Incremental regeneration ---
 
-            # allow multiple matches; only stop when explicitly requested
-            if not rule.get("continue", False):
-                break
+# Composer priorities are section_rank * 100 + line_index; organ paragraphs only
+# depend on relative atom order, which holds while every section stays below this.
+_MAX_INCREMENTAL_LINES = 100
+_NARRATIVE_KEYS = {"sections", "impression", "computed", "narrative_by_organ", "narrative_text"}
 
-    return impressions
 
-
-def _is_empty(val: Any) -> bool:
-    if val is None:
-        return True
-    if isinstance(val, str) and val.strip() == "":
-        return True
-    if isinstance(val, (list, tuple, set, dict)) and len(val) == 0:
-        return True
-    return False
-
-
-def _coerce_number(val: Any) -> Optional[float]:
-    if val is None:
+def _previous_sections(plan, previous_narrative) -> Optional[Dict[str, list]]:
+    """Map title -> lines of a previous (non-debug) narrative, or None if it can't be reused."""
+    if not isinstance(previous_narrative, dict):
+        return None
+    if not set(previous_narrative.keys()) <= _NARRATIVE_KEYS:
+        return None
+    if not plan.dependencies.unique_titles:
         return None
-    if isinstance(val, (int, float)):
-        return float(val)
-    if isinstance(val, bool):
-        return 1.0 if val else 0.0
-    if isinstance(val, str):
-        s = val.strip()
-        if s == "":
+    if not isinstance(previous_narrative.get("impression"), list):
+        return None
+    by_organ = previous_narrative.get("narrative_by_organ")
+    if not isinstance(by_organ, list) or not all(isinstance(e, dict) for e in by_organ):
+        return None
+    sections = previous_narrative.get("sections")
+    if not isinstance(sections, list):
+        return None
+
+    order = {section.title: idx for idx, section in enumerate(plan.sections)}
+    previous: Dict[str, list] = {}
+    last = -1
+    for section in sections:
+        if not isinstance(section, dict) or not isinstance(section.get("title"), str):
             return None
-        try:
-            return float(s)
-        except ValueError:
+        if section["title"] not in order:
             return None
-    return None
-
-
-def _evaluate_condition(condition, values):
-    """Evaluate condition dict.
-
-    Backward compatible with existing schema.
-    New (optional) composite operators:
-      - {"all": [cond1, cond2, ...]}
-      - {"any": [cond1, cond2, ...]}
-      - {"not": cond}
+        lines = section.get("lines")
+        if not isinstance(lines, list) or not lines or len(lines) >= _MAX_INCREMENTAL_LINES:
+            return None
+        if not all(isinstance(line, str) for line in lines):
+            return None
+        idx = order[section["title"]]
+        if idx <= last:
+            return None
+        last = idx
+        previous[section["title"]] = lines
+    return previous
+
+
+def generate_narrative_v2_incremental(
+    template_v2,
+    values_json: dict,
+    previous_narrative: dict,
+    changed_fields: Iterable[str],
+) -> dict:
+    """Regenerate a narrative after a values_json edit, reusing unaffected output.
+
+    previous_narrative must be the (non-debug) output of generate_narrative_v2 for
+    the same template version and the values before the edit; changed_fields are
+    the keys whose values differ. Only sections and impression rules that read a
+    changed field (directly or through computed fields) are re-rendered, and only
+    organ paragraphs fed by re-rendered lines are recomposed. The result is
+    identical to generate_narrative_v2(template_v2, values_json). Anything that
+    cannot be reused safely falls back to a full run.
     """
-    if not condition:
-        return True
-
-    if isinstance(condition, dict):
-        if "all" in condition and isinstance(condition["all"], list):
-            return all(_evaluate_condition(c, values) for c in condition["all"])
-        if "any" in condition and isinstance(condition["any"], list):
-            return any(_evaluate_condition(c, values) for c in condition["any"])
-        if "not" in condition:
-            return not _evaluate_condition(condition["not"], values)
-
-    field = condition.get("field") if isinstance(condition, dict) else None
-    val = values.get(field) if field else None
-
-    # Operators
-    if "equals" in condition:
-        return val == condition["equals"]
-    if "not_equals" in condition:
-        return val != condition["not_equals"]
-
-    if "gt" in condition:
-        left = _coerce_number(val)
-        right = _coerce_number(condition["gt"])
-        return left is not None and right is not None and left > right
-    if "gte" in condition:
-        left = _coerce_number(val)
-        right = _coerce_number(condition["gte"])
-        return left is not None and right is not None and left >= right
-    if "lt" in condition:
-        left = _coerce_number(val)
-        right = _coerce_number(condition["lt"])
-        return left is not None and right is not None and left < right
-    if "lte" in condition:
-        left = _coerce_number(val)
-        right = _coerce_number(condition["lte"])
-        return left is not None and right is not None and left <= right
-
-    if "is_empty" in condition:
-        return _is_empty(val)
-    if "is_not_empty" in condition:
-        return not _is_empty(val)
-
-    if "in" in condition:
-        pool = condition["in"]
-        if isinstance(val, list):
-            return any(v in pool for v in val)
-        return val in pool
-
-    if "not_in" in condition:
-        pool = condition["not_in"]
-        if isinstance(val, list):
-            return all(v not in pool for v in val)
-        return val not in pool
-
-    # New lightweight string operator
-    if "contains" in condition:
-        needle = str(condition["contains"]).lower()
-        return isinstance(val, str) and needle in val.lower()
-
-    return False
-
-
-# Template placeholders:
-#   - required: {{field}}
-#   - optional: {{field?}}
-#   - default:  {{field|N/A}} or {{field?|N/A}}
-_PLACEHOLDER_RX = re.compile(r"\{\{([^}]+)\}\}")
-
-
-def _parse_placeholder(token: str) -> Dict[str, Any]:
-    token = (token or "").strip()
-    default = None
-    if "|" in token:
-        token, default = token.split("|", 1)
-        token = token.strip()
-        default = default.strip()
-
-    optional = False
-    if token.startswith("?"):
-        optional = True
-        token = token[1:].strip()
-    if token.endswith("?"):
-        optional = True
-        token = token[:-1].strip()
-
-    return {"field": token, "optional": optional, "default": default}
-
-
-def _render_template(template: str, values: dict, json_schema: dict) -> str:
-    # Find all {{...}} placeholders (supports optional/default).
-    tokens = _PLACEHOLDER_RX.findall(template or "")
-    if not tokens:
-        return (template or "").strip()
-
-    placeholders = [_parse_placeholder(t) for t in tokens]
-
-    # Skip if any required placeholder is missing AND no default is provided.
-    for ph in placeholders:
-        if ph["optional"]:
-            continue
-        field = ph["field"]
-        if not field:
-            continue
-        val = values.get(field)
-        if _is_empty(val) and not ph["default"]:
-            return ""
-
-    def replace_field(match):
-        ph = _parse_placeholder(match.group(1))
-        field_name = ph["field"]
-        val = values.get(field_name)
-        if _is_empty(val):
-            return ph["default"] or ""
-        return _format_value(val, field_name, json_schema)
-
-    rendered = _PLACEHOLDER_RX.sub(replace_field, template or "")
-    # Normalize whitespace/punctuation artifacts from optional blanks.
-    rendered = re.sub(r"\s+", " ", rendered).strip()
-    rendered = re.sub(r"\s+([,.;:])", r"\1", rendered)
-    rendered = re.sub(r"\(\s*\)", "", rendered)
-    return rendered.strip()
-
-
-def _format_value(value, field_name: str, json_schema: dict) -> str:
-    if value is None:
-        return ""
-
-    if isinstance(value, bool):
-        return "Present" if value else "Absent"
-
-    if isinstance(value, list):
-        return ", ".join(str(v) for v in value)
-
-    return str(value)
+    plan = get_narrative_plan(template_v2)
+    previous_sections = _previous_sections(plan, previous_narrative)
+    if previous_sections is None:
+        return generate_narrative_v2(template_v2, values_json)
+
+    deps = plan.dependencies
+    affected = deps.expand(changed_fields)
+    context_values = plan.compute_values(values_json)
+
+    sections = []
+    touched_organs = set()
+    for idx, section in enumerate(plan.sections):
+        old_lines = previous_sections.get(section.title, [])
+        if deps.section_affected(idx, affected):
+            lines = section.render(context_values)
+            if len(lines) >= _MAX_INCREMENTAL_LINES:
+                return generate_narrative_v2(template_v2, values_json)
+            if lines != old_lines:
+                static_organ = deps.section_organs[idx]
+                if static_organ:
+                    touched_organs.add(static_organ)
+                else:
+                    touched_organs |= organs_for_lines(section.title, old_lines)
+                    touched_organs |= organs_for_lines(section.title, lines)
+        else:
+            lines = list(old_lines)
+        if lines:
+            sections.append({"title": section.title, "lines": lines})
+
+    result: Dict[str, Any] = {"sections": sections}
+    if deps.impression_affected(affected):
+        result["impression"] = plan.render_impression(context_values)
+    else:
+        result["impression"] = list(previous_narrative["impression"])
+
+    computed_values = {k: context_values[k] for k in plan.computed_names if k in context_values}
+    if computed_values:
+        result["computed"] = computed_values
+
+    return recompose_narrative(result, previous_narrative["narrative_by_organ"], touched_organs)
+
+
+def changed_value_fields(old_values: Optional[dict], new_values: Optional[dict]) -> set:
+    """Keys whose values differ between two values_json dicts (type-sensitive)."""
+    old_values = old_values or {}
+    new_values = new_values or {}
+    return {
+        key
+        for key in set(old_values) | set(new_values)
+        if not _same_value(old_values.get(key), new_values.get(key))
+    }
+
+
+def _same_value(a, b) -> bool:
+    # 1 == 1.0 == True, but they render differently ("1", "1.0", "Present").
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, list):
+        return len(a) == len(b) and all(_same_value(x, y) for x, y in zip(a, b))
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_same_value(a[k], b[k]) for k in a)
+    return a == b
+
+
+# Last generated (values, narrative) per report instance, so repeated
+# "generate narrative" calls only redo what changed since the previous one.
+NARRATIVE_BASIS_CACHE_SIZE = 256
+_NARRATIVE_BASIS: "OrderedDict[str, tuple]" = OrderedDict()
+_NARRATIVE_BASIS_LOCK = threading.Lock()
+
+
+def generate_narrative_v2_for_instance(template_v2, instance_id, values_json: dict, include_composer_debug: bool = False) -> dict:
+    """generate_narrative_v2, memoized, else incremental against this instance's last generation."""
+    if include_composer_debug:
+        return generate_narrative_v2_cached(template_v2, values_json, include_composer_debug=True)
+
+    cache_key = narrative_cache_key(template_v2, values_json)
+    narrative_json = get_cached_narrative(cache_key)
+    template_key = _plan_cache_key(template_v2)
+
+    if narrative_json is None:
+        basis_key = str(instance_id)
+        with _NARRATIVE_BASIS_LOCK:
+            basis = _NARRATIVE_BASIS.get(basis_key)
+        if template_key is not None and basis is not None and basis[0] == template_key:
+            _, previous_values, previous_narrative = basis
+            changed = changed_value_fields(previous_values, values_json)
+            narrative_json = generate_narrative_v2_incremental(template_v2, values_json, previous_narrative, changed)
+        else:
+            narrative_json = generate_narrative_v2(template_v2, values_json)
+        store_narrative(cache_key, narrative_json)
+
+    if template_key is not None:
+        basis_key = str(instance_id)
+        with _NARRATIVE_BASIS_LOCK:
+            _NARRATIVE_BASIS[basis_key] = (template_key, copy.deepcopy(values_json or {}), copy.deepcopy(narrative_json))
+            _NARRATIVE_BASIS.move_to_end(basis_key)
+            while len(_NARRATIVE_BASIS) > NARRATIVE_BASIS_CACHE_SIZE:
+                _NARRATIVE_BASIS.popitem(last=False)
+    return narrative_json
@@ -0,0 +1,205 @@
+"""
+On-disk cache of draft-preview PDFs served by the report-pdf endpoint.
+
+Key: sha256 over the full render context (build_report_render_context output:
+patient and visit fields, findings, signatories, header and footer), the
+branding config version and the renderer fingerprint. The PDF is a function of
+exactly these, so entries never need invalidating; a new entry for an instance
+replaces that instance's older ones.
+
+Layout: <REPORT_PREVIEW_CACHE_DIR>/<instance id>/<key>.pdf, written atomically.
+A hit bumps the file's mtime, so eviction (by total size, then by age since last
+use) drops the least recently previewed reports first.
+
+Settings:
+- REPORT_PREVIEW_CACHE_DIR: cache root; empty (the default) disables caching.
+- REPORT_PREVIEW_CACHE_MAX_BYTES: total size budget (0 = unbounded).
+- REPORT_PREVIEW_CACHE_MAX_AGE: seconds since last use before an entry is dropped (0 = never).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+EVICTION_INTERVAL_SECONDS = 60
+
+_LOCK = threading.Lock()
+_STATS = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "errors": 0}
+_last_eviction = 0.0
+_renderer_fingerprint: Optional[str] = None
+
+
+def renderer_fingerprint() -> str:
+    """Digest of the report renderer source; part of every cached PDF's key."""
+    global _renderer_fingerprint
+    if _renderer_fingerprint is None:
+        source = Path(__file__).resolve().parent.parent / "pdf_engine" / "report_pdf_v2.py"
+        _renderer_fingerprint = hashlib.sha256(source.read_bytes()).hexdigest()[:16]
+    return _renderer_fingerprint
+
+
+def _cache_dir() -> Optional[Path]:
+    path = getattr(settings, "REPORT_PREVIEW_CACHE_DIR", None)
+    return Path(path) if path else None
+
+
+def _max_bytes() -> int:
+    return int(getattr(settings, "REPORT_PREVIEW_CACHE_MAX_BYTES", 0) or 0)
+
+
+def _max_age() -> int:
+    return int(getattr(settings, "REPORT_PREVIEW_CACHE_MAX_AGE", 0) or 0)
+
+
+def branding_version() -> str:
+    """Version of the organization branding used in report headers and footers."""
+    from apps.printing.config_cache import print_config_version
+
+    return str(print_config_version())
+
+
+def preview_cache_key(render_data: dict, branding: Optional[str] = None) -> str:
+    """Cache key (and ETag) for a PDF rendered from render_data."""
+    canonical = json.dumps(
+        {
+            "data": render_data,
+            "branding": branding if branding is not None else branding_version(),
+            "renderer": renderer_fingerprint(),
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _entry_path(root: Path, instance_id, key: str) -> Path:
+    return root / str(instance_id) / f"{key}.pdf"
+
+
+def get_cached_preview(instance_id, key: str) -> Optional[Path]:
+    """Path of the cached preview PDF, or None on a miss (or when caching is off)."""
+    root = _cache_dir()
+    if root is None:
+        return None
+    path = _entry_path(root, instance_id, key)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        with _LOCK:
+            _STATS["misses"] += 1
+        return None
+    except OSError as exc:
+        with _LOCK:
+            _STATS["errors"] += 1
+        logger.warning("preview_cache_read_failed", extra={"event": "preview_cache_read_failed", "error": str(exc)})
+        return None
+    with _LOCK:
+        _STATS["hits"] += 1
+    return path
+
+
+def store_preview(instance_id, key: str, pdf_bytes: bytes) -> Optional[Path]:
+    """Write a preview atomically, drop the instance's superseded entries, and evict if due."""
+    root = _cache_dir()
+    if root is None:
+        return None
+    path = _entry_path(root, instance_id, key)
+    tmp_name = None
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(pdf_bytes)
+        os.replace(tmp_name, path)
+    except OSError as exc:
+        if tmp_name and os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        with _LOCK:
+            _STATS["errors"] += 1
+        logger.warning("preview_cache_write_failed", extra={"event": "preview_cache_write_failed", "error": str(exc)})
+        return None
+
+    for sibling in path.parent.glob("*.pdf"):
+        if sibling != path:
+            try:
+                sibling.unlink()
+            except OSError:
+                pass
+    with _LOCK:
+        _STATS["stores"] += 1
+    _maybe_evict()
+    return path
+
+
+def _maybe_evict() -> None:
+    global _last_eviction
+    now = time.monotonic()
+    with _LOCK:
+        if now - _last_eviction < EVICTION_INTERVAL_SECONDS:
+            return
+        _last_eviction = now
+    evict_preview_cache()
+
+
+def evict_preview_cache(max_bytes: Optional[int] = None, max_age: Optional[int] = None) -> dict:
+    """Drop entries unused for longer than max_age, then the least recently used until under max_bytes."""
+    root = _cache_dir()
+    result = {"removed": 0, "bytes_freed": 0, "bytes_remaining": 0}
+    if root is None or not root.exists():
+        return result
+    max_bytes = _max_bytes() if max_bytes is None else max_bytes
+    max_age = _max_age() if max_age is None else max_age
+
+    entries = []
+    for path in root.glob("*/*.pdf"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort()
+
+    cutoff = time.time() - max_age if max_age else None
+    total = sum(size for _, size, _ in entries)
+    for mtime, size, path in entries:
+        expired = cutoff is not None and mtime < cutoff
+        over_budget = bool(max_bytes) and total > max_bytes
+        if not expired and not over_budget:
+            break
+        try:
+            path.unlink()
+        except OSError:
+            continue
+        total -= size
+        result["removed"] += 1
+        result["bytes_freed"] += size
+        if not any(path.parent.iterdir()):
+            shutil.rmtree(path.parent, ignore_errors=True)
+
+    result["bytes_remaining"] = total
+    if result["removed"]:
+        with _LOCK:
+            _STATS["evictions"] += result["removed"]
+        logger.info("preview_cache_evicted", extra={"event": "preview_cache_evicted", **result})
+    return result
+
+
+def preview_cache_stats() -> dict:
+    with _LOCK:
+        stats = dict(_STATS)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    stats["enabled"] = _cache_dir() is not None
+    return stats
@@ -0,0 +1,408 @@
+"""
+Publishing V2 reports: snapshot creation, shared by the synchronous publish
+endpoint and the background publish pipeline.
+
+Async publish (POST publish/?async=1) validates the report, reserves the next
+snapshot version in a ReportPublishJobV2 row and returns 202. A small thread pool
+then generates the narrative, content hash and PDF (the PDF via the render pool)
+and writes the snapshot, audit log and PUBLISHED item status in one transaction,
+so the item only reads as published once the snapshot is durable.
+
+Verifying a report also queues a speculative render of its publish PDF on the
+same thread pool: values and narrative are frozen from then on, so when publish
+runs the PDF is usually ready. The pre-render is stored in the preview cache
+under a key over the complete render input (render context, content hash,
+branding version, renderer), so publish only reuses bytes that an inline render
+would have produced, and renders inline on any mismatch.
+
+Settings:
+- REPORT_PUBLISH_WORKERS: background publish threads per web process.
+- REPORT_PUBLISH_JOB_TIMEOUT: seconds after which a job is treated as lost (e.g.
+  the process restarted) and its reservation released, counted from creation
+  for queued jobs and from when a worker started it for running ones. A job
+  expired while running cannot write its snapshot afterwards.
+- REPORT_PUBLISH_PRERENDER: pre-render publish PDFs at verify time (needs
+  REPORT_PREVIEW_CACHE_DIR).
+"""
+
+import hashlib
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from apps.reporting.models import (
+    ReportActionLogV2,
+    ReportInstanceV2,
+    ReportPublishJobV2,
+    ReportPublishSnapshotV2,
+)
+from apps.printing.render_pool import render_pdf
+from apps.reporting.pdf_engine.report_pdf_v2 import ReportPDFGeneratorV2, render_report_pdf_v2
+from apps.reporting.services.narrative_v2 import generate_narrative_v2_cached
+from apps.reporting.services.preview_cache import get_cached_preview, preview_cache_key, store_preview
+from apps.reporting.services.snapshot_store import attach_pdf
+
+logger = logging.getLogger(__name__)
+
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+
+
+STALE_JOB_MESSAGE = "Publish job did not finish in time."
+
+
+class PublishInProgress(Exception):
+    """Another publish job for the same report is still queued or running."""
+
+    def __init__(self, job: ReportPublishJobV2):
+        super().__init__(f"Publish job {job.id} is already {job.status}")
+        self.job = job
+
+
+class PublishJobExpired(Exception):
+    """The job was failed as stale while it ran; its result must not be written."""
+
+
+def _job_timeout() -> timedelta:
+    return timedelta(seconds=int(getattr(settings, "REPORT_PUBLISH_JOB_TIMEOUT", 600) or 600))
+
+
+def _is_stale(job: ReportPublishJobV2, cutoff) -> bool:
+    # Queued jobs age from when they were reserved, running ones from when a worker claimed them.
+    if job.status == ReportPublishJobV2.STATUS_RUNNING:
+        return (job.started_at or job.created_at) < cutoff
+    return job.created_at < cutoff
+
+
+def active_publish_job(instance_v2) -> Optional[ReportPublishJobV2]:
+    """Return the queued/running job for an instance, failing ones that went stale."""
+    jobs = ReportPublishJobV2.objects.filter(
+        report_instance_v2=instance_v2, status__in=ReportPublishJobV2.ACTIVE_STATUSES
+    ).order_by("-created_at")
+    cutoff = timezone.now() - _job_timeout()
+    active = None
+    for job in jobs:
+        if _is_stale(job, cutoff):
+            # Conditional on the status read above: a job that moved on meanwhile is left alone.
+            expired = ReportPublishJobV2.objects.filter(id=job.id, status=job.status).update(
+                status=ReportPublishJobV2.STATUS_FAILED,
+                error_message=STALE_JOB_MESSAGE,
+                finished_at=timezone.now(),
+            )
+            if expired:
+                logger.warning(
+                    "publish_job_stale",
+                    extra={"event": "publish_job_stale", "job_id": str(job.id), "instance_id": str(instance_v2.id)},
+                )
+                continue
+            job.refresh_from_db()
+            if job.status not in ReportPublishJobV2.ACTIVE_STATUSES:
+                continue
+        if active is None:
+            active = job
+    return active
+
+
+def next_publish_version(instance_v2) -> int:
+    """Next snapshot version, skipping versions reserved by active publish jobs."""
+    last_snapshot = instance_v2.publish_snapshots_v2.aggregate(v=Max("version"))["v"] or 0
+    last_reserved = (
+        ReportPublishJobV2.objects.filter(
+            report_instance_v2=instance_v2, status__in=ReportPublishJobV2.ACTIVE_STATUSES
+        ).aggregate(v=Max("version"))["v"]
+        or 0
+    )
+    return max(last_snapshot, last_reserved) + 1
+
+
+def publish_content_hash(template_v2, values_json, narrative_json) -> str:
+    """SHA256 of template + values + narrative; also seeds the deterministic PDF's ID."""
+    hash_input = json.dumps(
+        {
+            "template_id": str(template_v2.id),
+            "template_version": str(template_v2.updated_at),
+            "values_json": values_json,
+            "narrative_json": narrative_json,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(hash_input.encode("utf-8")).hexdigest()
+
+
+def _publish_render_input(instance_v2, narrative_json):
+    """(render data, prerender key): the deterministic PDF is a function of the data and the renderer."""
+    content_hash = publish_content_hash(instance_v2.template_v2, instance_v2.values_json, narrative_json)
+    generator = ReportPDFGeneratorV2(str(instance_v2.id), narrative_json, document_id=content_hash)
+    generator.fetch_data()
+    return generator.data, preview_cache_key(generator.data)
+
+
+def _prerender_slot(instance_id) -> str:
+    # Own directory in the preview cache, so previews and pre-renders do not replace each other.
+    return f"publish-{instance_id}"
+
+
+def render_publish_pdf(instance_v2, narrative_json) -> bytes:
+    """
+    Deterministic publish PDF: unchanged content renders to the same bytes.
+    Reuses the verify-time pre-render when its inputs still match.
+    """
+    data, key = _publish_render_input(instance_v2, narrative_json)
+    cached_path = get_cached_preview(_prerender_slot(instance_v2.pk), key)
+    if cached_path is not None:
+        try:
+            pdf_bytes = cached_path.read_bytes()
+        except OSError:
+            pdf_bytes = None
+        if pdf_bytes:
+            logger.info(
+                "publish_prerender_hit",
+                extra={"event": "publish_prerender_hit", "instance_id": str(instance_v2.pk)},
+            )
+            return pdf_bytes
+    return render_pdf(render_report_pdf_v2, data, label="report_v2")
+
+
+def prerender_publish_pdf(instance_id) -> bool:
+    """Render and cache the publish PDF of a verified report; False when skipped or failed."""
+    instance = ReportInstanceV2.objects.select_related("template_v2").filter(pk=instance_id).first()
+    if instance is None or instance.status != "verified":
+        return False
+    try:
+        narrative_json = generate_narrative_v2_cached(instance.template_v2, instance.values_json)
+        data, key = _publish_render_input(instance, narrative_json)
+        slot = _prerender_slot(instance.pk)
+        if get_cached_preview(slot, key) is not None:
+            return True
+        stored = store_preview(slot, key, render_pdf(render_report_pdf_v2, data, label="report_v2_prerender"))
+    except Exception as exc:
+        # Speculative: publish renders inline instead.
+        logger.warning(
+            "publish_prerender_failed",
+            extra={"event": "publish_prerender_failed", "instance_id": str(instance_id), "error": str(exc)},
+        )
+        return False
+    logger.info(
+        "publish_prerender_stored",
+        extra={"event": "publish_prerender_stored", "instance_id": str(instance_id), "stored": stored is not None},
+    )
+    return stored is not None
+
+
+def schedule_publish_prerender(instance_v2) -> None:
+    """Queue prerender_publish_pdf on the publish pool once the current transaction commits."""
+    if not getattr(settings, "REPORT_PUBLISH_PRERENDER", True) or not getattr(settings, "REPORT_PREVIEW_CACHE_DIR", ""):
+        return
+    instance_id = instance_v2.pk
+
+    def _runner():
+        close_old_connections()
+        try:
+            prerender_publish_pdf(instance_id)
+        finally:
+            connection.close()
+
+    transaction.on_commit(lambda: _get_executor().submit(_runner))
+
+
+def perform_publish_v2(instance_v2, user, narrative_json=None, pdf_bytes=None, version=None):
+    """
+    Create a ReportPublishSnapshotV2 for a verified report instance and mark its
+    work item PUBLISHED. Must run inside a transaction.
+
+    narrative_json / pdf_bytes may be precomputed so the PDF render does not run
+    inside the transaction; version is passed by background jobs that reserved one.
+
+    Returns:
+        tuple: (version_number, ReportPublishSnapshotV2 instance)
+    """
+    template_v2 = instance_v2.template_v2
+    if narrative_json is None:
+        narrative_json = generate_narrative_v2_cached(template_v2, instance_v2.values_json)
+
+    if version is None:
+        version = next_publish_version(instance_v2)
+
+    # Generate content hash for integrity verification
+    content_hash = publish_content_hash(template_v2, instance_v2.values_json, narrative_json)
+
+    if pdf_bytes is None:
+        pdf_bytes = render_publish_pdf(instance_v2, narrative_json)
+
+    snapshot = ReportPublishSnapshotV2(
+        report_instance_v2=instance_v2,
+        template_v2=template_v2,
+        values_json=instance_v2.values_json,
+        narrative_json=narrative_json,
+        content_hash=content_hash,
+        published_by=user,
+        version=version,
+    )
+    # Content-addressed: identical PDFs (e.g. an unchanged republish) share one file.
+    attach_pdf(snapshot, pdf_bytes)
+    snapshot.save()
+
+    if not snapshot.id:
+        raise ValueError("Failed to save publish snapshot - no ID assigned")
+
+    logger.info(
+        "publish_snapshot_created",
+        extra={
+            "event": "publish_snapshot_created",
+            "snapshot_id": str(snapshot.id),
+            "instance_id": str(instance_v2.id),
+            "version": version,
+            "content_hash": content_hash,
+            "pdf_file": snapshot.pdf_file.name if snapshot.pdf_file else None,
+            "pdf_sha256": snapshot.pdf_sha256,
+        },
+    )
+
+    item = instance_v2.work_item
+    item.status = "PUBLISHED"
+    item.published_at = timezone.now()
+    item.save(update_fields=["status", "published_at"])
+
+    logger.info(
+        "publish_item_status_updated",
+        extra={
+            "event": "publish_item_status_updated",
+            "item_id": str(item.id),
+            "new_status": "PUBLISHED",
+            "published_at": item.published_at.isoformat(),
+        },
+    )
+
+    return version, snapshot
+
+
+def reserve_publish_job(instance_v2, user) -> ReportPublishJobV2:
+    """Reserve the next version in a queued job and start it once the reservation commits."""
+    with transaction.atomic():
+        # Row lock serialises reservations for the same report.
+        ReportInstanceV2.objects.select_for_update().filter(pk=instance_v2.pk).first()
+        active = active_publish_job(instance_v2)
+        if active is not None:
+            raise PublishInProgress(active)
+        job = ReportPublishJobV2.objects.create(
+            report_instance_v2=instance_v2,
+            version=next_publish_version(instance_v2),
+            requested_by=user,
+        )
+        transaction.on_commit(lambda: start_publish_job(job.id))
+
+    logger.info(
+        "publish_job_queued",
+        extra={
+            "event": "publish_job_queued",
+            "job_id": str(job.id),
+            "instance_id": str(instance_v2.id),
+            "version": job.version,
+        },
+    )
+    return job
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = ThreadPoolExecutor(
+            max_workers=int(getattr(settings, "REPORT_PUBLISH_WORKERS", 2) or 1),
+            thread_name_prefix="report-publish",
+        )
+    return _EXECUTOR
+
+
+def start_publish_job(job_id) -> None:
+    def _runner():
+        close_old_connections()
+        try:
+            run_publish_job(job_id)
+        except Exception:
+            # job state is updated in run_publish_job
+            return
+        finally:
+            connection.close()
+
+    _get_executor().submit(_runner)
+
+
+def run_publish_job(job_id) -> ReportPublishJobV2:
+    """Finish a reserved publish: narrative, hash, PDF, then snapshot + item status."""
+    claimed = ReportPublishJobV2.objects.filter(id=job_id, status=ReportPublishJobV2.STATUS_QUEUED).update(
+        status=ReportPublishJobV2.STATUS_RUNNING, started_at=timezone.now()
+    )
+    job = ReportPublishJobV2.objects.select_related(
+        "report_instance_v2__template_v2", "report_instance_v2__work_item__service_visit", "requested_by"
+    ).get(id=job_id)
+    if not claimed:
+        return job
+
+    instance = job.report_instance_v2
+    try:
+        if instance.status != "verified":
+            raise ValueError(f"Only verified reports can be published. Current status: {instance.status}")
+        # Render outside the transaction; only the writes below hold locks.
+        narrative_json = generate_narrative_v2_cached(instance.template_v2, instance.values_json)
+        pdf_bytes = render_publish_pdf(instance, narrative_json)
+
+        with transaction.atomic():
+            version, snapshot = perform_publish_v2(
+                instance,
+                job.requested_by,
+                narrative_json=narrative_json,
+                pdf_bytes=pdf_bytes,
+                version=job.version,
+            )
+            ReportActionLogV2.objects.create(
+                report_v2=instance,
+                action="publish",
+                actor=job.requested_by,
+                meta={"version": version, "sha256": snapshot.content_hash, "job_id": str(job.id)},
+            )
+            finished_at = timezone.now()
+            # Only a job still marked running may finish; one expired meanwhile
+            # may have had its version reserved again, so roll the snapshot back.
+            if not ReportPublishJobV2.objects.filter(id=job.id, status=ReportPublishJobV2.STATUS_RUNNING).update(
+                status=ReportPublishJobV2.STATUS_SUCCEEDED, snapshot=snapshot, finished_at=finished_at
+            ):
+                raise PublishJobExpired(f"Publish job {job.id} expired before it finished")
+            job.status = ReportPublishJobV2.STATUS_SUCCEEDED
+            job.snapshot = snapshot
+            job.finished_at = finished_at
+    except Exception as exc:
+        ReportPublishJobV2.objects.filter(id=job.id, status=ReportPublishJobV2.STATUS_RUNNING).update(
+            status=ReportPublishJobV2.STATUS_FAILED, error_message=str(exc), finished_at=timezone.now()
+        )
+        job.refresh_from_db(fields=["status", "error_message", "finished_at"])
+        logger.error(
+            "publish_job_failed",
+            extra={
+                "event": "publish_job_failed",
+                "job_id": str(job.id),
+                "instance_id": str(instance.id),
+                "error": str(exc),
+                "error_type": type(exc).__name__,
+            },
+            exc_info=True,
+        )
+        raise
+
+    logger.info(
+        "publish_job_succeeded",
+        extra={
+            "event": "publish_job_succeeded",
+            "job_id": str(job.id),
+            "instance_id": str(instance.id),
+            "snapshot_id": str(snapshot.id),
+            "version": version,
+            "duration_ms": round((job.finished_at - job.created_at).total_seconds() * 1000, 2),
+        },
+    )
+    return job
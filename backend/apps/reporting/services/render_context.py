@@ -0,0 +1,299 @@
+"""
+Shared render context for V2 reports: one builder behind print-payload (JSON),
+report-pdf previews and publish PDFs (ReportLab).
+
+load_render_instance() fetches the instance with everything the context reads
+in a single query. The derived parts (header, findings blocks, measurements,
+clinical indication, signatories, disclaimer) are memoized in an in-process LRU
+keyed by (instance id, instance updated_at, narrative hash, branding config
+version, consultant/author); patient and visit fields are read from the rows on
+every call, so demographic corrections show up without invalidation.
+Entries are stored as JSON text so every hit returns an independent dict.
+
+settings.REPORT_RENDER_CONTEXT_CACHE_SIZE bounds the LRU (default 256; 0 disables).
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from django.conf import settings
+
+from apps.printing.config_cache import get_print_config
+from apps.printing.images import print_image_path
+
+DEFAULT_CACHE_SIZE = 256
+DEFAULT_DISCLAIMER = (
+    "This report is based on imaging findings at the time of examination. Clinical correlation is advised."
+)
+
+_LOCK = threading.Lock()
+_MEMORY: "OrderedDict[str, str]" = OrderedDict()
+_STATS = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def load_render_instance(instance_id):
+    """ReportInstanceV2 with work item, visit, patient, consultant, template and author joined."""
+    from apps.reporting.models import ReportInstanceV2
+
+    return ReportInstanceV2.objects.select_related(
+        "work_item",
+        "work_item__service",
+        "work_item__service_visit",
+        "work_item__service_visit__patient",
+        "work_item__consultant",
+        "template_v2",
+        "created_by",
+    ).get(id=instance_id)
+
+
+def _cache_size() -> int:
+    return int(getattr(settings, "REPORT_RENDER_CONTEXT_CACHE_SIZE", DEFAULT_CACHE_SIZE) or 0)
+
+
+def _listify(value):
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    text = str(value).strip()
+    return [text] if text else []
+
+
+def _narrative_hash(narrative_json) -> str:
+    try:
+        canonical = json.dumps(narrative_json or {}, sort_keys=True, separators=(",", ":"), default=str)
+    except (TypeError, ValueError):
+        canonical = repr(narrative_json)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def render_context_key(instance, narrative_json, config_version: int) -> str:
+    consultant = instance.work_item.consultant
+    canonical = json.dumps(
+        [
+            str(instance.pk),
+            instance.updated_at.isoformat() if instance.updated_at else "",
+            _narrative_hash(narrative_json),
+            config_version,
+            str(consultant.pk) if consultant else "",
+            consultant.updated_at.isoformat() if consultant and consultant.updated_at else "",
+            instance.created_by_id,
+        ],
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def extract_measurements(values_json) -> list:
+    measurements = []
+    for key, value in (values_json or {}).items():
+        if isinstance(value, (int, float)):
+            measurements.append({"label": key.replace("_", " ").title(), "value": str(value), "unit": ""})
+        elif isinstance(value, str):
+            low = key.lower()
+            if ("measurement" in low or "size" in low or "diameter" in low) and value.strip():
+                measurements.append({"label": key.replace("_", " ").title(), "value": value.strip(), "unit": ""})
+    return measurements[:12]
+
+
+def _findings(narrative, values_json) -> list:
+    findings = []
+    if isinstance(narrative, dict) and isinstance(narrative.get("narrative_by_organ"), list):
+        for block in narrative.get("narrative_by_organ", []):
+            if not isinstance(block, dict):
+                continue
+            paragraph = str(block.get("paragraph", "")).strip()
+            if paragraph:
+                findings.append({"heading": str(block.get("label", "")).strip(), "paragraphs": [paragraph]})
+
+    if not findings:
+        for block in narrative.get("sections", []) if isinstance(narrative, dict) else []:
+            if not isinstance(block, dict):
+                continue
+            lines = _listify(block.get("lines"))
+            if lines:
+                findings.append({"heading": str(block.get("title", "")).strip(), "lines": lines})
+
+    if not findings:
+        fallback_lines = []
+        for key, value in (values_json or {}).items():
+            text = str(value).strip()
+            if text:
+                fallback_lines.append(f"{key.replace('_', ' ').title()}: {text}")
+        if fallback_lines:
+            findings.append({"heading": "", "lines": fallback_lines})
+    return findings
+
+
+def _clinical_indication(values_json) -> str:
+    for key, value in (values_json or {}).items():
+        low = key.lower()
+        if "clinical" in low or "history" in low or "indication" in low:
+            text = str(value).strip()
+            if text:
+                return text
+    return ""
+
+
+def _signatories(instance, config):
+    item = instance.work_item
+    signatories = []
+    right_lines = []
+    if item.consultant:
+        consultant = item.consultant
+        signatories.append(
+            {
+                "verification_label": "Electronically Verified",
+                "name": consultant.display_name,
+                "credentials": consultant.degrees,
+                "registration": "",
+            }
+        )
+        right_lines = [
+            line
+            for line in [consultant.display_name, consultant.degrees, consultant.designation, consultant.mobile_number]
+            if line
+        ]
+    elif instance.created_by:
+        name = instance.created_by.get_full_name() or instance.created_by.username
+        signatories.append(
+            {"verification_label": "Electronically Verified", "name": name, "credentials": "", "registration": ""}
+        )
+        right_lines = [name]
+
+    static_signatories = config.signatories_json if config and isinstance(config.signatories_json, list) else []
+    for raw in static_signatories:
+        if not isinstance(raw, dict):
+            continue
+        name = str(raw.get("name", "")).strip()
+        designation = str(raw.get("designation", "")).strip()
+        if name or designation:
+            signatories.append(
+                {
+                    "verification_label": "Electronically Verified",
+                    "name": name,
+                    "credentials": designation,
+                    "registration": str(raw.get("registration", "")).strip(),
+                }
+            )
+    return signatories, right_lines
+
+
+def _build_derived(instance, narrative, config) -> dict:
+    center_lines = []
+    logo_path = ""
+    logo_url = ""
+    disclaimer = DEFAULT_DISCLAIMER
+    if config:
+        if config.org_name:
+            center_lines.append(config.org_name.strip())
+        if config.address:
+            center_lines.append(str(config.address).strip())
+        if config.phone:
+            center_lines.append(str(config.phone).strip())
+        if config.logo:
+            try:
+                logo_url = config.logo.url
+                logo_path = print_image_path(config.logo, "report_logo") or ""
+            except Exception:
+                logo_path = ""
+        if config.disclaimer_text:
+            disclaimer = config.disclaimer_text
+
+    signatories, right_lines = _signatories(instance, config)
+    is_dict = isinstance(narrative, dict)
+    return {
+        "header": {
+            "logo_path": logo_path,
+            "logo_url": logo_url,
+            "center_lines": center_lines,
+            "right_lines": right_lines,
+        },
+        "clinical_indication": _clinical_indication(instance.values_json),
+        "sections": {
+            "technique": _listify(narrative.get("technique")) if is_dict else [],
+            "comparison": _listify(narrative.get("comparison")) if is_dict else [],
+            "findings": _findings(narrative, instance.values_json),
+            "measurements": extract_measurements(instance.values_json),
+            "impression": _listify(narrative.get("impression")) if is_dict else [],
+            "recommendations": _listify(narrative.get("recommendations")) if is_dict else [],
+        },
+        "signatories": signatories,
+        "footer": {"disclaimer": disclaimer},
+    }
+
+
+def _cached_derived(instance, narrative) -> dict:
+    print_config = get_print_config()
+    size = _cache_size()
+    if size <= 0:
+        return _build_derived(instance, narrative, print_config.org)
+
+    key = render_context_key(instance, narrative, print_config.version)
+    with _LOCK:
+        payload = _MEMORY.get(key)
+        if payload is not None:
+            _MEMORY.move_to_end(key)
+            _STATS["hits"] += 1
+            return json.loads(payload)
+        _STATS["misses"] += 1
+
+    derived = _build_derived(instance, narrative, print_config.org)
+    payload = json.dumps(derived, default=str)
+    with _LOCK:
+        _MEMORY[key] = payload
+        _MEMORY.move_to_end(key)
+        while len(_MEMORY) > size:
+            _MEMORY.popitem(last=False)
+            _STATS["evictions"] += 1
+    return json.loads(payload)
+
+
+def build_report_render_context(instance, narrative_json: Optional[dict] = None) -> dict:
+    """
+    Report data consumed by both the JSON print payload and the ReportLab renderer.
+    Pass an instance from load_render_instance() to avoid per-relation queries.
+    """
+    item = instance.work_item
+    visit = item.service_visit
+    patient = visit.patient
+    narrative = narrative_json or instance.narrative_json or {}
+    derived = _cached_derived(instance, narrative)
+    return {
+        "header": derived["header"],
+        "patient": {
+            "name": patient.name,
+            "age": str(patient.age or ""),
+            "sex": patient.gender or "",
+            "mrn": patient.patient_reg_no or patient.mrn,
+            "mobile": patient.phone or "",
+            "ref_no": visit.visit_id,
+            "referred_by": visit.referring_consultant or patient.referrer or "",
+            "study_datetime": item.created_at.strftime("%Y-%m-%d %H:%M"),
+            "report_datetime": instance.updated_at.strftime("%Y-%m-%d %H:%M"),
+            "clinical_indication": derived["clinical_indication"],
+        },
+        "report_title": (instance.template_v2.name or item.service.name or "Radiology Report").upper(),
+        "sections": derived["sections"],
+        "signatories": derived["signatories"],
+        "footer": derived["footer"],
+    }
+
+
+def render_context_cache_stats() -> dict:
+    with _LOCK:
+        stats = dict(_STATS)
+        stats["entries"] = len(_MEMORY)
+    stats["capacity"] = _cache_size()
+    return stats
+
+
+def clear_render_context_cache() -> None:
+    with _LOCK:
+        _MEMORY.clear()
+        for name in _STATS:
+            _STATS[name] = 0
@@ -0,0 +1,89 @@
+"""
+Content-addressed storage for published report PDFs.
+
+Snapshot PDFs are stored once per distinct byte content under
+report_snapshots_v2/sha256/<aa>/<sha256>.pdf. Publish renders in deterministic
+mode (see generate_report_pdf_v2(content_hash=...)), so republishing an unchanged
+report, or any version that renders the same, points at the existing file
+instead of writing a new one. Stored files are never deleted through a snapshot
+because other snapshots may share them.
+
+Snapshots published before this keep their dated path until
+`manage.py dedupe_report_snapshots` moves them into the store.
+"""
+
+import hashlib
+import logging
+from typing import Optional, Tuple
+
+from django.core.files.base import ContentFile
+
+logger = logging.getLogger(__name__)
+
+STORE_PREFIX = "report_snapshots_v2/sha256"
+
+
+def pdf_sha256(pdf_bytes: bytes) -> str:
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def content_address(digest: str) -> str:
+    return f"{STORE_PREFIX}/{digest[:2]}/{digest}.pdf"
+
+
+def _storage():
+    from apps.reporting.models import ReportPublishSnapshotV2
+
+    return ReportPublishSnapshotV2._meta.get_field("pdf_file").storage
+
+
+def store_pdf(pdf_bytes: bytes) -> Tuple[str, str, bool]:
+    """Store pdf_bytes under their hash; returns (storage name, sha256, created)."""
+    storage = _storage()
+    digest = pdf_sha256(pdf_bytes)
+    name = content_address(digest)
+    if storage.exists(name):
+        return name, digest, False
+
+    saved = storage.save(name, ContentFile(pdf_bytes))
+    if saved != name:
+        # Another writer stored the same content first; the bytes are identical.
+        storage.delete(saved)
+        return name, digest, False
+    logger.info(
+        "snapshot_pdf_stored",
+        extra={"event": "snapshot_pdf_stored", "sha256": digest, "bytes": len(pdf_bytes)},
+    )
+    return name, digest, True
+
+
+def attach_pdf(snapshot, pdf_bytes: bytes) -> bool:
+    """Point snapshot.pdf_file at the stored copy of pdf_bytes (not saved); True if newly written."""
+    name, digest, created = store_pdf(pdf_bytes)
+    snapshot.pdf_file.name = name
+    snapshot.pdf_sha256 = digest
+    if not created:
+        logger.info(
+            "snapshot_pdf_deduplicated",
+            extra={"event": "snapshot_pdf_deduplicated", "sha256": digest, "snapshot_id": str(snapshot.pk)},
+        )
+    return created
+
+
+def verify_snapshot_pdf(snapshot) -> Optional[bool]:
+    """
+    Whether the stored PDF still hashes to snapshot.pdf_sha256; None when there is
+    no recorded hash (legacy snapshot) and False when the file is missing.
+    """
+    if not snapshot.pdf_sha256:
+        return None
+    if not snapshot.pdf_file:
+        return False
+    digest = hashlib.sha256()
+    try:
+        with snapshot.pdf_file.open("rb") as handle:
+            for chunk in iter(lambda: handle.read(64 * 1024), b""):
+                digest.update(chunk)
+    except (OSError, ValueError):
+        return False
+    return digest.hexdigest() == snapshot.pdf_sha256
@@ -0,0 +1,255 @@
+"""
+Template change impact simulation.
+
+Re-runs V2 narrative generation for every report bound to a template under its
+current ("old") rules and a proposed ("new") rule set, and reports which
+documents would render differently.
+
+Documents are read in chunks and spread across a process pool; results are
+yielded as chunks finish so callers can stream them. Workers only receive
+plain rules/values data, never model instances, and compile each rule set once
+per process (see narrative_plan's plan cache).
+"""
+
+import hashlib
+import heapq
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+from .narrative_v2 import generate_narrative_v2
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 200
+MAX_SAMPLE_LINES = 5
+
+Document = Tuple[str, str, dict]  # (kind, id, values_json)
+
+_WORKER_TEMPLATES: Optional[Tuple[SimpleNamespace, SimpleNamespace]] = None
+
+
+def _rules_template(rules: dict) -> SimpleNamespace:
+    """Stand-in template keyed by a rules digest so its plan is compiled once per process."""
+    digest = hashlib.sha256(json.dumps(rules or {}, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return SimpleNamespace(pk=f"impact:{digest}", updated_at=digest, narrative_rules=rules or {})
+
+
+def _init_worker(old_rules: dict, new_rules: dict) -> None:
+    global _WORKER_TEMPLATES
+    _WORKER_TEMPLATES = (_rules_template(old_rules), _rules_template(new_rules))
+
+
+def _narrative_lines(narrative_json: dict) -> List[str]:
+    lines = [
+        f"{section.get('title', '')}: {line}"
+        for section in narrative_json.get("sections", [])
+        for line in section.get("lines", [])
+    ]
+    lines.extend(f"Impression: {line}" for line in narrative_json.get("impression", []))
+    return lines
+
+
+def _line_diff(old: dict, new: dict) -> Tuple[List[str], List[str]]:
+    old_lines, new_lines = _narrative_lines(old), _narrative_lines(new)
+    if old_lines == new_lines:
+        # Only the composed text differs (e.g. organ grouping); diff that instead.
+        old_lines = old.get("narrative_text", "").splitlines()
+        new_lines = new.get("narrative_text", "").splitlines()
+    old_set, new_set = set(old_lines), set(new_lines)
+    removed = [line for line in old_lines if line not in new_set]
+    added = [line for line in new_lines if line not in old_set]
+    return removed[:MAX_SAMPLE_LINES], added[:MAX_SAMPLE_LINES]
+
+
+def _timed_generate(template, values_json: dict) -> Tuple[Optional[dict], float, Optional[str]]:
+    start = time.perf_counter_ns()
+    try:
+        narrative_json = generate_narrative_v2(template, values_json)
+    except Exception as exc:
+        return None, round((time.perf_counter_ns() - start) / 1000, 1), str(exc)
+    return narrative_json, round((time.perf_counter_ns() - start) / 1000, 1), None
+
+
+def compare_documents(documents: List[Document], templates=None) -> List[dict]:
+    """Render each document under both rule sets (runs inside pool workers)."""
+    old_template, new_template = templates or _WORKER_TEMPLATES
+    results = []
+    for kind, doc_id, values_json in documents:
+        old, old_us, old_error = _timed_generate(old_template, values_json)
+        new, new_us, new_error = _timed_generate(new_template, values_json)
+        result: Dict[str, Any] = {"kind": kind, "id": doc_id, "old_us": old_us, "new_us": new_us}
+        if old_error or new_error:
+            result["changed"] = None
+            result["error"] = new_error or old_error
+        elif json.dumps(old, sort_keys=True) == json.dumps(new, sort_keys=True):
+            result["changed"] = False
+        else:
+            result["changed"] = True
+            result["removed"], result["added"] = _line_diff(old, new)
+        results.append(result)
+    return results
+
+
+def iter_template_documents(template, include_snapshots: bool = True, limit: Optional[int] = None) -> Iterator[Document]:
+    """Every report bound to a template: working instances first, then published snapshots."""
+    from ..models import ReportInstanceV2, ReportPublishSnapshotV2
+
+    querysets = [("instance", ReportInstanceV2.objects.filter(template_v2=template))]
+    if include_snapshots:
+        querysets.append(("snapshot", ReportPublishSnapshotV2.objects.filter(template_v2=template)))
+
+    produced = 0
+    for kind, queryset in querysets:
+        rows = queryset.order_by("pk").values_list("id", "values_json").iterator(chunk_size=DEFAULT_CHUNK_SIZE)
+        for doc_id, values_json in rows:
+            if limit is not None and produced >= limit:
+                return
+            produced += 1
+            yield kind, str(doc_id), values_json or {}
+
+
+def _chunks(documents: Iterable[Document], size: int) -> Iterator[List[Document]]:
+    chunk: List[Document] = []
+    for document in documents:
+        chunk.append(document)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def default_worker_count() -> int:
+    configured = int(getattr(settings, "TEMPLATE_IMPACT_WORKERS", 0) or 0)
+    return configured if configured > 0 else min(4, os.cpu_count() or 1)
+
+
+def iter_template_impact(
+    template,
+    new_rules: dict,
+    *,
+    include_snapshots: bool = True,
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    limit: Optional[int] = None,
+    documents: Optional[Iterable[Document]] = None,
+) -> Iterator[dict]:
+    """Yield one comparison result per document, in completion order.
+
+    workers <= 1 runs in-process; otherwise chunks go to a process pool with at
+    most two chunks queued per worker, so memory stays flat on large corpora.
+    """
+    old_rules = template.narrative_rules or {}
+    if documents is None:
+        documents = iter_template_documents(template, include_snapshots=include_snapshots, limit=limit)
+    chunks = _chunks(documents, max(1, chunk_size))
+    workers = default_worker_count() if workers is None else workers
+
+    if workers <= 1:
+        templates = (_rules_template(old_rules), _rules_template(new_rules))
+        for chunk in chunks:
+            yield from compare_documents(chunk, templates)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(old_rules, new_rules)) as pool:
+        pending = set()
+        for chunk in chunks:
+            pending.add(pool.submit(compare_documents, chunk))
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+
+
+class ImpactSummary:
+    """Accumulates streamed comparison results into a diff summary."""
+
+    def __init__(self, sample_limit: int = 20, slowest_limit: int = 10):
+        self.sample_limit = sample_limit
+        self.slowest_limit = slowest_limit
+        self.started = time.perf_counter()
+        self.counts = {"documents": 0, "changed": 0, "unchanged": 0, "errors": 0}
+        self.by_kind: Dict[str, Dict[str, int]] = {}
+        self.samples: List[dict] = []
+        self.errors: List[dict] = []
+        self._slowest: List[Tuple[float, int, dict]] = []
+
+    def add(self, result: dict) -> None:
+        kind_counts = self.by_kind.setdefault(result["kind"], {"documents": 0, "changed": 0, "errors": 0})
+        self.counts["documents"] += 1
+        kind_counts["documents"] += 1
+        if result["changed"] is None:
+            self.counts["errors"] += 1
+            kind_counts["errors"] += 1
+            if len(self.errors) < self.sample_limit:
+                self.errors.append({"kind": result["kind"], "id": result["id"], "error": result["error"]})
+        elif result["changed"]:
+            self.counts["changed"] += 1
+            kind_counts["changed"] += 1
+            if len(self.samples) < self.sample_limit:
+                self.samples.append(
+                    {"kind": result["kind"], "id": result["id"], "removed": result["removed"], "added": result["added"]}
+                )
+        else:
+            self.counts["unchanged"] += 1
+
+        if self.slowest_limit > 0:
+            entry = (result["new_us"], self.counts["documents"], result)
+            if len(self._slowest) < self.slowest_limit:
+                heapq.heappush(self._slowest, entry)
+            elif entry[0] > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def as_dict(self) -> dict:
+        slowest = [
+            {"kind": result["kind"], "id": result["id"], "old_us": result["old_us"], "new_us": result["new_us"]}
+            for _, _, result in sorted(self._slowest, key=lambda entry: (-entry[0], entry[1]))
+        ]
+        return {
+            **self.counts,
+            "by_kind": self.by_kind,
+            "samples": self.samples,
+            "errors_sample": self.errors,
+            "slowest": slowest,
+            "elapsed_ms": round((time.perf_counter() - self.started) * 1000, 1),
+        }
+
+
+def simulate_template_impact(
+    template,
+    new_rules: dict,
+    *,
+    sample_limit: int = 20,
+    slowest_limit: int = 10,
+    on_result: Optional[Callable[[dict], None]] = None,
+    **options,
+) -> dict:
+    """Run the whole comparison and return the diff summary (see iter_template_impact for options)."""
+    summary = ImpactSummary(sample_limit=sample_limit, slowest_limit=slowest_limit)
+    for result in iter_template_impact(template, new_rules, **options):
+        summary.add(result)
+        if on_result is not None:
+            on_result(result)
+    report = summary.as_dict()
+    logger.info(
+        "template_impact_simulated",
+        extra={
+            "event": "template_impact_simulated",
+            "template_id": str(template.pk),
+            "documents": report["documents"],
+            "changed": report["changed"],
+            "elapsed_ms": report["elapsed_ms"],
+        },
+    )
+    return report
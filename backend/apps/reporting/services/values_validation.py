@@ -0,0 +1,305 @@
+"""
+Compiled validators for ReportInstanceV2.values_json.
+
+A template's json_schema is compiled once per template version into a tree of
+small checker closures, so validating a save is a dict walk rather than a
+schema interpretation. Supported keywords: type, enum, const, minimum, maximum,
+exclusiveMinimum, exclusiveMaximum, minLength, maxLength, pattern, items,
+minItems, maxItems, properties, additionalProperties (false only).
+
+Report forms are filled progressively, so:
+- null and "" are accepted for every field (cleared inputs); "required" is not enforced.
+- numeric strings are accepted for number/integer fields, as the narrative engine coerces them.
+
+Errors are structured: {"field": "a.b[0]", "code": "...", "message": "...", ...}.
+"""
+
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from django.conf import settings
+
+DEFAULT_MAX_BYTES = 256 * 1024
+VALIDATOR_CACHE_SIZE = 64
+
+Checker = Callable[[Any, str, List[dict]], None]
+
+
+def _error(errors: List[dict], field: str, code: str, message: str, **extra) -> None:
+    errors.append({"field": field, "code": code, "message": message, **extra})
+
+
+def _as_number(value) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip())
+        except ValueError:
+            return None
+    return None
+
+
+def _is_integral(number: float) -> bool:
+    return number == number and number not in (float("inf"), float("-inf")) and number.is_integer()
+
+
+_TYPE_CHECKS: Dict[str, Callable[[Any], bool]] = {
+    "string": lambda value: isinstance(value, str),
+    "number": lambda value: _as_number(value) is not None,
+    "integer": lambda value: (number := _as_number(value)) is not None and _is_integral(number),
+    "boolean": lambda value: isinstance(value, bool),
+    "array": lambda value: isinstance(value, list),
+    "object": lambda value: isinstance(value, dict),
+    "null": lambda value: value is None,
+}
+
+
+def _compile_type(type_spec) -> Optional[Checker]:
+    names = type_spec if isinstance(type_spec, list) else [type_spec]
+    tests = [_TYPE_CHECKS[name] for name in names if name in _TYPE_CHECKS]
+    if not tests:
+        return None
+    expected = "|".join(name for name in names if name in _TYPE_CHECKS)
+
+    if len(tests) == 1:
+        test = tests[0]
+
+        def check(value, path, errors):
+            if not test(value):
+                _error(errors, path, "type", f"Expected {expected}.", expected=expected)
+
+        return check
+
+    def check_any(value, path, errors):
+        for test in tests:
+            if test(value):
+                return
+        _error(errors, path, "type", f"Expected {expected}.", expected=expected)
+
+    return check_any
+
+
+def _compile_numeric_bounds(schema: dict) -> List[Checker]:
+    checks: List[Checker] = []
+    for keyword, fails, phrase in (
+        ("minimum", lambda n, b: n < b, "at least"),
+        ("maximum", lambda n, b: n > b, "at most"),
+        ("exclusiveMinimum", lambda n, b: n <= b, "greater than"),
+        ("exclusiveMaximum", lambda n, b: n >= b, "less than"),
+    ):
+        bound = _as_number(schema.get(keyword))
+        if bound is None:
+            continue
+
+        def check(value, path, errors, keyword=keyword, bound=bound, fails=fails, phrase=phrase):
+            number = _as_number(value)
+            if number is not None and fails(number, bound):
+                _error(errors, path, keyword, f"Must be {phrase} {schema[keyword]}.", limit=schema[keyword])
+
+        checks.append(check)
+    return checks
+
+
+def _compile_string_bounds(schema: dict) -> List[Checker]:
+    checks: List[Checker] = []
+    min_length, max_length = schema.get("minLength"), schema.get("maxLength")
+    if isinstance(max_length, int):
+        def check_max(value, path, errors):
+            if isinstance(value, str) and len(value) > max_length:
+                _error(errors, path, "maxLength", f"Must be at most {max_length} characters.", limit=max_length)
+
+        checks.append(check_max)
+    if isinstance(min_length, int):
+        def check_min(value, path, errors):
+            if isinstance(value, str) and len(value) < min_length:
+                _error(errors, path, "minLength", f"Must be at least {min_length} characters.", limit=min_length)
+
+        checks.append(check_min)
+    if isinstance(schema.get("pattern"), str):
+        try:
+            pattern = re.compile(schema["pattern"])
+        except re.error:
+            pattern = None
+        if pattern is not None:
+            def check_pattern(value, path, errors):
+                if isinstance(value, str) and not pattern.search(value):
+                    _error(errors, path, "pattern", "Does not match the expected format.")
+
+            checks.append(check_pattern)
+    return checks
+
+
+def _compile_array(schema: dict) -> List[Checker]:
+    checks: List[Checker] = []
+    item_check = compile_schema(schema["items"]) if isinstance(schema.get("items"), dict) else None
+    min_items, max_items = schema.get("minItems"), schema.get("maxItems")
+
+    def check(value, path, errors):
+        if not isinstance(value, list):
+            return
+        if isinstance(max_items, int) and len(value) > max_items:
+            _error(errors, path, "maxItems", f"At most {max_items} items allowed.", limit=max_items)
+        if isinstance(min_items, int) and len(value) < min_items:
+            _error(errors, path, "minItems", f"At least {min_items} items required.", limit=min_items)
+        if item_check is not None:
+            for index, item in enumerate(value):
+                item_check(item, f"{path}[{index}]", errors)
+
+    if item_check is not None or isinstance(min_items, int) or isinstance(max_items, int):
+        checks.append(check)
+    return checks
+
+
+def _compile_object(schema: dict) -> List[Checker]:
+    properties = schema.get("properties")
+    property_checks = {
+        key: compile_schema(sub_schema)
+        for key, sub_schema in (properties.items() if isinstance(properties, dict) else [])
+        if isinstance(sub_schema, dict)
+    }
+    closed = schema.get("additionalProperties") is False
+    if not property_checks and not closed:
+        return []
+
+    def check(value, path, errors):
+        if not isinstance(value, dict):
+            return
+        prefix = f"{path}." if path else ""
+        for key, item in value.items():
+            item_check = property_checks.get(key)
+            if item_check is not None:
+                item_check(item, f"{prefix}{key}", errors)
+            elif closed:
+                _error(errors, f"{prefix}{key}", "additionalProperties", "Unknown field.")
+
+    return [check]
+
+
+def compile_schema(schema: dict) -> Checker:
+    """Compile a (sub)schema into a checker(value, path, errors) that appends structured errors."""
+    checks: List[Checker] = []
+    type_check = _compile_type(schema.get("type")) if "type" in schema else None
+    if type_check is not None:
+        checks.append(type_check)
+
+    if isinstance(schema.get("enum"), list):
+        allowed = schema["enum"]
+
+        def check_enum(value, path, errors):
+            if value not in allowed:
+                _error(errors, path, "enum", "Value is not one of the allowed options.", allowed=allowed)
+
+        checks.append(check_enum)
+    if "const" in schema:
+        const = schema["const"]
+
+        def check_const(value, path, errors):
+            if value != const:
+                _error(errors, path, "const", f"Must be {const!r}.")
+
+        checks.append(check_const)
+
+    checks.extend(_compile_numeric_bounds(schema))
+    checks.extend(_compile_string_bounds(schema))
+    checks.extend(_compile_array(schema))
+    checks.extend(_compile_object(schema))
+    if type_check is not None and len(checks) == 1:
+        def check_type_only(value, path, errors):
+            if value is not None and value != "":
+                type_check(value, path, errors)
+
+        return check_type_only
+
+    checks = tuple(checks)
+
+    def check(value, path, errors):
+        if value is None or value == "":
+            return
+        before = len(errors)
+        for sub_check in checks:
+            sub_check(value, path, errors)
+            # One type error per field is enough; later keywords would only repeat it.
+            if len(errors) > before and errors[-1]["code"] == "type":
+                return
+
+    return check
+
+
+class ValuesValidator:
+    """Compiled validator for one template version's json_schema."""
+
+    __slots__ = ("check", "max_bytes")
+
+    def __init__(self, json_schema: Optional[dict], max_bytes: Optional[int] = None):
+        schema = dict(json_schema) if isinstance(json_schema, dict) else {}
+        schema.setdefault("type", "object")
+        self.check = compile_schema(schema)
+        self.max_bytes = max_bytes
+
+    def validate(self, values_json) -> List[dict]:
+        """Return a list of structured errors (empty when valid)."""
+        errors: List[dict] = []
+        if not isinstance(values_json, dict):
+            _error(errors, "", "type", "values_json must be an object.", expected="object")
+            return errors
+
+        max_bytes = self.max_bytes if self.max_bytes is not None else _max_bytes()
+        if max_bytes:
+            try:
+                size = len(json.dumps(values_json, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+            except (TypeError, ValueError):
+                _error(errors, "", "type", "values_json must be JSON serializable.")
+                return errors
+            if size > max_bytes:
+                _error(errors, "", "max_bytes", f"values_json is {size} bytes; limit is {max_bytes}.", limit=max_bytes)
+                return errors
+
+        self.check(values_json, "", errors)
+        return errors
+
+
+def _max_bytes() -> int:
+    return int(getattr(settings, "REPORT_VALUES_MAX_BYTES", DEFAULT_MAX_BYTES) or 0)
+
+
+_VALIDATOR_CACHE: "OrderedDict[tuple, ValuesValidator]" = OrderedDict()
+_VALIDATOR_CACHE_LOCK = threading.Lock()
+
+
+def get_values_validator(template_v2) -> ValuesValidator:
+    """Return the compiled validator for a template version, compiling on first use."""
+    pk = getattr(template_v2, "pk", None)
+    updated_at = getattr(template_v2, "updated_at", None)
+    if pk is None or updated_at is None:
+        return ValuesValidator(template_v2.json_schema)
+    key = (pk, updated_at)
+
+    with _VALIDATOR_CACHE_LOCK:
+        validator = _VALIDATOR_CACHE.get(key)
+        if validator is not None:
+            _VALIDATOR_CACHE.move_to_end(key)
+            return validator
+
+    validator = ValuesValidator(template_v2.json_schema)
+
+    with _VALIDATOR_CACHE_LOCK:
+        _VALIDATOR_CACHE[key] = validator
+        _VALIDATOR_CACHE.move_to_end(key)
+        while len(_VALIDATOR_CACHE) > VALIDATOR_CACHE_SIZE:
+            _VALIDATOR_CACHE.popitem(last=False)
+    return validator
+
+
+def validate_values_json(template_v2, values_json) -> List[dict]:
+    return get_values_validator(template_v2).validate(values_json)
+
+
+def clear_values_validator_cache() -> None:
+    with _VALIDATOR_CACHE_LOCK:
+        _VALIDATOR_CACHE.clear()
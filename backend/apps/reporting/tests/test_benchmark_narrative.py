@@ -0,0 +1,49 @@
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+
+
+class BenchmarkNarrativeCommandTests(SimpleTestCase):
+    def _run(self, **options):
+        out = StringIO()
+        call_command("benchmark_narrative", iterations=3, alloc_every=2, stdout=out, stderr=StringIO(), **options)
+        return out.getvalue()
+
+    def test_report_and_stable_digest(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            first_path = Path(tmp) / "first.json"
+            second_path = Path(tmp) / "second.json"
+            self._run(output=str(first_path))
+            self._run(output=str(second_path))
+
+            first = json.loads(first_path.read_text())
+            second = json.loads(second_path.read_text())
+            self.assertGreater(first["templates"], 0)
+            self.assertEqual(first["documents"], first["templates"] * 3)
+            for name in ("generate", "compose"):
+                self.assertIn("p95_us", first[name])
+                self.assertIn("alloc_p95_bytes", first[name])
+            self.assertIn("USG_ABD_V1", first["per_template"])
+            self.assertEqual(first["digest"], second["digest"])
+
+            # Same baseline passes the digest check.
+            self._run(baseline=str(first_path), threshold=1000)
+
+    def test_regression_threshold_fails(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline = Path(tmp) / "baseline.json"
+            baseline.write_text(json.dumps({
+                "generate": {"p50_us": 0.001, "p95_us": 0.001},
+                "compose": {"p50_us": 0.001, "p95_us": 0.001},
+            }))
+            with self.assertRaises(CommandError):
+                self._run(baseline=str(baseline), threshold=1.5)
+
+    def test_digest_drift_fails(self):
+        with self.assertRaises(CommandError):
+            self._run(expected_digest="0" * 64)
@@ -0,0 +1,64 @@
+from django.test import SimpleTestCase
+
+from apps.reporting.services.expressions import (
+    ExpressionError,
+    compile_computed_fields,
+    compile_expression,
+    evaluate_computed_fields,
+    safe_eval,
+)
+
+
+class CompileExpressionTests(SimpleTestCase):
+    def test_arithmetic_and_functions(self):
+        expr = compile_expression("round(abs(a - b) / max(a, b), 2)")
+        self.assertEqual(expr({"a": "10", "b": 12}), 0.17)
+        self.assertEqual(expr.names, frozenset({"a", "b"}))
+
+    def test_missing_names_default_to_zero(self):
+        self.assertEqual(compile_expression("a + 1")({}), 1)
+
+    def test_chained_comparison(self):
+        expr = compile_expression("1 < a <= 3")
+        self.assertTrue(expr({"a": 3}))
+        self.assertFalse(expr({"a": 4}))
+
+    def test_rejects_unsafe_syntax_at_compile_time(self):
+        for source in ["a % b", "__import__('os')", "a.b", "[a]", "a if b else c", "not a"]:
+            with self.subTest(source=source):
+                with self.assertRaises(ExpressionError):
+                    compile_expression(source)
+
+    def test_safe_eval_returns_none_on_failure(self):
+        self.assertIsNone(safe_eval("a % b", {"a": 1, "b": 2}))
+        self.assertIsNone(safe_eval("a / b", {"a": 1, "b": 0}))
+        self.assertIsNone(safe_eval("", {}))
+        self.assertEqual(safe_eval("a * 2", {"a": 2}), 4.0)
+
+
+class ComputedFieldOrderTests(SimpleTestCase):
+    def test_forward_references_are_evaluated_first(self):
+        fields = compile_computed_fields({
+            "double_ratio": "ratio * 2",
+            "ratio": "a / b",
+            "sum": "a + b",
+        })
+        self.assertEqual([f.name for f in fields], ["ratio", "double_ratio", "sum"])
+        values = evaluate_computed_fields(fields, {"a": 1, "b": 4})
+        self.assertEqual(values["double_ratio"], 0.5)
+
+    def test_self_reference_reads_input_value(self):
+        fields = compile_computed_fields({"a": "a + 1"})
+        self.assertEqual(evaluate_computed_fields(fields, {"a": 1})["a"], 2.0)
+
+    def test_cycle_falls_back_to_declaration_order(self):
+        with self.assertLogs("apps.reporting.services.expressions", level="WARNING"):
+            fields = compile_computed_fields({"x": "y + 1", "y": "x + 1", "z": "1"})
+        self.assertEqual([f.name for f in fields], ["z", "x", "y"])
+
+    def test_invalid_expression_is_skipped(self):
+        with self.assertLogs("apps.reporting.services.expressions", level="WARNING"):
+            fields = compile_computed_fields({"bad": "a % 2", "good": "a + 1"})
+        values = evaluate_computed_fields(fields, {"a": 1})
+        self.assertNotIn("bad", values)
+        self.assertEqual(values["good"], 2.0)
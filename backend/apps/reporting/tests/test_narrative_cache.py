@@ -0,0 +1,73 @@
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.reporting.models import ReportTemplateV2
+from apps.reporting.services import narrative_cache
+from apps.reporting.services.narrative_v2 import generate_narrative_v2, generate_narrative_v2_cached
+
+RULES = {
+    "sections": [{"title": "Liver", "content": ["Liver measures {{size}} cm."]}],
+    "impression_rules": [{"when": {"field": "size", "gt": 16}, "text": "Hepatomegaly."}],
+}
+
+
+class NarrativeCacheTests(TestCase):
+    def setUp(self):
+        narrative_cache.clear_narrative_cache()
+        self.template = ReportTemplateV2.objects.create(
+            code="CACHE_V2",
+            name="Cache Template",
+            modality="Test",
+            json_schema={},
+            narrative_rules=RULES,
+        )
+
+    def test_repeated_generation_hits_memory(self):
+        first = generate_narrative_v2_cached(self.template, {"size": 17})
+        second = generate_narrative_v2_cached(self.template, {"size": 17})
+        self.assertEqual(first, second)
+        self.assertEqual(second, generate_narrative_v2(self.template, {"size": 17}))
+        self.assertIsNot(first, second)
+
+        stats = narrative_cache.narrative_cache_stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["memory_hits"], 1)
+
+    def test_key_is_canonical_and_version_sensitive(self):
+        key = narrative_cache.narrative_cache_key(self.template, {"a": 1, "b": 2})
+        self.assertEqual(key, narrative_cache.narrative_cache_key(self.template, {"b": 2, "a": 1}))
+        self.assertNotEqual(key, narrative_cache.narrative_cache_key(self.template, {"a": 1, "b": 2}, mode="debug"))
+
+        self.template.save()
+        self.assertNotEqual(key, narrative_cache.narrative_cache_key(self.template, {"a": 1, "b": 2}))
+
+    @override_settings(NARRATIVE_CACHE_SIZE=1)
+    def test_lru_evicts_oldest_entry(self):
+        generate_narrative_v2_cached(self.template, {"size": 1})
+        generate_narrative_v2_cached(self.template, {"size": 2})
+        generate_narrative_v2_cached(self.template, {"size": 1})
+
+        stats = narrative_cache.narrative_cache_stats()
+        self.assertEqual(stats["memory_entries"], 1)
+        self.assertEqual(stats["misses"], 3)
+        self.assertEqual(stats["evictions"], 2)
+
+    def test_disk_tier_is_shared(self):
+        with tempfile.TemporaryDirectory() as cache_dir, override_settings(NARRATIVE_CACHE_DIR=cache_dir):
+            expected = generate_narrative_v2_cached(self.template, {"size": 17})
+            narrative_cache.clear_narrative_cache()
+
+            self.assertEqual(generate_narrative_v2_cached(self.template, {"size": 17}), expected)
+            self.assertEqual(narrative_cache.narrative_cache_stats()["disk_hits"], 1)
+
+    def test_stats_endpoint_is_admin_only(self):
+        User = get_user_model()
+        admin = User.objects.create_user(username="cache_admin", password="pw", is_staff=True)
+        client = APIClient()
+        client.force_authenticate(user=admin)
+        response = client.get("/api/reporting/templates-v2/narrative-cache-stats/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("hit_ratio", response.data)
@@ -64,3 +64,85 @@ class NarrativeComposerTests(TestCase):
         organs = [item["organ"] for item in composed["narrative_by_organ"]]
         self.assertEqual(organs, ["liver", "kidneys"])
         self.assertTrue(composed["narrative_text"].startswith("Liver:"))
+
+
+class NarrativeClassifierEquivalenceTests(TestCase):
+    """The precompiled classifier must agree with evaluating the hint tables one by one."""
+
+    WORDS = [
+        "no", "not", "seen", "visualized", "obscured", "poorly", "measures", "measuring", "12", "3.5 cm", "4mm",
+        "size", "echogenic", "fatty", "coarse", "lesion", "cyst", "mass", "cbd", "common", "bile", "duct",
+        "dilated", "dilatation", "portal", "vein", "ivc", "stone", "calculi", "ascites", "free", "fluid",
+        "normal", "unremarkable", "preserved", "satisfactory", "abnormal", "liver", "the", "kidney", "right",
+        "left", "is", "with", "and", "bipolar", "heterogeneous", "collection", "nodule", "non", "pleural", "effusion",
+    ]
+
+    def _reference_kind(self, text):
+        from apps.reporting.services import narrative_composer as nc
+
+        if nc.NEGATIVE_PREFIX.match(text):
+            return "negative"
+        if nc.MEASUREMENT_HINT.search(text):
+            return "measurement"
+        if nc.STATUS_HINT.search(text):
+            return "status"
+        return "positive"
+
+    def _reference_topic(self, text):
+        from apps.reporting.services import narrative_composer as nc
+
+        low = text.lower()
+        for topic, rx in nc.TOPIC_HINTS:
+            if rx.search(low):
+                return topic
+        return None
+
+    def _reference_contained(self, texts):
+        return {
+            i for i, ti in enumerate(texts)
+            if len(ti) >= 14 and any(ti in tj and len(tj) > len(ti) + 8 for j, tj in enumerate(texts) if j != i)
+        }
+
+    def test_classifier_matches_hint_tables(self):
+        import random
+
+        from apps.reporting.services.narrative_composer import _classify_text
+
+        rng = random.Random(5)
+        for _ in range(3000):
+            text = " ".join(rng.choice(self.WORDS) for _ in range(rng.randint(1, 8)))
+            text = text[0].upper() + text[1:] if rng.random() < 0.5 else text
+            with self.subTest(text=text):
+                self.assertEqual(_classify_text(text), (self._reference_kind(text), self._reference_topic(text)))
+
+    def test_words_exercise_every_hint(self):
+        # A new pattern needs words here, or the equivalence check above never reaches it.
+        from apps.reporting.services import narrative_composer as nc
+
+        hints = [nc.NEGATIVE_PREFIX, nc.MEASUREMENT_HINT, nc.STATUS_HINT, *(rx for _, rx in nc.TOPIC_HINTS)]
+        phrases = self.WORDS + [" ".join(pair) for pair in zip(self.WORDS, self.WORDS[1:])]
+        for rx in hints:
+            with self.subTest(pattern=rx.pattern):
+                self.assertTrue(any(rx.search(phrase) for phrase in phrases))
+
+    def test_source_key_trie_matches_prefix_map_order(self):
+        from apps.reporting.services.narrative_composer import ORGAN_PREFIX_MAP, _organ_for_source_key
+
+        for key in ["kid_r_length", "x_kid_l_cmd", "gb_wall", "liv_size", "cbd_gb_x", "aff_spl_", "misc_key", "panc_x", "pan", ""]:
+            expected = next(
+                (organ for prefix, organ in ORGAN_PREFIX_MAP.items() if key.startswith(prefix) or f"_{prefix}" in key),
+                None,
+            )
+            with self.subTest(key=key):
+                self.assertEqual(_organ_for_source_key(key), expected)
+
+    def test_containment_index_matches_pairwise_scan(self):
+        import random
+
+        from apps.reporting.services.narrative_composer import _contained_indexes
+
+        rng = random.Random(11)
+        for _ in range(300):
+            texts = [" ".join(rng.choice(self.WORDS[:20]) for _ in range(rng.randint(1, 7))) for _ in range(rng.randint(1, 12))]
+            with self.subTest(texts=texts):
+                self.assertEqual(_contained_indexes(texts), self._reference_contained(texts))
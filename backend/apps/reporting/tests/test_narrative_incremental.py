@@ -0,0 +1,108 @@
+import json
+import random
+from pathlib import Path
+
+from django.test import TestCase
+
+from apps.reporting.models import ReportTemplateV2
+from apps.reporting.services.narrative_plan import get_narrative_plan
+from apps.reporting.services.narrative_v2 import (
+    changed_value_fields,
+    generate_narrative_v2,
+    generate_narrative_v2_for_instance,
+    generate_narrative_v2_incremental,
+)
+
+SEED_DIR = Path(__file__).resolve().parents[1] / "seed_data" / "templates_v2" / "library" / "phase2_v1.1"
+
+
+def _random_value(spec, rng):
+    if "enum" in spec and rng.random() < 0.9:
+        return rng.choice(spec["enum"] + [""])
+    kind = spec.get("type")
+    if kind == "boolean":
+        return rng.choice([True, False, None])
+    if kind in ("number", "integer"):
+        return rng.choice([None, "", 0, rng.randint(1, 30), round(rng.uniform(0, 20), 1)])
+    return rng.choice(["", "Right", "measures 3 mm stone", "normal", None, "not seen"])
+
+
+class IncrementalNarrativeTests(TestCase):
+    def _load_template(self, code):
+        data = json.loads((SEED_DIR / f"{code}.json").read_text())
+        return ReportTemplateV2.objects.create(
+            code=data["code"],
+            name=data["name"],
+            modality=data.get("modality", "USG"),
+            json_schema=data["json_schema"],
+            ui_schema=data.get("ui_schema", {}),
+            narrative_rules=data["narrative_rules"],
+        )
+
+    def test_incremental_matches_full_run_for_seed_templates(self):
+        rng = random.Random(3)
+        for code in ["USG_ABD_V1", "USG_KUB_V1", "USG_PELVIS_V1"]:
+            template = self._load_template(code)
+            props = template.json_schema["properties"]
+            keys = list(props)
+            values = {k: _random_value(props[k], rng) for k in keys if rng.random() < 0.7}
+            previous = json.loads(json.dumps(generate_narrative_v2(template, values)))
+            for _ in range(40):
+                new_values = dict(values)
+                for key in rng.sample(keys, rng.randint(1, 3)):
+                    new_values[key] = _random_value(props[key], rng)
+                changed = changed_value_fields(values, new_values)
+
+                full = generate_narrative_v2(template, new_values)
+                incremental = generate_narrative_v2_incremental(template, new_values, previous, changed)
+                with self.subTest(code=code, changed=sorted(changed)):
+                    self.assertEqual(json.dumps(incremental), json.dumps(full))
+                values, previous = new_values, json.loads(json.dumps(full))
+
+    def test_dependencies_follow_computed_fields(self):
+        template = ReportTemplateV2.objects.create(
+            code="INC_V2",
+            name="Incremental",
+            modality="Test",
+            json_schema={},
+            narrative_rules={
+                "computed_fields": {"ratio": "a / b"},
+                "sections": [
+                    {"title": "Liver", "content": ["Ratio {{ratio}}."]},
+                    {"title": "Spleen", "content": [{"if": {"field": "s", "gt": 12}, "then": "Spleen enlarged."}]},
+                ],
+                "impression_rules": [{"when": {"field": "s", "gt": 12}, "text": "Splenomegaly."}],
+            },
+        )
+        deps = get_narrative_plan(template).dependencies
+        affected = deps.expand({"a"})
+        self.assertEqual(affected, frozenset({"a", "ratio"}))
+        self.assertTrue(deps.section_affected(0, affected))
+        self.assertFalse(deps.section_affected(1, affected))
+        self.assertFalse(deps.impression_affected(affected))
+
+        previous = generate_narrative_v2(template, {"a": 1, "b": 2, "s": 14})
+        result = generate_narrative_v2_incremental(template, {"a": 3, "b": 2, "s": 14}, previous, {"a"})
+        self.assertEqual(result, generate_narrative_v2(template, {"a": 3, "b": 2, "s": 14}))
+        self.assertEqual(result["impression"], ["Splenomegaly."])
+
+    def test_unusable_previous_narrative_falls_back_to_full_run(self):
+        template = self._load_template("USG_KUB_V1")
+        values = {"kid_r_visualized": True, "kid_r_length_cm": 10.5}
+        expected = generate_narrative_v2(template, values)
+        for previous in [None, {}, {"sections": "bad"}, generate_narrative_v2(template, {}, include_composer_debug=True)]:
+            with self.subTest(previous=type(previous).__name__):
+                self.assertEqual(generate_narrative_v2_incremental(template, values, previous, {"kid_r_length_cm"}), expected)
+
+    def test_changed_value_fields_is_type_sensitive(self):
+        self.assertEqual(changed_value_fields({"a": 1, "b": [1]}, {"a": True, "b": [1]}), {"a"})
+        self.assertEqual(changed_value_fields({"a": None}, {}), set())
+
+    def test_for_instance_reuses_last_generation(self):
+        template = self._load_template("USG_KUB_V1")
+        values = {"kid_r_visualized": True, "kid_r_length_cm": 10.5}
+        first = generate_narrative_v2_for_instance(template, "instance-1", values)
+        values = dict(values, kid_r_length_cm=11.0)
+        second = generate_narrative_v2_for_instance(template, "instance-1", values)
+        self.assertEqual(second, generate_narrative_v2(template, values))
+        self.assertNotEqual(first, second)
@@ -0,0 +1,100 @@
+from django.test import TestCase
+
+from apps.reporting.models import ReportTemplateV2
+from apps.reporting.services.narrative_plan import (
+    _evaluate_condition,
+    _render_template,
+    clear_narrative_plan_cache,
+    compile_condition,
+    get_narrative_plan,
+    CompiledTemplate,
+)
+from apps.reporting.services.narrative_v2 import generate_narrative_v2
+
+
+class NarrativePlanCacheTests(TestCase):
+    def setUp(self):
+        clear_narrative_plan_cache()
+        self.template = ReportTemplateV2.objects.create(
+            code="PLAN_V2",
+            name="Plan Template",
+            modality="Test",
+            json_schema={"type": "object", "properties": {"size": {"type": "number"}}},
+            narrative_rules={
+                "sections": [{"title": "Findings", "content": ["Size {{size}} cm."]}],
+            },
+        )
+
+    def test_plan_is_reused_for_same_template_version(self):
+        plan1 = get_narrative_plan(self.template)
+        plan2 = get_narrative_plan(ReportTemplateV2.objects.get(pk=self.template.pk))
+        self.assertIs(plan1, plan2)
+
+    def test_saving_template_recompiles_plan(self):
+        plan1 = get_narrative_plan(self.template)
+        self.template.narrative_rules = {
+            "sections": [{"title": "Findings", "content": ["Length {{size}} cm."]}],
+        }
+        self.template.save()
+
+        plan2 = get_narrative_plan(self.template)
+        self.assertIsNot(plan1, plan2)
+        result = generate_narrative_v2(self.template, {"size": 4})
+        self.assertEqual(result["sections"][0]["lines"], ["Length 4 cm."])
+
+    def test_unsaved_template_is_not_cached(self):
+        template = ReportTemplateV2(code="UNSAVED", name="Unsaved", modality="Test", narrative_rules={})
+        template.updated_at = None
+        self.assertIsNot(get_narrative_plan(template), get_narrative_plan(template))
+
+
+class CompiledRuleEquivalenceTests(TestCase):
+    CONDITIONS = [
+        None,
+        {},
+        {"field": "a", "equals": 1},
+        {"field": "a", "not_equals": 1},
+        {"field": "a", "gt": "2"},
+        {"field": "a", "lte": 2},
+        {"field": "a", "gte": "x"},
+        {"field": "a", "is_empty": True},
+        {"field": "a", "is_not_empty": True},
+        {"field": "a", "in": ["x", 1]},
+        {"field": "a", "not_in": ["x"]},
+        {"field": "a", "contains": "Stone"},
+        {"all": [{"field": "a", "gt": 0}, {"not": {"field": "b", "is_empty": True}}]},
+        {"any": [{"field": "a", "equals": "x"}, {"field": "b", "equals": True}]},
+        {"field": "a"},
+    ]
+    VALUES = [
+        {},
+        {"a": None},
+        {"a": ""},
+        {"a": 1},
+        {"a": "3", "b": True},
+        {"a": ["x", "z"]},
+        {"a": "Big stone", "b": ""},
+        {"a": True},
+    ]
+    TEMPLATES = [
+        "Plain text  ",
+        "Size {{a}} cm.",
+        "Size {{a?}} ( {{b?}} ) , noted .",
+        "Value {{a|n/a}} and {{?b|none}}",
+        "{{a}} {{b}}",
+        "",
+    ]
+
+    def test_compiled_conditions_match_interpreter(self):
+        for condition in self.CONDITIONS:
+            compiled = compile_condition(condition)
+            for values in self.VALUES:
+                with self.subTest(condition=condition, values=values):
+                    self.assertEqual(compiled(values), _evaluate_condition(condition, values))
+
+    def test_compiled_templates_match_interpreter(self):
+        for template in self.TEMPLATES:
+            compiled = CompiledTemplate(template)
+            for values in self.VALUES:
+                with self.subTest(template=template, values=values):
+                    self.assertEqual(compiled.render(values), _render_template(template, values, {}))
@@ -0,0 +1,108 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from apps.reporting.models import ReportTemplateV2
+from apps.reporting.services.narrative_plan import compile_condition, trace_condition
+from apps.reporting.services.narrative_v2 import generate_narrative_v2
+
+RULES = {
+    "computed_fields": {"ratio": "a / b", "broken": "a / 0"},
+    "sections": [
+        {
+            "title": "Liver",
+            "content": [
+                "Liver measures {{size}} cm.",
+                {
+                    "if": {"any": [{"field": "size", "gt": 16}, {"field": "fatty", "equals": True}]},
+                    "then": "Liver abnormal.",
+                    "else": "Liver normal.",
+                },
+            ],
+        },
+        {"title": "Spleen", "content": ["Ratio {{ratio}}."]},
+    ],
+    "impression_rules": [
+        {"priority": 1, "when": {"field": "size", "gt": 16}, "text": "Hepatomegaly."},
+        {"priority": 2, "when": {"field": "size", "gt": 10}, "text": "Liver {{size}} cm."},
+        {"priority": 3, "text": "Never reached."},
+    ],
+}
+
+
+class NarrativeTraceTests(TestCase):
+    def setUp(self):
+        self.template = ReportTemplateV2.objects.create(
+            code="TRACE_V2",
+            name="Trace Template",
+            modality="Test",
+            json_schema={},
+            narrative_rules=RULES,
+        )
+
+    def test_trace_does_not_change_output(self):
+        for values in [{}, {"size": 18, "a": 1, "b": 2}, {"size": 12, "fatty": True}]:
+            with self.subTest(values=values):
+                plain = generate_narrative_v2(self.template, values, include_composer_debug=True)
+                traced = generate_narrative_v2(self.template, values, include_composer_debug=True, include_trace=True)
+                self.assertIn("trace", traced)
+                traced.pop("trace")
+                self.assertEqual(json.dumps(traced), json.dumps(plain))
+                self.assertNotIn("trace", generate_narrative_v2(self.template, values))
+
+    def test_trace_records_rules_conditions_and_misses(self):
+        trace = generate_narrative_v2(self.template, {"size": 18}, include_trace=True)["trace"]
+        json.dumps(trace)
+
+        computed = {entry["field"]: entry for entry in trace["computed"]}
+        self.assertIn("error", computed["broken"])
+        self.assertNotIn("ratio", generate_narrative_v2(self.template, {"size": 18}).get("computed", {}))
+
+        liver, spleen = trace["sections"]
+        self.assertEqual((liver["title"], liver["lines"]), ("Liver", 2))
+        self.assertGreaterEqual(liver["us"], 0)
+        conditional = liver["rules"][1]
+        self.assertEqual(conditional["branch"], "then")
+        self.assertTrue(conditional["condition"]["short_circuited"])
+        self.assertEqual(conditional["condition"]["evaluated"], 1)
+        self.assertEqual(spleen["rules"][0]["missing"], ["ratio"])
+        self.assertTrue(spleen["rules"][0]["skipped"])
+
+        impression = trace["impression"]
+        self.assertEqual([entry["priority"] for entry in impression], [1, 2, 3])
+        self.assertTrue(impression[0]["matched"])
+        self.assertTrue(impression[0]["stopped"])
+        self.assertFalse(impression[1]["evaluated"])
+        self.assertIn("total_us", trace)
+        self.assertIn("compose_us", trace)
+
+    def test_trace_condition_matches_compiled_semantics(self):
+        values = {"a": 5, "b": "", "c": None}
+        for condition in [
+            None,
+            {"field": "a", "gte": 5},
+            {"field": "b", "is_empty": True},
+            {"all": [{"field": "a", "lt": 3}, {"field": "b", "is_empty": True}]},
+            {"not": {"any": [{"field": "c", "is_not_empty": True}]}},
+        ]:
+            with self.subTest(condition=condition):
+                result, detail = trace_condition(condition, values)
+                self.assertEqual(result, compile_condition(condition)(values))
+                self.assertEqual(detail.get("result", True), result)
+
+    def test_preview_debug_returns_trace(self):
+        User = get_user_model()
+        admin = User.objects.create_user(username="trace_admin", password="pw", is_staff=True)
+        client = APIClient()
+        client.force_authenticate(user=admin)
+        url = f"/api/reporting/templates-v2/{self.template.id}/preview-narrative/"
+
+        response = client.post(url + "?debug=1", {"values_json": {"size": 18}}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("sections", response.data["trace"])
+        self.assertNotIn("trace", response.data["narrative_json"])
+
+        response = client.post(url, {"values_json": {"size": 18}}, format="json")
+        self.assertNotIn("trace", response.data)
@@ -0,0 +1,26 @@
+import random
+from io import BytesIO
+
+from django.test import SimpleTestCase
+from pypdf import PdfReader
+
+from apps.printing.management.commands.benchmark_pdf import synthetic_report
+from apps.reporting.pdf_engine.report_pdf_v2 import render_report_pdf_v2
+
+
+class ReportPDFV2LayoutTests(SimpleTestCase):
+    def test_long_impression_continues_on_next_page(self):
+        data = synthetic_report(random.Random(7), 1)
+        data["sections"]["impression"] = [
+            f"Impression point {index:03d}: " + "persistent echogenic focus without shadowing " * 3
+            for index in range(90)
+        ]
+
+        reader = PdfReader(BytesIO(render_report_pdf_v2(data)))
+        pages_with_points = [
+            number for number, page in enumerate(reader.pages) if "Impression point" in page.extract_text()
+        ]
+        self.assertGreater(len(pages_with_points), 1)
+        text = "".join(page.extract_text() for page in reader.pages)
+        self.assertIn("Impression point 000", text)
+        self.assertIn("Impression point 089", text)
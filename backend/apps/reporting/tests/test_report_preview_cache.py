@@ -0,0 +1,137 @@
+import os
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.catalog.models import Modality, Service
+from apps.patients.models import Patient
+from apps.reporting.models import (
+    ReportingOrganizationConfig,
+    ReportInstanceV2,
+    ReportTemplateV2,
+    ServiceReportTemplateV2,
+)
+from apps.reporting.services import preview_cache
+from apps.workflow.models import ServiceVisit, ServiceVisitItem
+
+
+def _render_stub(render, data, label=None):
+    return f"%PDF-preview {data['patient']['name']} {data['patient']['referred_by']} {data['sections']}".encode()
+
+
+class PreviewCacheEvictionTests(TestCase):
+    def test_evicts_by_age_then_size(self):
+        with tempfile.TemporaryDirectory() as tmp, override_settings(REPORT_PREVIEW_CACHE_DIR=tmp):
+            now = time.time()
+            for index, age in enumerate([5000, 300, 200, 100]):
+                path = Path(tmp) / f"instance-{index}" / f"key{index}.pdf"
+                path.parent.mkdir()
+                path.write_bytes(b"x" * 100)
+                os.utime(path, (now - age, now - age))
+
+            result = preview_cache.evict_preview_cache(max_bytes=250, max_age=3600)
+            self.assertEqual(result["removed"], 2)
+            self.assertEqual(result["bytes_remaining"], 200)
+            self.assertEqual(sorted(p.name for p in Path(tmp).glob("*/*.pdf")), ["key2.pdf", "key3.pdf"])
+            self.assertFalse((Path(tmp) / "instance-0").exists())
+
+
+class ReportPreviewCacheAPITests(TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        settings_override = override_settings(REPORT_PREVIEW_CACHE_DIR=self._tmp.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        user = get_user_model().objects.create_superuser(username="preview_admin", password="pw", email="p@example.com")
+        self.client.force_authenticate(user=user)
+        modality = Modality.objects.create(code="USG", name="Ultrasound")
+        service = Service.objects.create(code="USG_PREVIEW", name="USG Preview", modality=modality, price=100)
+        self.template = ReportTemplateV2.objects.create(
+            code="USG_PREVIEW_V2",
+            name="Preview",
+            modality="USG",
+            status="active",
+            json_schema={"type": "object", "properties": {"liver": {"type": "string"}}},
+            narrative_rules={"sections": [{"title": "Findings", "content": ["Liver: {{liver}}"]}]},
+        )
+        ServiceReportTemplateV2.objects.create(service=service, template=self.template, is_active=True, is_default=True)
+        self.patient = Patient.objects.create(name="Preview Patient", age=40, gender="F")
+        self.visit = ServiceVisit.objects.create(patient=self.patient, created_by=user)
+        item = ServiceVisitItem.objects.create(service_visit=self.visit, service=service, status="PENDING")
+        self.instance = ReportInstanceV2.objects.create(
+            work_item=item, template_v2=self.template, values_json={"liver": "normal"}, created_by=user
+        )
+        self.url = f"/api/reporting/workitems/{item.id}/report-pdf/"
+
+    def _get(self, **headers):
+        with mock.patch("apps.reporting.views.render_pdf", side_effect=_render_stub) as render:
+            response = self.client.get(self.url, **headers)
+        return response, render.call_count
+
+    def test_repeat_preview_is_served_from_disk(self):
+        first, renders = self._get()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(renders, 1)
+        self.assertTrue(first["ETag"])
+        self.assertIn("Last-Modified", first)
+
+        second, renders = self._get()
+        self.assertEqual(renders, 0)
+        self.assertEqual(b"".join(second.streaming_content), first.content)
+        self.assertEqual(second["ETag"], first["ETag"])
+
+        not_modified, renders = self._get(HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(renders, 0)
+
+    def test_changes_invalidate_and_replace_entry(self):
+        first, _ = self._get()
+
+        self.instance.values_json = {"liver": "fatty"}
+        self.instance.save()
+        after_edit, renders = self._get(HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(after_edit.status_code, 200)
+        self.assertEqual(renders, 1)
+        self.assertNotEqual(after_edit["ETag"], first["ETag"])
+        self.assertEqual(len(list(Path(self._tmp.name).glob("*/*.pdf"))), 1)
+
+        ReportingOrganizationConfig.objects.create(org_name="New Branding")
+        after_branding, renders = self._get()
+        self.assertEqual(renders, 1)
+        self.assertNotEqual(after_branding["ETag"], after_edit["ETag"])
+
+    def test_patient_and_visit_edits_change_preview(self):
+        first, _ = self._get()
+
+        self.patient.name = "Corrected Name"
+        self.patient.save()
+        after_rename, renders = self._get(HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(after_rename.status_code, 200)
+        self.assertEqual(renders, 1)
+        self.assertNotEqual(after_rename["ETag"], first["ETag"])
+        self.assertIn(b"Corrected Name", after_rename.content)
+
+        self.visit.referring_consultant = "Dr. Referrer"
+        self.visit.save()
+        after_referrer, renders = self._get(HTTP_IF_NONE_MATCH=after_rename["ETag"])
+        self.assertEqual(after_referrer.status_code, 200)
+        self.assertEqual(renders, 1)
+        self.assertNotEqual(after_referrer["ETag"], after_rename["ETag"])
+        self.assertNotEqual(after_referrer.content, after_rename.content)
+        self.assertIn(b"Dr. Referrer", after_referrer.content)
+
+
+@override_settings(REPORT_PREVIEW_CACHE_DIR="")
+class PreviewCacheDisabledTests(TestCase):
+    def test_lookups_and_stores_are_noops(self):
+        self.assertIsNone(preview_cache.store_preview("instance", "key", b"%PDF"))
+        self.assertIsNone(preview_cache.get_cached_preview("instance", "key"))
+        self.assertFalse(preview_cache.preview_cache_stats()["enabled"])
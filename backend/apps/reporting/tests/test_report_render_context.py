@@ -0,0 +1,71 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from apps.catalog.models import Modality, Service
+from apps.patients.models import Patient
+from apps.reporting.models import ReportInstanceV2, ReportTemplateV2, ServiceReportTemplateV2
+from apps.reporting.pdf_engine.report_pdf_v2 import ReportPDFGeneratorV2
+from apps.reporting.services import render_context
+from apps.workflow.models import ServiceVisit, ServiceVisitItem
+
+
+class ReportRenderContextTests(TestCase):
+    def setUp(self):
+        render_context.clear_render_context_cache()
+        self.addCleanup(render_context.clear_render_context_cache)
+
+        self.client = APIClient()
+        user = get_user_model().objects.create_superuser(username="context_admin", password="pw", email="c@example.com")
+        self.client.force_authenticate(user=user)
+        modality = Modality.objects.create(code="USG", name="Ultrasound")
+        service = Service.objects.create(code="USG_CONTEXT", name="USG Context", modality=modality, price=100)
+        template = ReportTemplateV2.objects.create(
+            code="USG_CONTEXT_V2",
+            name="Context",
+            modality="USG",
+            status="active",
+            json_schema={"type": "object", "properties": {"liver": {"type": "string"}}},
+            narrative_rules={"sections": [{"title": "Findings", "content": ["Liver: {{liver}}"]}]},
+        )
+        ServiceReportTemplateV2.objects.create(service=service, template=template, is_active=True, is_default=True)
+        self.patient = Patient.objects.create(name="Context Patient", age=40, gender="F")
+        visit = ServiceVisit.objects.create(patient=self.patient, created_by=user)
+        item = ServiceVisitItem.objects.create(service_visit=visit, service=service, status="PENDING")
+        self.instance = ReportInstanceV2.objects.create(
+            work_item=item,
+            template_v2=template,
+            values_json={"liver": "normal", "clinical_history": "Pain", "spleen_size": "11 cm"},
+            created_by=user,
+        )
+        self.url = f"/api/reporting/workitems/{item.id}/print-payload/"
+
+    def test_print_payload_and_pdf_share_cached_context(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertNotIn("logo_path", first.data["header"])
+        self.assertEqual(first.data["patient"]["clinical_indication"], "Pain")
+        self.assertEqual(first.data["sections"]["measurements"][0]["value"], "11 cm")
+
+        second = self.client.get(self.url)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(render_context.render_context_cache_stats()["hits"], 1)
+
+        generator = ReportPDFGeneratorV2(str(self.instance.id), self.instance.narrative_json or None)
+        generator.fetch_data()
+        self.assertEqual(generator.data["patient"], first.data["patient"])
+        self.assertEqual(generator.data["signatories"], first.data["signatories"])
+
+    def test_edits_and_demographics_are_not_stale(self):
+        first = self.client.get(self.url)
+
+        self.patient.name = "Corrected Name"
+        self.patient.save()
+        renamed = self.client.get(self.url)
+        self.assertEqual(renamed.data["patient"]["name"], "Corrected Name")
+
+        self.instance.values_json = {"liver": "fatty", "clinical_history": "Fever"}
+        self.instance.save()
+        edited = self.client.get(self.url)
+        self.assertEqual(edited.data["patient"]["clinical_indication"], "Fever")
+        self.assertNotEqual(edited.data["sections"], first.data["sections"])
@@ -0,0 +1,102 @@
+import hashlib
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from apps.catalog.models import Modality, Service
+from apps.patients.models import Patient
+from apps.reporting.models import ReportInstanceV2, ReportTemplateV2, ServiceReportTemplateV2
+from apps.reporting.services.publish import perform_publish_v2
+from apps.reporting.services.snapshot_store import content_address, verify_snapshot_pdf
+from apps.workflow.models import ServiceVisit, ServiceVisitItem
+
+
+class SnapshotStoreTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        self.user = get_user_model().objects.create_superuser(username="store_admin", password="pw", email="s@example.com")
+        modality = Modality.objects.create(code="USG", name="Ultrasound")
+        service = Service.objects.create(code="USG_STORE", name="USG Store", modality=modality, price=100)
+        template = ReportTemplateV2.objects.create(
+            code="USG_STORE_V2",
+            name="Store",
+            modality="USG",
+            status="active",
+            json_schema={"type": "object", "properties": {"liver": {"type": "string"}}},
+            narrative_rules={"sections": [{"title": "Findings", "content": ["Liver: {{liver}}"]}]},
+        )
+        ServiceReportTemplateV2.objects.create(service=service, template=template, is_active=True, is_default=True)
+        patient = Patient.objects.create(name="Store Patient", age=40, gender="F")
+        visit = ServiceVisit.objects.create(patient=patient, created_by=self.user)
+        item = ServiceVisitItem.objects.create(service_visit=visit, service=service, status="PENDING")
+        self.instance = ReportInstanceV2.objects.create(
+            work_item=item,
+            template_v2=template,
+            values_json={"liver": "normal"},
+            created_by=self.user,
+            status="verified",
+        )
+
+    def _publish(self):
+        with transaction.atomic():
+            return perform_publish_v2(self.instance, self.user)[1]
+
+    def test_unchanged_republish_shares_one_deterministic_file(self):
+        first = self._publish()
+        second = self._publish()
+
+        self.assertEqual((first.version, second.version), (1, 2))
+        self.assertEqual(first.pdf_sha256, second.pdf_sha256)
+        self.assertEqual(first.pdf_file.name, content_address(first.pdf_sha256))
+        self.assertEqual(second.pdf_file.name, first.pdf_file.name)
+        with first.pdf_file.open("rb") as handle:
+            self.assertEqual(hashlib.sha256(handle.read()).hexdigest(), first.pdf_sha256)
+        self.assertTrue(verify_snapshot_pdf(second))
+
+    def test_changed_values_get_a_new_file_and_tampering_is_detected(self):
+        first = self._publish()
+        self.instance.values_json = {"liver": "fatty"}
+        self.instance.save()
+        second = self._publish()
+        self.assertNotEqual(second.pdf_sha256, first.pdf_sha256)
+        self.assertNotEqual(second.pdf_file.name, first.pdf_file.name)
+
+        with open(second.pdf_file.path, "ab") as handle:
+            handle.write(b"% tampered\n")
+        self.assertFalse(verify_snapshot_pdf(second))
+        self.assertTrue(verify_snapshot_pdf(first))
+
+    def test_dedupe_command_moves_legacy_files(self):
+        from io import StringIO
+
+        from django.core.files.base import ContentFile
+        from django.core.management import call_command
+
+        first = self._publish()
+        second = self._publish()
+        pdf_bytes = first.pdf_file.read()
+        first.pdf_file.close()
+        for snapshot in (first, second):
+            # As published before content-addressed storage: a dated copy each, no hash.
+            snapshot.pdf_file.save(f"legacy_v{snapshot.version}.pdf", ContentFile(pdf_bytes), save=False)
+            snapshot.pdf_sha256 = ""
+            snapshot.save(update_fields=["pdf_file", "pdf_sha256"])
+        legacy_path = second.pdf_file.path
+
+        out = StringIO()
+        call_command("dedupe_report_snapshots", stdout=out, stderr=StringIO())
+        self.assertIn("1 stored, 1 shared", out.getvalue())
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.pdf_file.name, second.pdf_file.name)
+        self.assertEqual(first.pdf_file.name, content_address(first.pdf_sha256))
+        self.assertFalse(os.path.exists(legacy_path))
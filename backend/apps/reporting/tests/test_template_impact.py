@@ -0,0 +1,133 @@
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.catalog.models import Modality, Service
+from apps.patients.models import Patient
+from apps.reporting.models import ReportInstanceV2, ReportPublishSnapshotV2, ReportTemplateV2
+from apps.reporting.services.template_impact import simulate_template_impact
+from apps.workflow.models import ServiceVisit, ServiceVisitItem
+
+OLD_RULES = {
+    "sections": [{"title": "Liver", "content": ["Liver measures {{size}} cm."]}],
+    "impression_rules": [{"when": {"field": "size", "gt": 16}, "text": "Hepatomegaly."}],
+}
+NEW_RULES = {
+    "sections": [{"title": "Liver", "content": ["Liver measures {{size}} cm."]}],
+    "impression_rules": [{"when": {"field": "size", "gt": 14}, "text": "Hepatomegaly."}],
+}
+
+
+class TemplateImpactTests(TestCase):
+    def setUp(self):
+        self.active = ReportTemplateV2.objects.create(
+            code="IMPACT_V2", name="Impact", modality="USG", status="active", narrative_rules=OLD_RULES
+        )
+        self.candidate = ReportTemplateV2.objects.create(
+            code="IMPACT_V2", name="Impact", modality="USG", status="draft", narrative_rules=NEW_RULES
+        )
+        modality = Modality.objects.create(code="USG", name="Ultrasound")
+        service = Service.objects.create(code="USG_IMPACT", name="USG Impact", modality=modality, price=100)
+        patient = Patient.objects.create(name="Impact Patient", mrn="MRN-IMPACT", age=40, gender="F")
+        visit = ServiceVisit.objects.create(patient=patient, visit_id="VISIT-IMPACT")
+
+        self.instances = {}
+        for size in (10, 15, 18):
+            item = ServiceVisitItem.objects.create(service_visit=visit, service=service, status="PENDING")
+            self.instances[size] = ReportInstanceV2.objects.create(
+                work_item=item, template_v2=self.active, values_json={"size": size}
+            )
+        ReportPublishSnapshotV2.objects.create(
+            report_instance_v2=self.instances[15],
+            template_v2=self.active,
+            values_json={"size": 15},
+            narrative_json={},
+            pdf_file="",
+            content_hash="0" * 64,
+        )
+
+    def test_summary_counts_changed_documents(self):
+        summary = simulate_template_impact(self.active, NEW_RULES, workers=1)
+        self.assertEqual(summary["documents"], 4)
+        self.assertEqual(summary["changed"], 2)
+        self.assertEqual(summary["unchanged"], 2)
+        self.assertEqual(summary["by_kind"]["instance"]["changed"], 1)
+        self.assertEqual(summary["by_kind"]["snapshot"]["changed"], 1)
+        self.assertIn(str(self.instances[15].id), [sample["id"] for sample in summary["samples"]])
+        self.assertEqual(summary["samples"][0]["added"], ["Impression: Hepatomegaly."])
+        self.assertEqual(len(summary["slowest"]), 4)
+
+    def test_process_pool_matches_in_process_run(self):
+        inline = simulate_template_impact(self.active, NEW_RULES, workers=1, chunk_size=1)
+        pooled = simulate_template_impact(self.active, NEW_RULES, workers=2, chunk_size=1)
+        for key in ("documents", "changed", "unchanged", "errors", "by_kind"):
+            self.assertEqual(pooled[key], inline[key])
+        self.assertEqual(
+            sorted(sample["id"] for sample in pooled["samples"]),
+            sorted(sample["id"] for sample in inline["samples"]),
+        )
+
+    def test_command_writes_summary(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = Path(tmp) / "impact.json"
+            out = StringIO()
+            call_command(
+                "simulate_template_impact",
+                str(self.active.id),
+                candidate=str(self.candidate.id),
+                workers=1,
+                no_snapshots=True,
+                output=str(output),
+                stdout=out,
+            )
+            self.assertIn(f"CHANGED instance {self.instances[15].id}", out.getvalue())
+            summary = json.loads(output.read_text())
+            self.assertEqual((summary["documents"], summary["changed"]), (3, 1))
+
+    def test_endpoint_defaults_to_active_template_and_streams(self):
+        admin = get_user_model().objects.create_user(username="impact_admin", password="pw", is_staff=True)
+        client = APIClient()
+        client.force_authenticate(user=admin)
+        url = f"/api/reporting/templates-v2/{self.candidate.id}/simulate-impact/"
+
+        response = client.post(url, {}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["template_id"], str(self.active.id))
+        self.assertEqual(response.data["changed"], 2)
+
+        response = client.post(url + "?stream=1", {"include_snapshots": False}, format="json")
+        lines = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([line["type"] for line in lines], ["document", "summary"])
+        self.assertEqual(lines[-1]["documents"], 3)
+
+        response = client.post(
+            f"/api/reporting/templates-v2/{self.active.id}/simulate-impact/", {"narrative_rules": OLD_RULES}, format="json"
+        )
+        self.assertEqual(response.data["changed"], 0)
+
+    @override_settings(TEMPLATE_IMPACT_SYNC_LIMIT=2)
+    def test_endpoint_caps_json_runs_and_compares_in_process(self):
+        admin = get_user_model().objects.create_user(username="impact_limit", password="pw", is_staff=True)
+        client = APIClient()
+        client.force_authenticate(user=admin)
+        url = f"/api/reporting/templates-v2/{self.candidate.id}/simulate-impact/"
+
+        response = client.post(url, {"limit": 5}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+        with mock.patch("apps.reporting.services.template_impact.ProcessPoolExecutor") as pool:
+            response = client.post(url, {}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["limit"], response.data["documents"]), (2, 2))
+        pool.assert_not_called()
+
+        response = client.post(url + "?stream=1", {"limit": 5}, format="json")
+        lines = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(lines[-1]["documents"], 4)
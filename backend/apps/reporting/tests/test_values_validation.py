@@ -0,0 +1,140 @@
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.catalog.models import Modality, Service
+from apps.patients.models import Patient
+from apps.reporting.models import ReportInstanceV2, ReportTemplateV2, ServiceReportTemplateV2
+from apps.reporting.services.values_validation import ValuesValidator, get_values_validator
+from apps.workflow.models import ServiceVisit, ServiceVisitItem
+
+SCHEMA = {
+    "type": "object",
+    "required": ["liver_size_cm"],
+    "properties": {
+        "liver_size_cm": {"type": "number", "minimum": 5, "maximum": 30},
+        "liver_echo": {"type": "string", "enum": ["Normal", "Coarse", "Fatty"]},
+        "gb_stones": {"type": "boolean"},
+        "stone_count": {"type": "integer", "exclusiveMinimum": 0},
+        "findings": {"type": "array", "maxItems": 2, "items": {"type": "string", "enum": ["cyst", "mass"]}},
+        "comments": {"type": "string", "maxLength": 10},
+    },
+}
+
+
+class ValuesValidatorTests(SimpleTestCase):
+    def setUp(self):
+        self.validator = ValuesValidator(SCHEMA, max_bytes=1024)
+
+    def test_valid_and_partial_values_pass(self):
+        for values in [
+            {},
+            {"liver_size_cm": 12.5, "liver_echo": "Normal", "gb_stones": False, "findings": ["cyst"]},
+            {"liver_size_cm": "12.5", "stone_count": 3, "comments": ""},
+            {"liver_size_cm": None, "liver_echo": "", "unknown_field": {"nested": True}},
+        ]:
+            with self.subTest(values=values):
+                self.assertEqual(self.validator.validate(values), [])
+
+    def test_structured_errors(self):
+        errors = self.validator.validate({
+            "liver_size_cm": 45,
+            "liver_echo": "Bright",
+            "gb_stones": "yes",
+            "stone_count": 1.5,
+            "findings": ["cyst", "polyp", "mass"],
+            "comments": "x" * 11,
+        })
+        self.assertEqual(
+            sorted((error["field"], error["code"]) for error in errors),
+            [
+                ("comments", "maxLength"),
+                ("findings", "maxItems"),
+                ("findings[1]", "enum"),
+                ("gb_stones", "type"),
+                ("liver_echo", "enum"),
+                ("liver_size_cm", "maximum"),
+                ("stone_count", "type"),
+            ],
+        )
+        maximum = next(error for error in errors if error["code"] == "maximum")
+        self.assertEqual(maximum["limit"], 30)
+        json.dumps(errors)
+
+    def test_type_error_is_reported_once(self):
+        errors = self.validator.validate({"liver_size_cm": True})
+        self.assertEqual([error["code"] for error in errors], ["type"])
+
+    def test_payload_size_and_shape(self):
+        self.assertEqual(self.validator.validate({"comments": "x" * 2000})[0]["code"], "max_bytes")
+        self.assertEqual(self.validator.validate(["not", "an", "object"])[0]["code"], "type")
+        closed = ValuesValidator({"properties": {"a": {"type": "number"}}, "additionalProperties": False})
+        self.assertEqual(closed.validate({"b": 1})[0]["code"], "additionalProperties")
+
+    def test_validator_is_cached_per_template_version(self):
+        template = ReportTemplateV2(code="VAL", name="Val", modality="USG", json_schema=SCHEMA)
+        template.updated_at = "v1"
+        first = get_values_validator(template)
+        self.assertIs(get_values_validator(template), first)
+        template.updated_at = "v2"
+        self.assertIsNot(get_values_validator(template), first)
+
+
+@override_settings(REPORT_VALUES_MAX_BYTES=4096)
+class ValuesValidationAPITests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_superuser(username="val_admin", password="pw", email="v@example.com")
+        self.client.force_authenticate(user=self.user)
+        modality = Modality.objects.create(code="USG", name="Ultrasound")
+        service = Service.objects.create(code="USG_VAL", name="USG Val", modality=modality, price=100)
+        self.template = ReportTemplateV2.objects.create(
+            code="USG_VAL_V2", name="Val", modality="USG", status="active", json_schema=SCHEMA, narrative_rules={}
+        )
+        ServiceReportTemplateV2.objects.create(service=service, template=self.template, is_active=True, is_default=True)
+        patient = Patient.objects.create(name="Val Patient", age=30, gender="M")
+        visit = ServiceVisit.objects.create(patient=patient, created_by=self.user)
+        self.item = ServiceVisitItem.objects.create(service_visit=visit, service=service, status="PENDING")
+
+    def test_save_rejects_invalid_values(self):
+        url = f"/api/reporting/workitems/{self.item.id}/save/"
+        response = self.client.post(url, {"values_json": {"liver_size_cm": "big"}}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["error"], "INVALID_VALUES")
+        self.assertEqual(response.data["errors"][0]["field"], "liver_size_cm")
+        self.assertFalse(ReportInstanceV2.objects.filter(work_item=self.item).exists())
+
+        response = self.client.post(url, {"values_json": {"liver_size_cm": 12}}, format="json")
+        self.assertEqual(response.status_code, 200)
+
+    def test_submit_rejects_stored_invalid_values(self):
+        ReportInstanceV2.objects.create(
+            work_item=self.item, template_v2=self.template, values_json={"liver_echo": "Bright"}, created_by=self.user
+        )
+        response = self.client.post(f"/api/reporting/workitems/{self.item.id}/submit/")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["errors"][0]["code"], "enum")
+        self.assertEqual(ReportInstanceV2.objects.get(work_item=self.item).status, "draft")
+
+    def test_bulk_scan_command(self):
+        ReportInstanceV2.objects.create(
+            work_item=self.item, template_v2=self.template, values_json={"liver_size_cm": 2}, created_by=self.user
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            output = Path(tmp) / "invalid.json"
+            out = StringIO()
+            call_command("validate_report_values", template=["USG_VAL_V2"], output=str(output), stdout=out)
+            report = json.loads(output.read_text())
+            self.assertEqual(report["scanned"], 1)
+            self.assertEqual(report["invalid"][0]["errors"][0]["code"], "minimum")
+            self.assertIn("1 invalid", out.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command("validate_report_values", fail_on_invalid=True, stdout=StringIO())
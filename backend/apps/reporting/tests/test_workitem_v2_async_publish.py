@@ -0,0 +1,191 @@
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.catalog.models import Modality, Service
+from apps.patients.models import Patient
+from apps.reporting.models import (
+    ReportActionLogV2,
+    ReportInstanceV2,
+    ReportPublishJobV2,
+    ReportPublishSnapshotV2,
+    ReportTemplateV2,
+    ServiceReportTemplateV2,
+)
+from apps.reporting.services import publish as publish_service
+from apps.reporting.services.publish import (
+    PublishJobExpired,
+    active_publish_job,
+    prerender_publish_pdf,
+    run_publish_job,
+)
+from apps.workflow.models import ServiceVisit, ServiceVisitItem
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class WorkItemV2AsyncPublishTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_superuser(username="async_admin", password="pw", email="a@example.com")
+        self.client.force_authenticate(user=self.user)
+        modality = Modality.objects.create(code="USG", name="Ultrasound")
+        service = Service.objects.create(code="USG_ASYNC", name="USG Async", modality=modality, price=100)
+        template = ReportTemplateV2.objects.create(
+            code="USG_ASYNC_V2",
+            name="Async",
+            modality="USG",
+            status="active",
+            json_schema={"type": "object", "properties": {"impression": {"type": "string"}}},
+            narrative_rules={"sections": [{"title": "Findings", "content": ["{{impression}}"]}]},
+        )
+        ServiceReportTemplateV2.objects.create(service=service, template=template, is_active=True, is_default=True)
+        patient = Patient.objects.create(name="Async Patient", age=40, gender="F")
+        visit = ServiceVisit.objects.create(patient=patient, created_by=self.user)
+        self.item = ServiceVisitItem.objects.create(service_visit=visit, service=service, status="PENDING")
+        self.instance = ReportInstanceV2.objects.create(
+            work_item=self.item,
+            template_v2=template,
+            values_json={"impression": "Normal study."},
+            created_by=self.user,
+            status="verified",
+        )
+        self.url = f"/api/reporting/workitems/{self.item.id}/"
+
+    def _publish_async(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self.client.post(f"{self.url}publish/?async=1")
+        return response, callbacks
+
+    def test_async_publish_reserves_version_and_completes_in_background(self):
+        response, callbacks = self._publish_async()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["status"], "queued")
+        self.assertEqual(response.data["version"], 1)
+        self.assertIn(f"job_id={response.data['job_id']}", response.data["status_url"])
+        self.assertEqual(len(callbacks), 1)
+
+        # Nothing is published until the job has written the snapshot.
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.status, "PENDING")
+        self.assertFalse(ReportPublishSnapshotV2.objects.exists())
+        self.assertEqual(self.client.post(f"{self.url}publish/").status_code, 409)
+
+        job = run_publish_job(response.data["job_id"])
+        self.assertEqual(job.status, ReportPublishJobV2.STATUS_SUCCEEDED)
+
+        status_response = self.client.get(f"{self.url}publish-status/", {"job_id": response.data["job_id"]})
+        self.assertEqual(status_response.status_code, 200)
+        self.assertEqual(status_response.data["status"], "succeeded")
+        self.assertEqual(status_response.data["item_status"], "PUBLISHED")
+        snapshot = ReportPublishSnapshotV2.objects.get(report_instance_v2=self.instance)
+        self.assertEqual(snapshot.version, 1)
+        self.assertEqual(status_response.data["snapshot_id"], str(snapshot.id))
+        self.assertTrue(ReportActionLogV2.objects.filter(report_v2=self.instance, action="publish").exists())
+
+        # Next publish gets the next version.
+        response, _ = self._publish_async()
+        self.assertEqual(response.data["version"], 2)
+
+    def test_failed_job_does_not_publish_and_releases_version(self):
+        response, _ = self._publish_async()
+        self.instance.status = "draft"
+        self.instance.save(update_fields=["status"])
+
+        with self.assertRaises(ValueError):
+            run_publish_job(response.data["job_id"])
+        job = ReportPublishJobV2.objects.get(id=response.data["job_id"])
+        self.assertEqual(job.status, ReportPublishJobV2.STATUS_FAILED)
+        self.assertIn("verified", job.error_message)
+        self.item.refresh_from_db()
+        self.assertNotEqual(self.item.status, "PUBLISHED")
+
+        self.instance.status = "verified"
+        self.instance.save(update_fields=["status"])
+        response, _ = self._publish_async()
+        self.assertEqual(response.data["version"], 1)
+
+    @override_settings(REPORT_PUBLISH_JOB_TIMEOUT=60)
+    def test_job_expired_mid_run_does_not_publish(self):
+        response, _ = self._publish_async()
+        job_id = response.data["job_id"]
+        render = publish_service.render_publish_pdf
+
+        def render_then_expire(instance, narrative_json):
+            # The worker stalls past the timeout; a new publish request expires the job.
+            ReportPublishJobV2.objects.filter(id=job_id).update(started_at=timezone.now() - timedelta(seconds=120))
+            self.assertIsNone(active_publish_job(instance))
+            return render(instance, narrative_json)
+
+        with mock.patch.object(publish_service, "render_publish_pdf", side_effect=render_then_expire):
+            with self.assertRaises(PublishJobExpired):
+                run_publish_job(job_id)
+
+        job = ReportPublishJobV2.objects.get(id=job_id)
+        self.assertEqual(job.status, ReportPublishJobV2.STATUS_FAILED)
+        self.assertEqual(job.error_message, publish_service.STALE_JOB_MESSAGE)
+        self.assertIsNone(job.snapshot_id)
+        self.assertFalse(ReportPublishSnapshotV2.objects.exists())
+        self.item.refresh_from_db()
+        self.assertNotEqual(self.item.status, "PUBLISHED")
+
+    @override_settings(REPORT_PUBLISH_JOB_TIMEOUT=60)
+    def test_long_queued_job_that_started_recently_stays_active(self):
+        response, _ = self._publish_async()
+        ReportPublishJobV2.objects.filter(id=response.data["job_id"]).update(
+            created_at=timezone.now() - timedelta(seconds=120),
+            status=ReportPublishJobV2.STATUS_RUNNING,
+            started_at=timezone.now(),
+        )
+        active = active_publish_job(self.instance)
+        self.assertIsNotNone(active)
+        self.assertEqual(str(active.id), response.data["job_id"])
+
+    def test_status_without_jobs(self):
+        self.assertEqual(self.client.get(f"{self.url}publish-status/").status_code, 404)
+        self.assertEqual(self.client.get(f"{self.url}publish-status/", {"job_id": "nope"}).status_code, 400)
+
+    @override_settings(REPORT_PREVIEW_CACHE_DIR=f"{TEMP_MEDIA_ROOT}/previews", REPORT_PUBLISH_PRERENDER=True)
+    def test_verify_prerender_is_reused_by_publish(self):
+        self.instance.status = "submitted"
+        self.instance.save(update_fields=["status"])
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.assertEqual(self.client.post(f"{self.url}verify/").status_code, 200)
+        self.assertEqual(len(callbacks), 1)
+
+        # The callback submits this to the publish pool; run it inline here.
+        self.assertTrue(prerender_publish_pdf(self.instance.id))
+
+        with mock.patch.object(publish_service, "render_pdf", wraps=publish_service.render_pdf) as render:
+            first = self.client.post(f"{self.url}publish/")
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(render.call_count, 0)
+
+        # A demographic correction after verify changes the PDF: render inline.
+        patient = self.item.service_visit.patient
+        patient.name = "Corrected Patient"
+        patient.save()
+        with mock.patch.object(publish_service, "render_pdf", wraps=publish_service.render_pdf) as render:
+            second = self.client.post(f"{self.url}publish/")
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(render.call_count, 1)
+        first_pdf, second_pdf = ReportPublishSnapshotV2.objects.filter(report_instance_v2=self.instance).order_by("version")
+        self.assertNotEqual(first_pdf.pdf_sha256, second_pdf.pdf_sha256)
+
+    def test_prerender_skips_unverified_reports(self):
+        self.instance.status = "draft"
+        self.instance.save(update_fields=["status"])
+        self.assertFalse(prerender_publish_pdf(self.instance.id))
@@ -0,0 +1,91 @@
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.catalog.models import Modality, Service
+from apps.patients.models import Patient
+from apps.reporting.models import ReportInstanceV2, ReportTemplateV2, ServiceReportTemplateV2
+from apps.reporting.services.narrative_v2 import generate_narrative_v2
+from apps.workflow.models import ServiceVisit, ServiceVisitItem
+
+User = get_user_model()
+URL = "/api/reporting/workitems/generate-narratives/"
+
+
+class WorkItemV2BatchNarrativeTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_superuser(username="batch_admin", password="pw", email="batch@example.com")
+        self.client.force_authenticate(user=self.user)
+
+        modality = Modality.objects.create(code="XR", name="X-Ray")
+        self.service = Service.objects.create(modality=modality, name="Chest X-Ray", code="XR-BATCH", price=500)
+        self.unmapped_service = Service.objects.create(modality=modality, name="Hand X-Ray", code="XR-HAND", price=300)
+        patient = Patient.objects.create(name="Batch Patient", age=50, gender="Male")
+        self.visit = ServiceVisit.objects.create(patient=patient, created_by=self.user)
+        self.template = ReportTemplateV2.objects.create(
+            code="CXR_BATCH",
+            name="CXR Batch",
+            modality="XR",
+            status="active",
+            narrative_rules={
+                "sections": [{"title": "Findings", "content": ["Lungs: {{lung_fields}}"]}],
+                "impression_rules": [{"when": {"field": "impr", "is_not_empty": True}, "text": "{{impr}}"}],
+            },
+        )
+        ServiceReportTemplateV2.objects.create(
+            service=self.service, template=self.template, is_active=True, is_default=True
+        )
+
+    def _items(self, count, service=None):
+        return [
+            ServiceVisitItem.objects.create(
+                service_visit=self.visit, service=service or self.service, status="REGISTERED"
+            )
+            for _ in range(count)
+        ]
+
+    def _post(self, items):
+        return self.client.post(URL, {"item_ids": [str(item.id) for item in items]}, format="json")
+
+    def test_generates_and_persists_in_request_order(self):
+        items = self._items(2)
+        ReportInstanceV2.objects.create(
+            work_item=items[1], template_v2=self.template, values_json={"lung_fields": "clear", "impr": "Normal."}
+        )
+        missing_id = str(uuid.uuid4())
+        unmapped = self._items(1, service=self.unmapped_service)[0]
+
+        response = self.client.post(
+            URL, {"item_ids": [str(items[1].id), missing_id, str(unmapped.id), str(items[0].id)]}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        results = response.data["results"]
+        self.assertEqual([r["item_id"] for r in results], [str(items[1].id), missing_id, str(unmapped.id), str(items[0].id)])
+        self.assertEqual(results[1]["error"], "NOT_FOUND")
+        self.assertEqual(results[2]["error"], "NO_ACTIVE_V2_TEMPLATE")
+
+        expected = generate_narrative_v2(self.template, {"lung_fields": "clear", "impr": "Normal."})
+        self.assertEqual(results[0]["narrative_json"], expected)
+        self.assertEqual(ReportInstanceV2.objects.get(work_item=items[1]).narrative_json, expected)
+
+        created = ReportInstanceV2.objects.get(work_item=items[0])
+        self.assertEqual(created.created_by, self.user)
+        self.assertEqual(created.status, "draft")
+        self.assertEqual(created.narrative_json, results[3]["narrative_json"])
+
+    def test_query_count_does_not_grow_with_items(self):
+        few, many = self._items(2), self._items(8)
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self._post(few).status_code, 200)
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(self._post(many).status_code, 200)
+        self.assertEqual(len(large), len(small))
+
+    def test_rejects_invalid_payloads(self):
+        self.assertEqual(self.client.post(URL, {"item_ids": []}, format="json").status_code, 400)
+        self.assertEqual(self.client.post(URL, {"item_ids": "abc"}, format="json").status_code, 400)
@@ -1,3 +1,6 @@
+import shutil
+import tempfile
+
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
 from django.test import TestCase, override_settings
@@ -8,9 +11,16 @@ from apps.patients.models import Patient
 from apps.reporting.models import ReportTemplateV2, ServiceReportTemplateV2, ReportInstanceV2
 from apps.workflow.models import ServiceVisit, ServiceVisitItem
 
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
 
-@override_settings(ALLOWED_HOSTS=["testserver", "localhost"], MEDIA_ROOT="/tmp/radreport-test-media")
+@override_settings(ALLOWED_HOSTS=["testserver", "localhost"], MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class WorkItemV2MinimalFlowTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
     def setUp(self):
         user_model = get_user_model()
         self.user = user_model.objects.create_user(username="reporter", password="password")
@@ -2,7 +2,10 @@
 Tests for V2 PDF generation and publish snapshot functionality.
 """
 import json
-from django.test import TestCase
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from apps.catalog.models import Service, Modality
@@ -16,11 +19,18 @@ from apps.reporting.models import (
 )
 
 User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
 
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class WorkItemV2PublishPDFTestCase(TestCase):
     """Test V2 PDF generation and publish snapshot endpoints"""
 
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
     def setUp(self):
         """Set up test data"""
         self.client = APIClient()
@@ -304,7 +314,7 @@ class WorkItemV2PublishPDFTestCase(TestCase):
         
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response["Content-Type"], "application/pdf")
-        self.assertGreater(len(response.content), 0)
+        self.assertGreater(len(b"".join(response.streaming_content)), 0)
         
         # Get specific version
         response2 = self.client.get(
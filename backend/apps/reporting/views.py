@@ -1,16 +1,20 @@
-import hashlib
 import json
 import logging
-from django.core.files.base import ContentFile
+import uuid
+from django.conf import settings
 from django.db import transaction
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from rest_framework import exceptions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 
+from apps.printing.pdf_delivery import serve_pdf_field
+from apps.printing.render_pool import RenderPoolBusy, render_pdf
 from apps.workflow.models import ServiceVisitItem
 from apps.workflow.permissions import (
     IsTechnologist, IsRadiologist, IsAnyDesk, IsManager
@@ -19,9 +23,9 @@ from .models import (
     ReportActionLogV2,
     ReportBlockLibrary,
     ReportInstanceV2,
+    ReportPublishJobV2,
     ReportPublishSnapshotV2,
     ReportTemplateV2,
-    ReportingOrganizationConfig,
     ServiceReportTemplateV2,
 )
 from .serializers import (
@@ -30,11 +34,31 @@ from .serializers import (
     ReportTemplateV2Serializer,
     ServiceReportTemplateV2Serializer,
 )
-from .services.narrative_v2 import generate_narrative_v2
-from .pdf_engine.report_pdf_v2 import generate_report_pdf_v2
+from .services.narrative_cache import narrative_cache_stats
+from .services.preview_cache import get_cached_preview, preview_cache_key, preview_cache_stats, store_preview
+from .services.render_context import build_report_render_context, load_render_instance
+from .services.snapshot_store import verify_snapshot_pdf
+from .services.values_validation import validate_values_json
+from .services.publish import (
+    PublishInProgress,
+    active_publish_job,
+    perform_publish_v2,
+    render_publish_pdf,
+    reserve_publish_job,
+    schedule_publish_prerender,
+)
+from .services.template_impact import ImpactSummary, iter_template_impact, simulate_template_impact
+from .services.narrative_v2 import (
+    generate_narrative_v2,
+    generate_narrative_v2_cached,
+    generate_narrative_v2_for_instance,
+)
+from .pdf_engine.report_pdf_v2 import render_report_pdf_v2
 
 logger = logging.getLogger(__name__)
 
+BATCH_NARRATIVE_MAX_ITEMS = 200
+
 
 class ReportTemplateV2ViewSet(viewsets.ModelViewSet):
     queryset = ReportTemplateV2.objects.all()
@@ -70,6 +94,80 @@ class ReportTemplateV2ViewSet(viewsets.ModelViewSet):
         instance.save(update_fields=["status", "updated_at"])
         return Response({"status": "active"})
 
+    @action(detail=True, methods=["post"], url_path="simulate-impact")
+    def simulate_impact(self, request, pk=None):
+        """
+        Re-render existing reports under old and new rules before activating.
+
+        With "narrative_rules" in the body, this template's own reports are compared
+        against the proposed rules. Otherwise this template is the candidate and the
+        baseline is "baseline_id" or the active template with the same code.
+        ?stream=1 returns NDJSON: one line per changed/failed document, then the summary.
+        The JSON response covers at most settings.TEMPLATE_IMPACT_SYNC_LIMIT documents
+        (the default "limit"); larger runs stream or use the simulate_template_impact
+        command. Requests compare in-process; process pools are left to the command.
+        """
+        instance = self.get_object()
+        if "narrative_rules" in request.data:
+            baseline, new_rules = instance, request.data.get("narrative_rules")
+            if not isinstance(new_rules, dict):
+                return Response({"error": "narrative_rules must be an object."}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            baseline_id = request.data.get("baseline_id")
+            if baseline_id:
+                baseline = get_object_or_404(ReportTemplateV2, pk=baseline_id)
+            else:
+                baseline = (
+                    ReportTemplateV2.objects.filter(code=instance.code, status="active")
+                    .exclude(id=instance.id)
+                    .order_by("-updated_at")
+                    .first()
+                )
+                if baseline is None:
+                    return Response(
+                        {"error": "No active template with the same code to compare against."},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+            new_rules = instance.narrative_rules or {}
+
+        try:
+            limit = int(request.data["limit"]) if request.data.get("limit") else None
+        except (TypeError, ValueError):
+            return Response({"error": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        streaming = request.query_params.get("stream") in {"1", "true", "True"}
+        if not streaming:
+            sync_limit = settings.TEMPLATE_IMPACT_SYNC_LIMIT
+            if limit is None:
+                limit = sync_limit
+            elif limit > sync_limit:
+                return Response(
+                    {"error": f"limit must be at most {sync_limit}; use ?stream=1 for larger runs."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        options = {
+            "include_snapshots": request.data.get("include_snapshots", True) is not False,
+            "limit": limit,
+            "workers": 1,
+        }
+
+        if not streaming:
+            summary = simulate_template_impact(baseline, new_rules, **options)
+            return Response(
+                {"template_id": str(baseline.id), "candidate_id": str(instance.id), "limit": limit, **summary}
+            )
+
+        def stream():
+            summary = ImpactSummary()
+            for result in iter_template_impact(baseline, new_rules, **options):
+                summary.add(result)
+                if result["changed"] is not False:
+                    yield json.dumps({"type": "document", **result}) + "\n"
+            yield json.dumps(
+                {"type": "summary", "template_id": str(baseline.id), "candidate_id": str(instance.id), **summary.as_dict()}
+            ) + "\n"
+
+        return StreamingHttpResponse(stream(), content_type="application/x-ndjson")
+
 
     @action(detail=True, methods=["post"], url_path="preview-narrative")
     def preview_narrative(self, request, pk=None):
@@ -79,7 +177,14 @@ class ReportTemplateV2ViewSet(viewsets.ModelViewSet):
             request.query_params.get("debug") in {"1", "true", "True"}
             and (request.user.is_superuser or request.user.is_staff)
         )
-        narrative_json = generate_narrative_v2(instance, values_json, include_composer_debug=include_debug)
+        if include_debug:
+            # Traced runs carry timings, so they bypass the narrative cache.
+            narrative_json = generate_narrative_v2(
+                instance, values_json, include_composer_debug=True, include_trace=True
+            )
+            trace = narrative_json.pop("trace", {})
+        else:
+            narrative_json = generate_narrative_v2_cached(instance, values_json)
         payload = {
             "narrative_json": narrative_json,
             "narrative_by_organ": narrative_json.get("narrative_by_organ", []),
@@ -87,8 +192,17 @@ class ReportTemplateV2ViewSet(viewsets.ModelViewSet):
         }
         if include_debug:
             payload["composer_debug"] = narrative_json.get("composer_debug", {})
+            payload["trace"] = trace
         return Response(payload)
 
+    @action(detail=False, methods=["get"], url_path="narrative-cache-stats")
+    def narrative_cache_stats(self, request):
+        return Response(narrative_cache_stats())
+
+    @action(detail=False, methods=["get"], url_path="preview-cache-stats")
+    def preview_cache_stats(self, request):
+        return Response(preview_cache_stats())
+
 
 class ServiceReportTemplateV2ViewSet(viewsets.ModelViewSet):
     queryset = ServiceReportTemplateV2.objects.all()
@@ -166,168 +280,33 @@ class ReportWorkItemViewSet(viewsets.ViewSet):
             instance.save(update_fields=["created_by"])
         return instance
 
-    def _listify(self, value):
-        if value is None:
-            return []
-        if isinstance(value, list):
-            return [str(v).strip() for v in value if str(v).strip()]
-        text = str(value).strip()
-        return [text] if text else []
-
-    def _extract_measurements(self, values_json):
-        measurements = []
-        for key, value in values_json.items():
-            if isinstance(value, (int, float)):
-                measurements.append({"label": key.replace("_", " ").title(), "value": str(value)})
-            elif isinstance(value, str):
-                low_key = key.lower()
-                if "measurement" in low_key or "size" in low_key or "diameter" in low_key:
-                    text = value.strip()
-                    if text:
-                        measurements.append({"label": key.replace("_", " ").title(), "value": text})
-        return measurements[:12]
-
-    def _build_print_payload(self, request, item, instance, narrative_json):
-        visit = item.service_visit
-        patient = visit.patient
-        template = instance.template_v2
-
-        config = ReportingOrganizationConfig.objects.first()
-        center_lines = []
-        right_lines = []
-        logo_url = ""
-        disclaimer = "This report is based on imaging findings at the time of examination. Clinical correlation is advised."
-
-        if config:
-            if config.org_name:
-                center_lines.append(config.org_name.strip())
-            if config.address:
-                center_lines.append(str(config.address).strip())
-            if config.phone:
-                center_lines.append(str(config.phone).strip())
-            if config.logo:
-                try:
-                    logo_url = request.build_absolute_uri(config.logo.url)
-                except Exception:
-                    logo_url = ""
-            if config.disclaimer_text:
-                disclaimer = config.disclaimer_text
-
-        signatories = []
-        if item.consultant:
-            signatories.append(
-                {
-                    "verification_label": "Electronically Verified",
-                    "name": item.consultant.display_name,
-                    "credentials": item.consultant.degrees,
-                    "registration": "",
-                }
-            )
-            right_lines = [line for line in [item.consultant.display_name, item.consultant.degrees, item.consultant.designation, item.consultant.mobile_number] if line]
-        elif instance.created_by:
-            name = instance.created_by.get_full_name() or instance.created_by.username
-            signatories.append(
-                {
-                    "verification_label": "Electronically Verified",
-                    "name": name,
-                    "credentials": "",
-                    "registration": "",
-                }
-            )
-            right_lines = [name]
-
-        if config and isinstance(config.signatories_json, list):
-            for entry in config.signatories_json:
-                if not isinstance(entry, dict):
-                    continue
-                name = str(entry.get("name", "")).strip()
-                designation = str(entry.get("designation", "")).strip()
-                if name or designation:
-                    signatories.append(
-                        {
-                            "verification_label": "Electronically Verified",
-                            "name": name,
-                            "credentials": designation,
-                            "registration": str(entry.get("registration", "")).strip(),
-                        }
-                    )
-
-        inferred_indication = ""
-        for key, value in instance.values_json.items():
-            key_l = key.lower()
-            if "indication" in key_l or "clinical" in key_l or "history" in key_l:
-                text = str(value).strip()
-                if text:
-                    inferred_indication = text
-                    break
-
-        findings_blocks = []
-        if isinstance(narrative_json, dict) and isinstance(narrative_json.get("narrative_by_organ"), list):
-            for entry in narrative_json.get("narrative_by_organ", []):
-                if not isinstance(entry, dict):
-                    continue
-                paragraph = str(entry.get("paragraph", "")).strip()
-                if not paragraph:
-                    continue
-                findings_blocks.append(
-                    {
-                        "heading": str(entry.get("label", "")).strip(),
-                        "paragraphs": [paragraph],
-                    }
-                )
-        if not findings_blocks:
-            for section in narrative_json.get("sections", []) if isinstance(narrative_json, dict) else []:
-                if not isinstance(section, dict):
-                    continue
-                lines = self._listify(section.get("lines"))
-                if lines:
-                    findings_blocks.append(
-                        {
-                            "heading": str(section.get("title", "")).strip(),
-                            "lines": lines,
-                        }
-                    )
+    def _invalid_values_response(self, errors):
+        return Response(
+            {
+                "error": "INVALID_VALUES",
+                "detail": "values_json does not match the template schema.",
+                "errors": errors,
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
 
-        if not findings_blocks:
-            value_lines = []
-            for key, value in instance.values_json.items():
-                text = str(value).strip()
-                if not text:
-                    continue
-                value_lines.append(f"{key.replace('_', ' ').title()}: {text}")
-            if value_lines:
-                findings_blocks.append({"heading": "", "lines": value_lines})
+    def _render_busy_response(self):
+        response = Response(
+            {"error": "RENDER_BUSY", "detail": "PDF rendering is busy; try again shortly."},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+        response["Retry-After"] = "5"
+        return response
 
-        payload = {
-            "header": {
-                "logo_url": logo_url,
-                "center_lines": center_lines,
-                "right_lines": right_lines,
-            },
-            "patient": {
-                "name": patient.name,
-                "age": str(patient.age or ""),
-                "sex": patient.gender or "",
-                "mrn": patient.patient_reg_no or patient.mrn,
-                "mobile": patient.phone or "",
-                "ref_no": visit.visit_id,
-                "referred_by": visit.referring_consultant or patient.referrer or "",
-                "study_datetime": item.created_at.strftime("%Y-%m-%d %H:%M"),
-                "report_datetime": instance.updated_at.strftime("%Y-%m-%d %H:%M"),
-                "clinical_indication": inferred_indication,
-            },
-            "report_title": (template.name or item.service.name or "Radiology Report").upper(),
-            "sections": {
-                "technique": self._listify(narrative_json.get("technique")) if isinstance(narrative_json, dict) else [],
-                "comparison": self._listify(narrative_json.get("comparison")) if isinstance(narrative_json, dict) else [],
-                "findings": findings_blocks,
-                "measurements": self._extract_measurements(instance.values_json),
-                "impression": self._listify(narrative_json.get("impression")) if isinstance(narrative_json, dict) else [],
-                "recommendations": self._listify(narrative_json.get("recommendations")) if isinstance(narrative_json, dict) else [],
-            },
-            "signatories": signatories,
-            "footer": {"disclaimer": disclaimer},
-        }
+    def _build_print_payload(self, request, instance, narrative_json):
+        payload = build_report_render_context(instance, narrative_json)
+        header = payload["header"]
+        logo_url = header.pop("logo_url", "")
+        header.pop("logo_path", None)
+        try:
+            header["logo_url"] = request.build_absolute_uri(logo_url) if logo_url else ""
+        except Exception:
+            header["logo_url"] = ""
         return payload
 
     @action(detail=True, methods=["get"])
@@ -377,6 +356,9 @@ class ReportWorkItemViewSet(viewsets.ViewSet):
         values_json = request.data.get("values_json")
         if not isinstance(values_json, dict):
             raise exceptions.ValidationError("values_json must be an object.")
+        errors = validate_values_json(template_v2, values_json)
+        if errors:
+            return self._invalid_values_response(errors)
 
         instance = self._get_or_create_instance(item, template_v2, request.user)
         if instance.status in ["submitted", "verified"]:
@@ -412,6 +394,9 @@ class ReportWorkItemViewSet(viewsets.ViewSet):
         instance = self._get_or_create_instance(item, template_v2, request.user)
         if instance.status != "draft":
             return Response({"error": "Only draft reports can be submitted."}, status=409)
+        errors = validate_values_json(template_v2, instance.values_json)
+        if errors:
+            return self._invalid_values_response(errors)
 
         with transaction.atomic():
             instance.status = "submitted"
@@ -435,7 +420,9 @@ class ReportWorkItemViewSet(viewsets.ViewSet):
             request.query_params.get("debug") in {"1", "true", "True"}
             and (request.user.is_superuser or request.user.is_staff)
         )
-        narrative_json = generate_narrative_v2(template_v2, instance.values_json, include_composer_debug=include_debug)
+        narrative_json = generate_narrative_v2_for_instance(
+            template_v2, instance.id, instance.values_json, include_composer_debug=include_debug
+        )
         instance.narrative_json = narrative_json
         instance.save(update_fields=["narrative_json", "updated_at"])
         payload = {
@@ -449,6 +436,108 @@ class ReportWorkItemViewSet(viewsets.ViewSet):
             payload["composer_debug"] = narrative_json.get("composer_debug", {})
         return Response(payload)
 
+    @action(detail=False, methods=["post"], url_path="generate-narratives")
+    def generate_narratives(self, request):
+        """
+        Batch generate-narrative for {"item_ids": [...]}.
+
+        Items, template mappings and instances are loaded with one query each, missing
+        instances are bulk-created and narratives saved with one bulk_update, so the
+        query count does not grow with the number of items. Results keep request order;
+        items that cannot be reported carry an "error" instead of a narrative.
+        """
+        item_ids = request.data.get("item_ids")
+        if not isinstance(item_ids, list) or not item_ids:
+            return Response({"error": "item_ids must be a non-empty list."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(item_ids) > BATCH_NARRATIVE_MAX_ITEMS:
+            return Response(
+                {"error": f"At most {BATCH_NARRATIVE_MAX_ITEMS} items per batch."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        valid_ids = []
+        for raw_id in item_ids:
+            try:
+                valid_ids.append(uuid.UUID(str(raw_id)))
+            except ValueError:
+                continue
+
+        items = {
+            item.id: item
+            for item in ServiceVisitItem.objects.select_related("service").filter(pk__in=valid_ids)
+        }
+        # Same choice as _get_v2_template: first matching mapping by pk for each service.
+        templates = {}
+        mappings = (
+            ServiceReportTemplateV2.objects.select_related("template")
+            .filter(
+                service_id__in={item.service_id for item in items.values()},
+                is_active=True,
+                is_default=True,
+                template__status="active",
+            )
+            .order_by("pk")
+        )
+        for mapping in mappings:
+            templates.setdefault(mapping.service_id, mapping.template)
+        instances = {
+            instance.work_item_id: instance
+            for instance in ReportInstanceV2.objects.filter(work_item_id__in=list(items))
+        }
+
+        new_instances = []
+        for item in items.values():
+            template_v2 = templates.get(item.service_id)
+            if template_v2 is not None and item.id not in instances:
+                instance = ReportInstanceV2(
+                    work_item=item, template_v2=template_v2, created_by=request.user, status="draft"
+                )
+                instances[item.id] = instance
+                new_instances.append(instance)
+        if new_instances:
+            ReportInstanceV2.objects.bulk_create(new_instances)
+
+        now = timezone.now()
+        results, changed = [], {}
+        for raw_id in item_ids:
+            try:
+                item = items.get(uuid.UUID(str(raw_id)))
+            except ValueError:
+                item = None
+            if item is None:
+                results.append({"item_id": str(raw_id), "error": "NOT_FOUND"})
+                continue
+            template_v2 = templates.get(item.service_id)
+            if template_v2 is None:
+                results.append({
+                    "item_id": str(item.id),
+                    "error": "NO_ACTIVE_V2_TEMPLATE",
+                    "service_code": item.service.code,
+                })
+                continue
+
+            instance = instances[item.id]
+            instance.template_v2 = template_v2
+            if instance.created_by_id is None:
+                instance.created_by = request.user
+            narrative_json = generate_narrative_v2_for_instance(template_v2, instance.id, instance.values_json)
+            instance.narrative_json = narrative_json
+            instance.updated_at = now
+            changed[instance.id] = instance
+            results.append({
+                "item_id": str(item.id),
+                "status": instance.status,
+                "narrative_json": narrative_json,
+                "narrative_by_organ": narrative_json.get("narrative_by_organ", []),
+                "narrative_text": narrative_json.get("narrative_text", ""),
+            })
+
+        if changed:
+            ReportInstanceV2.objects.bulk_update(
+                list(changed.values()), ["template_v2", "created_by", "narrative_json", "updated_at"]
+            )
+        return Response({"schema_version": "v2", "results": results})
+
     @action(detail=True, methods=["get"], url_path="narrative")
     def narrative(self, request, pk=None):
         item = self._get_item(pk)
@@ -458,8 +547,13 @@ class ReportWorkItemViewSet(viewsets.ViewSet):
             request.query_params.get("debug") in {"1", "true", "True"}
             and (request.user.is_superuser or request.user.is_staff)
         )
+        trace = None
         if include_debug:
-            narrative_json = generate_narrative_v2(template_v2, instance.values_json, include_composer_debug=True)
+            # Traced runs carry timings, so they bypass the narrative cache.
+            narrative_json = generate_narrative_v2(
+                template_v2, instance.values_json, include_composer_debug=True, include_trace=True
+            )
+            trace = narrative_json.pop("trace", {})
         else:
             narrative_json = instance.narrative_json or {}
         payload = {
@@ -471,6 +565,7 @@ class ReportWorkItemViewSet(viewsets.ViewSet):
         }
         if include_debug:
             payload["composer_debug"] = narrative_json.get("composer_debug", {})
+            payload["trace"] = trace
         return Response(payload)
 
     @action(detail=True, methods=["get"], url_path="report-pdf")
@@ -478,11 +573,36 @@ class ReportWorkItemViewSet(viewsets.ViewSet):
         item = self._get_item(pk)
         template_v2 = self._get_v2_template(item)
         instance = self._get_or_create_instance(item, template_v2, request.user)
-        narrative_json = generate_narrative_v2(template_v2, instance.values_json)
-        pdf_bytes = generate_report_pdf_v2(str(instance.id), narrative_json)
+
+        # Previews are cached on disk keyed by the full render context; the ETag
+        # is that cache key, so an unchanged report revalidates with a 304.
+        # Patient and visit rows carry no modification time, so Last-Modified
+        # is informational only and never answers a conditional request.
+        narrative_json = generate_narrative_v2_cached(template_v2, instance.values_json)
+        render_data = build_report_render_context(load_render_instance(instance.pk), narrative_json)
+        key = preview_cache_key(render_data)
+        etag = f'"{key}"'
+        last_modified = max(instance.updated_at, template_v2.updated_at).timestamp()
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        cached_path = get_cached_preview(instance.id, key)
+        if cached_path is not None:
+            response = FileResponse(open(cached_path, "rb"), content_type="application/pdf")
+        else:
+            try:
+                pdf_bytes = render_pdf(render_report_pdf_v2, render_data, label="report_v2")
+            except RenderPoolBusy:
+                return self._render_busy_response()
+            store_preview(instance.id, key, pdf_bytes)
+            response = HttpResponse(pdf_bytes, content_type="application/pdf")
+
         filename = f"Report_{item.service_visit.visit_id}.pdf"
-        response = HttpResponse(pdf_bytes, content_type="application/pdf")
         response["Content-Disposition"] = f'inline; filename="{filename}"'
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        response["Cache-Control"] = "private, no-cache"
         return response
 
     @action(detail=True, methods=["get"], url_path="print-payload")
@@ -490,8 +610,8 @@ class ReportWorkItemViewSet(viewsets.ViewSet):
         item = self._get_item(pk)
         template_v2 = self._get_v2_template(item)
         instance = self._get_or_create_instance(item, template_v2, request.user)
-        narrative_json = instance.narrative_json or generate_narrative_v2(template_v2, instance.values_json)
-        payload = self._build_print_payload(request, item, instance, narrative_json)
+        narrative_json = instance.narrative_json or generate_narrative_v2_cached(template_v2, instance.values_json)
+        payload = self._build_print_payload(request, load_render_instance(instance.pk), narrative_json)
         return Response(payload)
 
     @action(detail=True, methods=["post"], url_path="return-for-correction", permission_classes=[IsRadiologist])
@@ -566,6 +686,8 @@ class ReportWorkItemViewSet(viewsets.ViewSet):
                 
                 instance.status = "verified"
                 instance.save(update_fields=["status", "updated_at"])
+                # Values are frozen now: render the publish PDF ahead of publish.
+                schedule_publish_prerender(instance)
                 
                 ReportActionLogV2.objects.create(
                     report_v2=instance,
@@ -604,92 +726,28 @@ class ReportWorkItemViewSet(viewsets.ViewSet):
             
         return Response({"status": "verified"})
 
-    def _perform_publish_v2(self, instance_v2, user):
+    def _perform_publish_v2(self, instance_v2, user, narrative_json=None, pdf_bytes=None):
         """
         Create a ReportPublishSnapshotV2 for a verified report instance.
-        
-        This method:
-        1. Generates narrative from template and values
-        2. Calculates version number (increments from last snapshot)
-        3. Generates content hash for integrity verification
-        4. Generates PDF
-        5. Creates and saves ReportPublishSnapshotV2
-        6. Updates ServiceVisitItem status to PUBLISHED
-        
-        Returns:
-            tuple: (version_number, ReportPublishSnapshotV2 instance)
+        See services.publish.perform_publish_v2.
         """
-        template_v2 = instance_v2.template_v2
-        narrative_json = generate_narrative_v2(template_v2, instance_v2.values_json)
-        
-        # Get next version number
-        last_snapshot = instance_v2.publish_snapshots_v2.order_by("-version").first()
-        version = (last_snapshot.version + 1) if last_snapshot else 1
-
-        # Generate content hash for integrity verification
-        hash_input = json.dumps(
-            {
-                "template_id": str(template_v2.id),
-                "template_version": str(template_v2.updated_at),
-                "values_json": instance_v2.values_json,
-                "narrative_json": narrative_json,
-            },
-            sort_keys=True,
-        )
-        content_hash = hashlib.sha256(hash_input.encode("utf-8")).hexdigest()
-
-        # Generate PDF
-        pdf_bytes = generate_report_pdf_v2(str(instance_v2.id), narrative_json)
-        file_name = f"Report_V2_{instance_v2.work_item.service_visit.visit_id}_v{version}.pdf"
-
-        # Create ReportPublishSnapshotV2 - THIS IS THE KEY MODEL
-        snapshot = ReportPublishSnapshotV2(
-            report_instance_v2=instance_v2,
-            template_v2=template_v2,
-            values_json=instance_v2.values_json,
-            narrative_json=narrative_json,
-            content_hash=content_hash,
-            published_by=user,
-            version=version,
-        )
-        
-        # Save PDF file and snapshot
-        snapshot.pdf_file.save(file_name, ContentFile(pdf_bytes), save=False)
-        snapshot.save()
-        
-        # Verify snapshot was saved
-        if not snapshot.id:
-            raise ValueError("Failed to save publish snapshot - no ID assigned")
-        
-        logger.info(
-            "publish_snapshot_created",
-            extra={
-                "event": "publish_snapshot_created",
-                "snapshot_id": str(snapshot.id),
-                "instance_id": str(instance_v2.id),
-                "version": version,
-                "content_hash": content_hash,
-                "pdf_file": snapshot.pdf_file.name if snapshot.pdf_file else None,
-            },
-        )
-
-        # Update ServiceVisitItem status to PUBLISHED
-        item = instance_v2.work_item
-        item.status = "PUBLISHED"
-        item.published_at = timezone.now()
-        item.save(update_fields=["status", "published_at"])
-        
-        logger.info(
-            "publish_item_status_updated",
-            extra={
-                "event": "publish_item_status_updated",
-                "item_id": str(item.id),
-                "new_status": "PUBLISHED",
-                "published_at": item.published_at.isoformat(),
-            },
-        )
-
-        return version, snapshot
+        return perform_publish_v2(instance_v2, user, narrative_json=narrative_json, pdf_bytes=pdf_bytes)
+
+    def _publish_job_payload(self, request, job):
+        snapshot = job.snapshot
+        return {
+            "job_id": str(job.id),
+            "status": job.status,
+            "version": job.version,
+            "error": job.error_message or None,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+            "snapshot_id": str(snapshot.id) if snapshot else None,
+            "content_hash": snapshot.content_hash if snapshot else None,
+            "pdf_url": request.build_absolute_uri(snapshot.pdf_file.url) if snapshot and snapshot.pdf_file else None,
+            "item_status": job.report_instance_v2.work_item.status,
+        }
 
     @action(detail=True, methods=["post"], permission_classes=[IsRadiologist])
     def publish(self, request, pk=None):
@@ -702,6 +760,10 @@ class ReportWorkItemViewSet(viewsets.ViewSet):
         3. Creates a ReportPublishSnapshotV2 with PDF
         4. Updates ServiceVisitItem status to PUBLISHED
         5. Creates audit log entry
+        
+        With ?async=1 (or {"async": true}) steps 3-5 run in the background:
+        the version is reserved and 202 is returned with a job_id to poll via
+        publish-status.
         """
         item = self._get_item(pk)
 
@@ -725,6 +787,27 @@ class ReportWorkItemViewSet(viewsets.ViewSet):
                 status=403
             )
 
+        active_job = active_publish_job(instance)
+        if active_job is not None:
+            return self._publish_in_progress_response(active_job)
+
+        if self._wants_async_publish(request):
+            try:
+                job = reserve_publish_job(instance, request.user)
+            except PublishInProgress as exc:
+                return self._publish_in_progress_response(exc.job)
+            payload = self._publish_job_payload(request, job)
+            payload["status_url"] = f"{self.reverse_action('publish-status', args=[pk])}?job_id={job.id}"
+            return Response(payload, status=status.HTTP_202_ACCEPTED)
+
+        try:
+            # Render before opening the transaction: the PDF only depends on the
+            # verified instance, and layout time should not hold row locks.
+            narrative_json = generate_narrative_v2_cached(template_v2, instance.values_json)
+            pdf_bytes = render_publish_pdf(instance, narrative_json)
+        except RenderPoolBusy:
+            return self._render_busy_response()
+
         try:
             with transaction.atomic():
                 logger.info(
@@ -738,7 +821,9 @@ class ReportWorkItemViewSet(viewsets.ViewSet):
                 )
                 
                 # Create publish snapshot - this is the key step
-                version, snapshot = self._perform_publish_v2(instance, request.user)
+                version, snapshot = self._perform_publish_v2(
+                    instance, request.user, narrative_json=narrative_json, pdf_bytes=pdf_bytes
+                )
                 
                 # Verify snapshot was created
                 if not snapshot or not snapshot.id:
@@ -799,6 +884,41 @@ class ReportWorkItemViewSet(viewsets.ViewSet):
             }
         )
 
+    def _publish_in_progress_response(self, job):
+        return Response(
+            {
+                "error": "PUBLISH_IN_PROGRESS",
+                "detail": "A publish for this report is already in progress.",
+                "job_id": str(job.id),
+            },
+            status=status.HTTP_409_CONFLICT,
+        )
+
+    def _wants_async_publish(self, request):
+        flag = request.query_params.get("async")
+        if flag is None and isinstance(request.data, dict):
+            flag = request.data.get("async")
+        return str(flag).lower() in ("1", "true", "yes")
+
+    @action(detail=True, methods=["get"], url_path="publish-status")
+    def publish_status(self, request, pk=None):
+        """Status of a background publish job (?job_id=, default: the latest job)."""
+        item = self._get_item(pk)
+        jobs = ReportPublishJobV2.objects.select_related("snapshot", "report_instance_v2__work_item").filter(
+            report_instance_v2__work_item=item
+        )
+        job_id = request.query_params.get("job_id")
+        if job_id:
+            try:
+                job = jobs.filter(id=uuid.UUID(str(job_id))).first()
+            except ValueError:
+                return Response({"error": "INVALID_JOB_ID", "detail": "job_id must be a UUID."}, status=400)
+        else:
+            job = jobs.order_by("-created_at").first()
+        if job is None:
+            return Response({"error": "NOT_FOUND", "detail": "No publish job found."}, status=404)
+        return Response(self._publish_job_payload(request, job))
+
     @action(detail=True, methods=["get"], url_path="publish-history")
     def publish_history(self, request, pk=None):
         item = self._get_item(pk)
@@ -837,10 +957,16 @@ class ReportWorkItemViewSet(viewsets.ViewSet):
         if not snapshot.pdf_file:
             raise exceptions.NotFound("PDF file missing for this snapshot.")
 
-        response = HttpResponse(snapshot.pdf_file.read(), content_type="application/pdf")
-        filename = f"Report_V2_{item.service_visit.visit_id}_v{snapshot.version}.pdf"
-        response["Content-Disposition"] = f'inline; filename="{filename}"'
-        return response
+        try:
+            return serve_pdf_field(
+                request,
+                snapshot.pdf_file,
+                filename=f"Report_V2_{item.service_visit.visit_id}_v{snapshot.version}.pdf",
+                etag=f"{snapshot.content_hash}-v{snapshot.version}",
+                last_modified=snapshot.published_at.timestamp() if snapshot.published_at else None,
+            )
+        except FileNotFoundError:
+            raise exceptions.NotFound("PDF file missing for this snapshot.")
 
     @action(detail=True, methods=["get"], url_path="published-integrity")
     def published_integrity(self, request, pk=None):
@@ -857,6 +983,8 @@ class ReportWorkItemViewSet(viewsets.ViewSet):
             {
                 "version": snapshot.version,
                 "content_hash": snapshot.content_hash,
+                "pdf_sha256": snapshot.pdf_sha256 or None,
+                "pdf_verified": verify_snapshot_pdf(snapshot),
                 "published_at": snapshot.published_at,
             }
         )
@@ -6,7 +6,7 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from django.utils import timezone
 from django.conf import settings
 from django.db import transaction
@@ -26,7 +26,7 @@ from .serializers import (
     OPDConsultSerializer, ServiceVisitCreateSerializer, StatusTransitionSerializer
 )
 
-from .pdf import build_receipt_pdf_from_snapshot
+from .pdf import build_receipt_pdf_from_snapshot, build_thermal_receipt_from_snapshot, ensure_receipt_pdf_for_snapshot
 from apps.catalog.models import Service as CatalogService
 from apps.catalog.serializers import ServiceSerializer
 from .permissions import (
@@ -39,6 +39,7 @@ from .transitions import transition_item_status, get_allowed_transitions
 from django.core.exceptions import ValidationError, SuspiciousFileOperation
 from rest_framework.exceptions import PermissionDenied, NotFound
 from apps.patients.models import Patient
+from apps.printing.pdf_delivery import serve_pdf_field, serve_pdf_file
 from .receipts import get_receipt_snapshot_data
 
 logger = logging.getLogger(__name__)
@@ -173,6 +174,40 @@ def _resolve_media_path(relative_path):
     if not str(candidate).startswith(str(media_root)):
         raise SuspiciousFileOperation(f"Blocked path traversal: {relative_path}")
     return candidate
+
+
+THERMAL_RECEIPT_OUTPUTS = {"text": ("text/plain; charset=utf-8", "txt"), "escpos": ("application/octet-stream", "bin")}
+
+
+def receipt_pdf_response(request, snapshot, filename):
+    """
+    Receipt PDF response; saved snapshots stream their stored file (ETag = pdf_sha256).
+    ?output=text|escpos&paper=58|80 returns a thermal-printer receipt instead.
+    """
+    output = request.GET.get("output") or "pdf"
+    if output != "pdf":
+        return thermal_receipt_response(request, snapshot, filename, output)
+    if ensure_receipt_pdf_for_snapshot(snapshot):
+        try:
+            return serve_pdf_field(request, snapshot.pdf_file, filename=filename, etag=snapshot.pdf_sha256)
+        except FileNotFoundError:
+            pass
+    pdf_file = build_receipt_pdf_from_snapshot(snapshot)
+    response = HttpResponse(pdf_file.read(), content_type="application/pdf")
+    response["Content-Disposition"] = f'inline; filename="{filename}"'
+    return response
+
+
+def thermal_receipt_response(request, snapshot, filename, output):
+    try:
+        body = build_thermal_receipt_from_snapshot(snapshot, output, request.GET.get("paper"))
+    except ValueError as exc:
+        return JsonResponse({"error": "INVALID_RECEIPT_FORMAT", "detail": str(exc)}, status=400)
+    content_type, extension = THERMAL_RECEIPT_OUTPUTS[output]
+    response = HttpResponse(body, content_type=content_type)
+    response["Content-Disposition"] = f'inline; filename="{Path(filename).stem}.{extension}"'
+    return response
+
 class ServiceCatalogViewSet(viewsets.ReadOnlyModelViewSet):
     """
     DEPRECATED: Use /api/services/ instead.
@@ -321,11 +356,7 @@ class ServiceVisitViewSet(viewsets.ModelViewSet):
             return Response({"detail": "Receipt not finalized"}, status=status.HTTP_404_NOT_FOUND)
 
         snapshot = get_receipt_snapshot_data(service_visit, invoice)
-        pdf_file = build_receipt_pdf_from_snapshot(snapshot)
-        filename = f"receipt_{service_visit.visit_id}.pdf"
-        response = HttpResponse(pdf_file.read(), content_type="application/pdf")
-        response["Content-Disposition"] = f'inline; filename="{filename}"'
-        return response
+        return receipt_pdf_response(request, snapshot, f"receipt_{service_visit.visit_id}.pdf")
 
 
 class ServiceVisitItemViewSet(viewsets.ReadOnlyModelViewSet):
@@ -869,14 +900,11 @@ class PDFViewSet(viewsets.ViewSet):
         
         # Generate receipt PDF using snapshot data
         snapshot = get_receipt_snapshot_data(service_visit, invoice)
-        pdf_file = build_receipt_pdf_from_snapshot(snapshot)
         
         # Create filename based on visit ID for receipts.
         filename = f"receipt_{service_visit.visit_id}.pdf"
         
-        response = HttpResponse(pdf_file.read(), content_type="application/pdf")
-        response["Content-Disposition"] = f'inline; filename="{filename}"'
-        return response
+        return receipt_pdf_response(request, snapshot, filename)
     
     @action(detail=True, methods=["get"], url_path="report")
     def report(self, request, pk=None):
@@ -937,10 +965,7 @@ class PDFViewSet(viewsets.ViewSet):
                 status=status.HTTP_404_NOT_FOUND,
             )
         
-        with open(pdf_path, "rb") as f:
-            response = HttpResponse(f.read(), content_type="application/pdf")
-            response["Content-Disposition"] = f'inline; filename="report_{service_visit.visit_id}.pdf"'
-            return response
+        return serve_pdf_file(request, pdf_path, filename=f"report_{service_visit.visit_id}.pdf")
     
     @action(detail=True, methods=["get"], url_path="prescription")
     def prescription(self, request, pk=None):
@@ -1003,7 +1028,4 @@ class PDFViewSet(viewsets.ViewSet):
                 status=status.HTTP_404_NOT_FOUND,
             )
         
-        with open(pdf_path, "rb") as f:
-            response = HttpResponse(f.read(), content_type="application/pdf")
-            response["Content-Disposition"] = f'inline; filename="prescription_{service_visit.visit_id}.pdf"'
-            return response
+        return serve_pdf_file(request, pdf_path, filename=f"prescription_{service_visit.visit_id}.pdf")
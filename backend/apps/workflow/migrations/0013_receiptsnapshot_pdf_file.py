@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflow', '0012_receiptsnapshot_referring_consultant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receiptsnapshot',
+            name='pdf_file',
+            field=models.FileField(blank=True, null=True, upload_to='receipt_snapshots/%Y/%m/'),
+        ),
+        migrations.AddField(
+            model_name='receiptsnapshot',
+            name='pdf_render_key',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='receiptsnapshot',
+            name='pdf_sha256',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
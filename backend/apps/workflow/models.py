@@ -299,6 +299,11 @@ class ReceiptSnapshot(models.Model):
     cashier_name = models.CharField(max_length=150, blank=True, default="")
     referring_consultant = models.CharField(max_length=150, blank=True, default="")
 
+    # Rendered once and reused for reprints; pdf_render_key changes with branding.
+    pdf_file = models.FileField(upload_to="receipt_snapshots/%Y/%m/", blank=True, null=True)
+    pdf_sha256 = models.CharField(max_length=64, blank=True, default="")
+    pdf_render_key = models.CharField(max_length=64, blank=True, default="")
+
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -6,8 +6,10 @@ from django.core.files.base import ContentFile
 from .pdf_engine.receipt import (
     build_service_visit_receipt_pdf_reportlab,
     build_receipt_snapshot_pdf,
+    ensure_receipt_snapshot_pdf,
 )
 from .pdf_engine.prescription import build_prescription_pdf
+from .pdf_engine.thermal_receipt import build_thermal_receipt
 
 
 def build_service_visit_receipt_pdf(service_visit, invoice):
@@ -20,6 +22,16 @@ def build_receipt_pdf_from_snapshot(snapshot):
     return build_receipt_snapshot_pdf(snapshot)
 
 
+def ensure_receipt_pdf_for_snapshot(snapshot):
+    """Render/store a saved snapshot's PDF if stale; True when snapshot.pdf_file can be served."""
+    return ensure_receipt_snapshot_pdf(snapshot)
+
+
+def build_thermal_receipt_from_snapshot(snapshot, output, paper=None):
+    """Plain-text or ESC/POS receipt (58/80 mm) from immutable snapshot data, without ReportLab."""
+    return build_thermal_receipt(snapshot, output, paper)
+
+
 def build_opd_prescription_pdf(opd_consult):
     """Generate OPD prescription PDF using ReportLab"""
     return build_prescription_pdf(opd_consult)
@@ -14,6 +14,9 @@ from io import BytesIO
 from PIL import Image
 import os
 
+from apps.printing.page_forms import form_name, place_form
+from apps.printing.text_layout import string_width
+
 
 class PDFStyles:
     """Centralized PDF styles"""
@@ -107,7 +110,14 @@ class PDFBase:
         self.styles = PDFStyles.get_styles()
     
     def draw_header(self, canvas_obj, doc, logo_path=None, header_text=None, institution_name=None):
-        """Draw header on every page"""
+        """Draw header on every page (recorded once per document as a form XObject)"""
+        place_form(
+            canvas_obj,
+            form_name("base_header", [logo_path, header_text, institution_name]),
+            lambda form: self._draw_header_content(form, logo_path, header_text, institution_name),
+        )
+
+    def _draw_header_content(self, canvas_obj, logo_path, header_text, institution_name):
         canvas_obj.saveState()
         
         y = self.PAGE_HEIGHT - 20
@@ -139,7 +149,7 @@ class PDFBase:
         if header_text or institution_name:
             text = header_text or institution_name or "Radiology Information Management System"
             canvas_obj.setFont("Helvetica-Bold", 16)
-            text_width = canvas_obj.stringWidth(text, "Helvetica-Bold", 16)
+            text_width = string_width(text, "Helvetica-Bold", 16)
             canvas_obj.drawString(
                 (self.PAGE_WIDTH - text_width) / 2,
                 y - 20,
@@ -151,6 +161,21 @@ class PDFBase:
     
     def draw_footer(self, canvas_obj, doc):
         """Draw footer on every page"""
+        place_form(canvas_obj, "base_footer", self._draw_footer_content)
+
+        # Page number
+        canvas_obj.saveState()
+        canvas_obj.setFont("Helvetica-Oblique", 8)
+        page_num = canvas_obj.getPageNumber()
+        page_text = f"Page {page_num}"
+        canvas_obj.drawString(
+            self.PAGE_WIDTH - self.MARGIN_RIGHT - 50,
+            15,
+            page_text
+        )
+        canvas_obj.restoreState()
+
+    def _draw_footer_content(self, canvas_obj):
         canvas_obj.saveState()
         
         # Footer line
@@ -161,22 +186,13 @@ class PDFBase:
         # Footer text
         canvas_obj.setFont("Helvetica-Oblique", 8)
         footer_text = "Computer generated document - RIMS"
-        text_width = canvas_obj.stringWidth(footer_text, "Helvetica-Oblique", 8)
+        text_width = string_width(footer_text, "Helvetica-Oblique", 8)
         canvas_obj.drawString(
             (self.PAGE_WIDTH - text_width) / 2,
             15,
             footer_text
         )
         
-        # Page number
-        page_num = canvas_obj.getPageNumber()
-        page_text = f"Page {page_num}"
-        canvas_obj.drawString(
-            self.PAGE_WIDTH - self.MARGIN_RIGHT - 50,
-            15,
-            page_text
-        )
-        
         canvas_obj.restoreState()
     
     def create_page_template(self):
@@ -225,15 +241,18 @@ class PDFBase:
             footer_text = ""
             logo_image = None
             header_image = None
+            version = "default"
 
         try:
-            from apps.printing.models import ReceiptBrandingConfig
-            r = ReceiptBrandingConfig.get_singleton()
+            from apps.printing.config_cache import get_print_config
+            config = get_print_config()
+            r = config.receipt
             class Adapter:
                 header_text = r.receipt_header_text or _Defaults.header_text
                 footer_text = r.receipt_footer_text or _Defaults.footer_text
                 logo_image = r.receipt_logo
                 header_image = r.receipt_banner
+                version = str(config.receipt_version)
             return Adapter()
         except Exception:
             return _Defaults()
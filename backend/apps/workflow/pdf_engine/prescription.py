@@ -7,6 +7,8 @@ from django.core.files.base import ContentFile
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib.units import mm
 from reportlab.lib.colors import black
+from apps.printing.render_pool import render_pdf
+
 from .base import PDFBase, PDFStyles
 
 
@@ -14,9 +16,34 @@ def build_prescription_pdf(opd_consult) -> ContentFile:
     """
     Generate OPD prescription PDF using ReportLab.
     Replaces WeasyPrint-based build_opd_prescription_pdf.
+    Layout runs in the PDF render pool from plain data gathered here.
     """
+    data = _prescription_data(opd_consult)
+    pdf_bytes = render_pdf(render_prescription_pdf, data, label="prescription")
+    return ContentFile(pdf_bytes, name=f"prescription_{data['visit_id']}.pdf")
+
+
+def _prescription_data(opd_consult) -> dict:
     service_visit = opd_consult.service_visit
-    
+    patient = service_visit.patient
+    return {
+        "visit_id": service_visit.visit_id,
+        "patient_reg_no": patient.patient_reg_no or patient.mrn,
+        "patient_name": patient.name,
+        "age": str(patient.age) if patient.age else "",
+        "gender": patient.gender or "",
+        "diagnosis": str(opd_consult.diagnosis or ""),
+        "medicines": opd_consult.medicines_json if isinstance(opd_consult.medicines_json, list) else [],
+        "investigations": opd_consult.investigations_json if isinstance(opd_consult.investigations_json, list) else [],
+        "advice": str(opd_consult.advice or ""),
+        "followup": opd_consult.followup or "",
+        "consultant": opd_consult.consultant.username if opd_consult.consultant else "",
+        "consult_at": opd_consult.consult_at.strftime('%Y-%m-%d %H:%M:%S') if opd_consult.consult_at else "",
+    }
+
+
+def render_prescription_pdf(data: dict) -> bytes:
+    """Render prescription data; runs inside render pool workers."""
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=PDFBase.PAGE_SIZE)
     styles = PDFStyles.get_styles()
@@ -32,15 +59,15 @@ def build_prescription_pdf(opd_consult) -> ContentFile:
     # Patient Information
     story.append(Paragraph("Patient Information", styles['heading']))
     patient_data = [
-        ['Visit ID:', service_visit.visit_id],
-        ['Patient Reg No:', service_visit.patient.patient_reg_no or service_visit.patient.mrn],
-        ['Name:', service_visit.patient.name],
+        ['Visit ID:', data['visit_id']],
+        ['Patient Reg No:', data['patient_reg_no']],
+        ['Name:', data['patient_name']],
     ]
     
-    if service_visit.patient.age:
-        patient_data.append(['Age:', str(service_visit.patient.age)])
-    if service_visit.patient.gender:
-        patient_data.append(['Gender:', service_visit.patient.gender])
+    if data['age']:
+        patient_data.append(['Age:', data['age']])
+    if data['gender']:
+        patient_data.append(['Gender:', data['gender']])
     
     patient_table = Table(patient_data, colWidths=[80 * mm, 100 * mm])
     patient_table.setStyle(TableStyle([
@@ -52,15 +79,15 @@ def build_prescription_pdf(opd_consult) -> ContentFile:
     story.append(Spacer(1, 10 * mm))
     
     # Diagnosis
-    if opd_consult.diagnosis:
+    if data['diagnosis']:
         story.append(Paragraph("Diagnosis", styles['heading']))
-        for line in str(opd_consult.diagnosis).splitlines():
+        for line in data['diagnosis'].splitlines():
             if line.strip():
                 story.append(Paragraph(line.strip(), styles['body']))
         story.append(Spacer(1, 8 * mm))
     
     # Medicines
-    medicines = opd_consult.medicines_json if isinstance(opd_consult.medicines_json, list) else []
+    medicines = data['medicines']
     if medicines:
         story.append(Paragraph("Medicines", styles['heading']))
         
@@ -83,7 +110,7 @@ def build_prescription_pdf(opd_consult) -> ContentFile:
         story.append(Spacer(1, 8 * mm))
     
     # Investigations
-    investigations = opd_consult.investigations_json if isinstance(opd_consult.investigations_json, list) else []
+    investigations = data['investigations']
     if investigations:
         story.append(Paragraph("Investigations", styles['heading']))
         
@@ -101,26 +128,26 @@ def build_prescription_pdf(opd_consult) -> ContentFile:
         story.append(Spacer(1, 8 * mm))
     
     # Advice
-    if opd_consult.advice:
+    if data['advice']:
         story.append(Paragraph("Advice", styles['heading']))
-        for line in str(opd_consult.advice).splitlines():
+        for line in data['advice'].splitlines():
             if line.strip():
                 story.append(Paragraph(line.strip(), styles['body']))
         story.append(Spacer(1, 8 * mm))
     
     # Follow-up
-    if opd_consult.followup:
+    if data['followup']:
         story.append(Paragraph("Follow-up", styles['heading']))
-        story.append(Paragraph(opd_consult.followup, styles['body']))
+        story.append(Paragraph(data['followup'], styles['body']))
         story.append(Spacer(1, 8 * mm))
     
     # Consultant Information
     story.append(Spacer(1, 10 * mm))
     consultant_data = []
-    if opd_consult.consultant:
-        consultant_data.append(['Consultant:', opd_consult.consultant.username])
-    if opd_consult.consult_at:
-        consultant_data.append(['Date:', opd_consult.consult_at.strftime('%Y-%m-%d %H:%M:%S')])
+    if data['consultant']:
+        consultant_data.append(['Consultant:', data['consultant']])
+    if data['consult_at']:
+        consultant_data.append(['Date:', data['consult_at']])
     
     if consultant_data:
         consultant_table = Table(consultant_data, colWidths=[80 * mm, 100 * mm])
@@ -144,4 +171,4 @@ def build_prescription_pdf(opd_consult) -> ContentFile:
     # Sanity check
     assert pdf_bytes[:4] == b'%PDF', "Generated PDF does not start with %PDF"
     
-    return ContentFile(pdf_bytes, name=f"prescription_{service_visit.visit_id}.pdf")
+    return pdf_bytes
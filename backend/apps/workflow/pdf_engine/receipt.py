@@ -4,21 +4,28 @@ Dual-copy A4 receipt layout with fixed canvas positioning.
 Supports both Visit (legacy) and ServiceVisit (workflow) models.
 """
 import decimal
+import hashlib
+import json
 import logging
 import os
 from io import BytesIO
+from types import SimpleNamespace
 from typing import Iterable, List, Optional, Tuple
 from decimal import Decimal
 
 from django.conf import settings
 from django.core.files.base import ContentFile
+from django.db import transaction
 from reportlab.lib.colors import HexColor, black
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import mm
-from reportlab.lib.utils import ImageReader
-from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfgen import canvas as pdf_canvas
 
+from apps.printing.images import cached_image_reader, print_image_path
+from apps.printing.page_forms import form_name, place_form
+from apps.printing.render_pool import render_pdf
+from apps.printing.text_layout import largest_fitting, string_width, wrap_text
+
 from .base import PDFBase
 
 logger = logging.getLogger(__name__)
@@ -56,73 +63,17 @@ APPROX_NON_SERVICE_HEIGHT = 125  # Total approximate height used by non-service
 
 def _wrap_text(text: str, font_name: str, font_size: float, max_width: float) -> List[str]:
     """
-    Wrap text to fit within a specified width using the given font.
-    
-    Handles edge case where a single word is longer than max_width by splitting
-    the word at character boundaries.
-    
-    Args:
-        text: The text to wrap
-        font_name: The font name for width calculation
-        font_size: The font size for width calculation
-        max_width: Maximum width in points
-        
-    Returns:
-        List of text lines that fit within max_width
+    Wrap text to fit within max_width points (memoized, see apps.printing.text_layout).
+
+    Words longer than max_width are split at character boundaries.
     """
-    if not text:
-        return [""]
-    words = text.split()
-    lines: List[str] = []
-    current: List[str] = []
-    for word in words:
-        tentative = " ".join(current + [word])
-        if pdfmetrics.stringWidth(tentative, font_name, font_size) <= max_width:
-            current.append(word)
-        else:
-            # Flush current line if it has content
-            if current:
-                lines.append(" ".join(current))
-                current = []
-            # Handle words that are themselves longer than max_width by
-            # splitting them into segments that each fit within max_width.
-            word_width = pdfmetrics.stringWidth(word, font_name, font_size)
-            if word_width > max_width:
-                remaining = word
-                while remaining:
-                    low, high = 1, len(remaining)
-                    fit_len = 0
-                    # Binary search for the longest prefix that fits
-                    while low <= high:
-                        mid = (low + high) // 2
-                        segment = remaining[:mid]
-                        if pdfmetrics.stringWidth(segment, font_name, font_size) <= max_width:
-                            fit_len = mid
-                            low = mid + 1
-                        else:
-                            high = mid - 1
-                    if fit_len == 0:
-                        # Fallback: force progress to avoid infinite loop
-                        # This only occurs if max_width is too small for even a single character
-                        fit_len = 1
-                        logger.warning(
-                            "[PDF] max_width too small for character in word '%s...', forcing single character",
-                            remaining[:10]
-                        )
-                    segment = remaining[:fit_len]
-                    lines.append(segment)
-                    remaining = remaining[fit_len:]
-            else:
-                current = [word]
-    if current:
-        lines.append(" ".join(current))
-    return lines
+    return wrap_text(text, font_name, font_size, max_width)
 
 
 def _safe_image_path(field) -> Optional[str]:
     if not field:
         return None
-    path = getattr(field, "path", None)
+    path = field if isinstance(field, str) else getattr(field, "path", None)
     if path and os.path.exists(path):
         return path
     return None
@@ -138,7 +89,7 @@ def _draw_image_fit(
     align_center: bool = False,
 ) -> Tuple[float, float]:
     try:
-        image = ImageReader(image_path)
+        image = cached_image_reader(image_path)
         image_width, image_height = image.getSize()
         if not image_width or not image_height:
             return 0.0, 0.0
@@ -210,14 +161,9 @@ def _calculate_service_layout(
         - items_count: Number of items that fit (all if needs_split=False)
         - needs_split: True if items need to be split across pages
     """
-    font_size = initial_font_size
-    line_height_mm = initial_line_height
-    
-    # Try progressively smaller font sizes
-    while font_size >= MIN_FONT_SIZE:
+    def items_fitting(font_size: float, line_height_mm: float) -> int:
         total_height = 0
         items_fitted = 0
-        
         for service_name, _ in services:
             service_lines = _wrap_text(
                 service_name,
@@ -226,48 +172,35 @@ def _calculate_service_layout(
                 service_column_width,
             )[:MAX_SERVICE_LINES]  # Limit to MAX_SERVICE_LINES per item
             row_height = len(service_lines) * line_height_mm * mm + ROW_PADDING
-            
             if total_height + row_height > available_height:
                 break
-            
             total_height += row_height
             items_fitted += 1
-        
-        if items_fitted == len(services):
-            # All items fit!
-            return font_size, line_height_mm, len(services), False
-        
-        # Reduce font size and line height
+        return items_fitted
+
+    # Candidate (font size, line height) pairs, largest first: font size steps
+    # down by 0.5 and line height by 0.2mm (not below 2.5mm).
+    candidates = []
+    font_size = initial_font_size
+    line_height_mm = initial_line_height
+    while font_size >= MIN_FONT_SIZE:
+        candidates.append((font_size, line_height_mm))
         font_size -= 0.5
         line_height_mm -= 0.2
-        
-        # Ensure line height doesn't become too small
         if line_height_mm < 2.5:
             line_height_mm = 2.5
-    
+
+    # Smaller sizes never need more height, so binary search for the largest that fits.
+    best = largest_fitting(candidates, lambda candidate: items_fitting(*candidate) == len(services))
+    if best is not None:
+        font_size, line_height_mm = candidates[best]
+        return font_size, line_height_mm, len(services), False
+
     # If we reach here, we need to split across pages
     # Calculate how many items fit with MIN_FONT_SIZE
     font_size = MIN_FONT_SIZE
     line_height_mm = 2.8  # Minimum reasonable line height
-    total_height = 0
-    items_fitted = 0
-    
-    for service_name, _ in services:
-        service_lines = _wrap_text(
-            service_name,
-            "Helvetica",
-            font_size,
-            service_column_width,
-        )[:MAX_SERVICE_LINES]
-        row_height = len(service_lines) * line_height_mm * mm + ROW_PADDING
-        
-        if total_height + row_height > available_height:
-            break
-        
-        total_height += row_height
-        items_fitted += 1
-    
-    return font_size, line_height_mm, items_fitted, True
+    return font_size, line_height_mm, items_fitting(font_size, line_height_mm), True
 
 
 def _draw_receipt_copy(
@@ -361,52 +294,16 @@ def _draw_receipt_copy(
     header_text = getattr(receipt_settings, "header_text", None) or "Consultant Place Clinic"
     footer_text = getattr(receipt_settings, "footer_text", None) or LOCKED_FOOTER_TEXT
 
-    # Draw header image if available (receipt_banner)
-    header_height = HEADER_IMAGE_HEIGHT * mm
-    if header_image_path:
-        _draw_image_fit(
-            canvas,
-            header_image_path,
-            left_x,
-            current_y - header_height,
-            content_width,
-            header_height,
-            align_center=True,
-        )
-        current_y -= header_height + 2 * mm
-
-    # Draw logo if available
-    if logo_path:
-        logo_height = LOGO_HEIGHT * mm
-        _draw_image_fit(
-            canvas,
-            logo_path,
-            left_x,
-            current_y - logo_height,
-            LOGO_MAX_WIDTH * mm,
-            logo_height,
-            align_center=False,
-        )
-        current_y -= logo_height + 2 * mm
-
-    # Laboratory Name (LARGEST, BOLD)
-    canvas.setFont("Helvetica-Bold", 14)
-    canvas.setFillColor(black)
-    canvas.drawCentredString(x + width / 2, current_y, header_text)
-    current_y -= 5 * mm
-
-    # Address and contact (smaller, centered) - from receipt_footer_text
-    address_lines = (footer_text or "").strip().split("\n") or [""]
-    canvas.setFont("Helvetica", 7)
-    canvas.setFillColor(black)
-    if address_lines:  # Draw first line directly
-        canvas.drawCentredString(x + width / 2, current_y, address_lines[0])
-        current_y -= 3 * mm
-    
-    # Contact number
-    if len(address_lines) > 1:
-        canvas.drawCentredString(x + width / 2, current_y, address_lines[1])
-    current_y -= 5 * mm
+    # Branding block: the same on both copies of every page, so it is recorded
+    # once as a form XObject in copy coordinates and placed by reference.
+    header_used = place_form(
+        canvas,
+        form_name("receipt_header", [header_image_path, logo_path, header_text, footer_text, width, height]),
+        lambda form: _draw_branding_header(form, width, height, header_image_path, logo_path, header_text, footer_text),
+        origin=(x, y),
+        bbox=(0, 0, width, height),
+    )
+    current_y -= header_used
 
     # Copy Type Label (PROMINENT)
     canvas.setFont("Helvetica-Bold", 11)
@@ -538,7 +435,7 @@ def _draw_receipt_copy(
     if items_count > 0:
         largest_item_number = f"{start_service_number + items_count - 1}."
         # Width in points for the largest number plus a small padding to separate it from the text
-        number_width = pdfmetrics.stringWidth(largest_item_number, "Helvetica", font_size) + 4
+        number_width = string_width(largest_item_number, "Helvetica", font_size) + 4
     else:
         number_width = 0
     
@@ -626,16 +523,96 @@ def _draw_receipt_copy(
     # ============================================================================
     # SECTION 5: FOOTER / AUTHENTICATION
     # ============================================================================
+    place_form(
+        canvas,
+        form_name("receipt_footer", [data["date"], data["cashier"], width, height]),
+        lambda form: _draw_receipt_footer(form, width, data),
+        origin=(x, y),
+        bbox=(0, 0, width, height),
+    )
+
+
+def _draw_branding_header(
+    canvas: pdf_canvas.Canvas,
+    width: float,
+    height: float,
+    header_image_path: Optional[str],
+    logo_path: Optional[str],
+    header_text: str,
+    footer_text: str,
+) -> float:
+    """Banner, logo, laboratory name and address of one copy, drawn from its top edge; returns the height used."""
+    padding = PADDING * mm
+    top_y = height - padding
+    current_y = top_y
+    left_x = padding
+    content_width = width - padding * 2
+
+    # Draw header image if available (receipt_banner)
+    header_height = HEADER_IMAGE_HEIGHT * mm
+    if header_image_path:
+        _draw_image_fit(
+            canvas,
+            header_image_path,
+            left_x,
+            current_y - header_height,
+            content_width,
+            header_height,
+            align_center=True,
+        )
+        current_y -= header_height + 2 * mm
+
+    # Draw logo if available
+    if logo_path:
+        logo_height = LOGO_HEIGHT * mm
+        _draw_image_fit(
+            canvas,
+            logo_path,
+            left_x,
+            current_y - logo_height,
+            LOGO_MAX_WIDTH * mm,
+            logo_height,
+            align_center=False,
+        )
+        current_y -= logo_height + 2 * mm
+
+    # Laboratory Name (LARGEST, BOLD)
+    canvas.setFont("Helvetica-Bold", 14)
+    canvas.setFillColor(black)
+    canvas.drawCentredString(width / 2, current_y, header_text)
+    current_y -= 5 * mm
+
+    # Address and contact (smaller, centered) - from receipt_footer_text
+    address_lines = (footer_text or "").strip().split("\n") or [""]
+    canvas.setFont("Helvetica", 7)
+    canvas.setFillColor(black)
+    if address_lines:  # Draw first line directly
+        canvas.drawCentredString(width / 2, current_y, address_lines[0])
+        current_y -= 3 * mm
+
+    # Contact number
+    if len(address_lines) > 1:
+        canvas.drawCentredString(width / 2, current_y, address_lines[1])
+    current_y -= 5 * mm
+    return top_y - current_y
+
+
+def _draw_receipt_footer(canvas: pdf_canvas.Canvas, width: float, data: dict) -> None:
+    """Generated/cashier line and disclaimer at the bottom of one copy (copy coordinates)."""
+    padding = PADDING * mm
+    left_x = padding
+    right_x = width - padding
+
     # Separated by top rule
     canvas.setStrokeColor(BORDER_GREY)
     canvas.setLineWidth(0.5)
-    canvas.line(left_x, y + 15 * mm, right_x, y + 15 * mm)
+    canvas.line(left_x, 15 * mm, right_x, 15 * mm)
     canvas.setLineWidth(1)
     
     # Footer content
     canvas.setFont("Helvetica", 6)
     canvas.setFillColor(LIGHT_GREY)
-    footer_y = y + 10 * mm
+    footer_y = 10 * mm
     
     # Generated by/date info
     canvas.drawString(left_x, footer_y, f"Generated: {data['date']}")
@@ -645,7 +622,7 @@ def _draw_receipt_copy(
     
     # Disclaimer (centered, smaller)
     canvas.setFont("Helvetica", 5.5)
-    canvas.drawCentredString(x + width / 2, footer_y, "This is a computer-generated receipt and does not require a signature.")
+    canvas.drawCentredString(width / 2, footer_y, "This is a computer-generated receipt and does not require a signature.")
 
 
 def _build_receipt_canvas(data: dict, receipt_settings, filename: str) -> ContentFile:
@@ -693,7 +670,26 @@ def _build_receipt_canvas(data: dict, receipt_settings, filename: str) -> Conten
         determined externally after the ContentFile was created. No external
         code depends on this function as it is only called from within this
         module by the public receipt generation functions.
+
+        Layout runs in the PDF render pool (apps.printing.render_pool); branding
+        is reduced to plain text and image paths before the job is submitted.
     """
+    pdf_bytes = render_pdf(render_receipt_pdf, data, _branding_payload(receipt_settings), label="receipt")
+    return ContentFile(pdf_bytes, name=filename)
+
+
+def _branding_payload(receipt_settings) -> dict:
+    return {
+        "header_text": getattr(receipt_settings, "header_text", None),
+        "footer_text": getattr(receipt_settings, "footer_text", None),
+        "header_image": print_image_path(getattr(receipt_settings, "header_image", None), "receipt_banner"),
+        "logo_image": print_image_path(getattr(receipt_settings, "logo_image", None), "receipt_logo"),
+    }
+
+
+def render_receipt_pdf(data: dict, branding: dict) -> bytes:
+    """Render the dual-copy receipt from plain data; runs inside render pool workers."""
+    receipt_settings = SimpleNamespace(**branding)
     buffer = BytesIO()
     canvas = pdf_canvas.Canvas(buffer, pagesize=A4)
 
@@ -835,7 +831,7 @@ def _build_receipt_canvas(data: dict, receipt_settings, filename: str) -> Conten
         logger.error("[RECEIPT PDF] Generated PDF does not start with %PDF signature!")
         raise ValueError("Generated PDF is invalid")
 
-    return ContentFile(pdf_bytes, name=filename)
+    return pdf_bytes
 
 
 def build_receipt_pdf_reportlab(visit) -> ContentFile:
@@ -943,10 +939,122 @@ def build_service_visit_receipt_pdf_reportlab(service_visit, invoice) -> Content
 
 
 def build_receipt_snapshot_pdf(snapshot) -> ContentFile:
-    """Generate receipt PDF from immutable snapshot data."""
-    base = PDFBase()
-    receipt_settings = base.get_receipt_settings()
+    """
+    Receipt PDF for an immutable snapshot.
 
+    Saved snapshots keep their rendered PDF (pdf_file + pdf_sha256); reprints read
+    it back and only re-render when the render key changes, i.e. when the receipt
+    branding version (or a live invoice/consultant field shown on the receipt) does.
+    """
+    data, branding, render_key = _receipt_snapshot_render_inputs(snapshot)
+    filename = f"receipt_{data['visit_id']}.pdf"
+    if not _is_persisted(snapshot):
+        return ContentFile(render_pdf(render_receipt_pdf, data, branding, label="receipt"), name=filename)
+
+    if snapshot.pdf_file and snapshot.pdf_render_key == render_key:
+        pdf_bytes = _read_stored_receipt(snapshot)
+        if pdf_bytes is not None:
+            return ContentFile(pdf_bytes, name=filename)
+
+    pdf_bytes = render_pdf(render_receipt_pdf, data, branding, label="receipt")
+    _store_receipt_pdf(snapshot, render_key, pdf_bytes)
+    return ContentFile(pdf_bytes, name=filename)
+
+
+def ensure_receipt_snapshot_pdf(snapshot) -> bool:
+    """
+    Make sure a saved snapshot's stored PDF is current, rendering it if needed,
+    without reading it back (for streaming responses). False for unsaved snapshots.
+    """
+    if not _is_persisted(snapshot):
+        return False
+    data, branding, render_key = _receipt_snapshot_render_inputs(snapshot)
+    if (
+        snapshot.pdf_file
+        and snapshot.pdf_render_key == render_key
+        and snapshot.pdf_file.storage.exists(snapshot.pdf_file.name)
+    ):
+        return True
+    _store_receipt_pdf(snapshot, render_key, render_pdf(render_receipt_pdf, data, branding, label="receipt"))
+    return True
+
+
+def _is_persisted(snapshot) -> bool:
+    return snapshot.pk is not None and not snapshot._state.adding
+
+
+def _receipt_snapshot_render_inputs(snapshot):
+    receipt_settings = PDFBase().get_receipt_settings()
+    data = receipt_snapshot_data(snapshot)
+    branding = _branding_payload(receipt_settings)
+    render_key = hashlib.sha256(
+        json.dumps(
+            {"data": data, "branding": branding, "branding_version": getattr(receipt_settings, "version", "")},
+            sort_keys=True,
+            default=str,
+        ).encode("utf-8")
+    ).hexdigest()
+    return data, branding, render_key
+
+
+def _store_receipt_pdf(snapshot, render_key: str, pdf_bytes: bytes) -> None:
+    """
+    Store pdf_bytes as the snapshot's PDF. The snapshot row is locked while the
+    stored state is re-checked, so when concurrent first prints both render,
+    the later one adopts the file the earlier one stored instead of writing
+    a second copy.
+    """
+    with transaction.atomic():
+        current = (
+            type(snapshot)
+            .objects.select_for_update()
+            .only("pdf_file", "pdf_sha256", "pdf_render_key")
+            .get(pk=snapshot.pk)
+        )
+        if (
+            current.pdf_file
+            and current.pdf_render_key == render_key
+            and current.pdf_file.storage.exists(current.pdf_file.name)
+        ):
+            snapshot.pdf_file.name = current.pdf_file.name
+            snapshot.pdf_sha256 = current.pdf_sha256
+            snapshot.pdf_render_key = current.pdf_render_key
+            return
+
+        previous = current.pdf_file.name if current.pdf_file else None
+        snapshot.pdf_file.save(f"receipt_{snapshot.receipt_number}.pdf", ContentFile(pdf_bytes), save=False)
+        snapshot.pdf_sha256 = hashlib.sha256(pdf_bytes).hexdigest()
+        snapshot.pdf_render_key = render_key
+        try:
+            snapshot.save(update_fields=["pdf_file", "pdf_sha256", "pdf_render_key"])
+        except Exception:
+            snapshot.pdf_file.storage.delete(snapshot.pdf_file.name)
+            raise
+    if previous and previous != snapshot.pdf_file.name:
+        snapshot.pdf_file.storage.delete(previous)
+    logger.info(
+        "receipt_pdf_stored",
+        extra={"event": "receipt_pdf_stored", "snapshot_id": str(snapshot.pk), "sha256": snapshot.pdf_sha256},
+    )
+
+
+def _read_stored_receipt(snapshot) -> Optional[bytes]:
+    try:
+        with snapshot.pdf_file.open("rb") as handle:
+            pdf_bytes = handle.read()
+    except (OSError, ValueError):
+        return None
+    if hashlib.sha256(pdf_bytes).hexdigest() != snapshot.pdf_sha256:
+        logger.warning(
+            "receipt_pdf_hash_mismatch",
+            extra={"event": "receipt_pdf_hash_mismatch", "snapshot_id": str(snapshot.pk)},
+        )
+        return None
+    return pdf_bytes
+
+
+def receipt_snapshot_data(snapshot) -> dict:
+    """ReceiptSnapshot fields formatted for display; shared by the PDF and thermal renderers."""
     services = []
     for item in snapshot.items_json or []:
         name = item.get("name", "")
@@ -988,6 +1096,4 @@ def build_receipt_snapshot_pdf(snapshot) -> ContentFile:
         "balance_amount": f"Rs. {snapshot.service_visit.invoice.balance_amount:.2f}" if hasattr(snapshot.service_visit, "invoice") else "Rs. 0.00",
         "payment_method": (snapshot.payment_method or "cash").upper(),
     }
-
-    filename = f"receipt_{data['visit_id']}.pdf"
-    return _build_receipt_canvas(data, receipt_settings, filename)
+    return data
@@ -0,0 +1,165 @@
+"""
+Thermal-printer receipts: plain text and ESC/POS for 58 mm / 80 mm roll printers.
+
+Built from the same ReceiptSnapshot fields as the dual-copy A4 PDF, without
+ReportLab. A receipt is laid out once as a list of lines (alignment, emphasis,
+text) sized to the paper's character columns (Font A: 32 on 58 mm, 48 on
+80 mm); the text output joins the lines, the ESC/POS output adds the printer
+commands (initialise, align, bold, double height, feed and cut), emitting a
+command only when the style changes.
+"""
+
+import textwrap
+from typing import List, NamedTuple, Tuple
+
+from .base import PDFBase
+from .receipt import LOCKED_FOOTER_TEXT, receipt_snapshot_data
+
+PAPER_COLUMNS = {"58": 32, "80": 48}
+DEFAULT_PAPER = "80"
+OUTPUTS = ("text", "escpos")
+
+ESC_INIT = b"\x1b@"
+ESC_ALIGN = b"\x1ba"  # + 0 left / 1 centre / 2 right
+ESC_BOLD = b"\x1bE"  # + 0 / 1
+GS_SIZE = b"\x1d!"  # + 0x00 normal / 0x01 double height
+ESC_FEED = b"\x1bd"  # + n lines
+GS_CUT = b"\x1dV\x42\x00"  # feed to cutter, partial cut
+ENCODING = "cp437"
+ALIGN_CODES = {"left": 0, "center": 1, "right": 2}
+
+
+class ReceiptLine(NamedTuple):
+    text: str
+    align: str = "left"
+    bold: bool = False
+    tall: bool = False
+
+
+def paper_columns(paper) -> int:
+    """Character columns for a paper width ("58" or "80"); ValueError otherwise."""
+    key = str(paper or DEFAULT_PAPER).strip().lower().removesuffix("mm")
+    if key not in PAPER_COLUMNS:
+        raise ValueError(f"paper must be one of: {', '.join(PAPER_COLUMNS)}")
+    return PAPER_COLUMNS[key]
+
+
+def _wrap(text: str, width: int, indent: str = "") -> List[str]:
+    return textwrap.wrap(str(text), width, subsequent_indent=indent) or [""]
+
+
+def _pair(label: str, value: str, columns: int) -> List[str]:
+    """Label on the left, value right-aligned; the value moves to its own line when both do not fit."""
+    label, value = str(label), str(value)
+    if len(label) + 1 + len(value) <= columns:
+        return [label + value.rjust(columns - len(label))]
+    return _wrap(label, columns) + [line.rjust(columns) for line in _wrap(value, columns)]
+
+
+def _field(label: str, value: str, columns: int) -> List[str]:
+    return _wrap(f"{label} {value or '-'}", columns, indent="  ")
+
+
+def receipt_lines(data: dict, branding: dict, columns: int) -> List[ReceiptLine]:
+    """One receipt copy as styled lines, `columns` characters wide."""
+    rule = ReceiptLine("-" * columns)
+    lines = [ReceiptLine(line, "center", True, True) for line in _wrap(branding.get("header_text") or "", columns)]
+    address = (branding.get("footer_text") or LOCKED_FOOTER_TEXT).strip().split("\n")
+    for address_line in address[:2]:
+        lines.extend(ReceiptLine(line, "center") for line in _wrap(address_line.strip(), columns))
+    lines.append(rule)
+    lines.append(ReceiptLine("RECEIPT", "center", True))
+
+    for label, value in (
+        ("Receipt No:", data["receipt_number"]),
+        ("Visit ID:", data["visit_id"]),
+        ("Date:", data["date"]),
+        ("Cashier:", data["cashier"]),
+    ):
+        lines.extend(ReceiptLine(line) for line in _field(label, value, columns))
+    lines.append(rule)
+
+    for label, value in (
+        ("Patient:", f"{data['patient_name']} ({data['age']}/{data['gender']})"),
+        ("MRN / Reg:", f"{data['mrn']} / {data['patient_reg_no']}"),
+        ("Phone:", data["phone"]),
+        ("Ref. By:", data.get("consultant")),
+    ):
+        lines.extend(ReceiptLine(line) for line in _field(label, value, columns))
+    lines.append(rule)
+
+    for number, (name, amount) in enumerate(data["services"], start=1):
+        amount = amount.replace("Rs. ", "")
+        name_width = max(8, columns - len(amount) - 1)
+        name_lines = _wrap(f"{number}. {name}", name_width, indent="   ")
+        lines.append(ReceiptLine(name_lines[0].ljust(columns - len(amount)) + amount))
+        lines.extend(ReceiptLine(line) for line in name_lines[1:])
+    lines.append(rule)
+
+    totals: Tuple[Tuple[str, str, bool], ...] = (
+        ("Total:", data["total_amount"], False),
+        ("Discount:", data.get("discount_text", "Rs. 0.00"), False),
+        ("Net Payable:", data["net_amount"], True),
+        ("Paid:", data["paid_amount"], False),
+        ("Due:", data.get("balance_amount", "Rs. 0.00"), True),
+        ("Payment:", data["payment_method"], False),
+    )
+    for label, value, bold in totals:
+        lines.extend(ReceiptLine(line, bold=bold) for line in _pair(label, value, columns))
+    lines.append(rule)
+    lines.extend(
+        ReceiptLine(line, "center") for line in _wrap("Computer-generated receipt. No signature required.", columns)
+    )
+    return lines
+
+
+def render_text(lines: List[ReceiptLine], columns: int) -> str:
+    rendered = []
+    for line in lines:
+        if line.align == "center":
+            rendered.append(line.text.center(columns).rstrip())
+        elif line.align == "right":
+            rendered.append(line.text.rjust(columns))
+        else:
+            rendered.append(line.text.rstrip())
+    return "\n".join(rendered) + "\n"
+
+
+def render_escpos(lines: List[ReceiptLine]) -> bytes:
+    out = bytearray(ESC_INIT)
+    align, bold, tall = "left", False, False
+    for line in lines:
+        if line.align != align:
+            align = line.align
+            out += ESC_ALIGN + bytes([ALIGN_CODES[align]])
+        if line.bold != bold:
+            bold = line.bold
+            out += ESC_BOLD + bytes([int(bold)])
+        if line.tall != tall:
+            tall = line.tall
+            out += GS_SIZE + bytes([0x01 if tall else 0x00])
+        out += line.text.rstrip().encode(ENCODING, errors="replace") + b"\n"
+    if align != "left":
+        out += ESC_ALIGN + b"\x00"
+    if bold:
+        out += ESC_BOLD + b"\x00"
+    if tall:
+        out += GS_SIZE + b"\x00"
+    out += ESC_FEED + b"\x03" + GS_CUT
+    return bytes(out)
+
+
+def build_thermal_receipt(snapshot, output: str, paper=None) -> bytes:
+    """
+    Receipt for a thermal printer: output "text" (UTF-8 plain text) or "escpos"
+    (printer byte stream), paper "58" or "80". ValueError for anything else.
+    """
+    if output not in OUTPUTS:
+        raise ValueError(f"output must be one of: pdf, {', '.join(OUTPUTS)}")
+    columns = paper_columns(paper)
+    receipt_settings = PDFBase().get_receipt_settings()
+    branding = {"header_text": receipt_settings.header_text, "footer_text": receipt_settings.footer_text}
+    lines = receipt_lines(receipt_snapshot_data(snapshot), branding, columns)
+    if output == "text":
+        return render_text(lines, columns).encode("utf-8")
+    return render_escpos(lines)
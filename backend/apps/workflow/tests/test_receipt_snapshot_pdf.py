@@ -0,0 +1,173 @@
+import pytest
+from unittest import mock
+from django.utils import timezone
+
+from apps.patients.models import Patient
+from apps.printing.models import ReceiptBrandingConfig
+from apps.reporting.models import ReportingOrganizationConfig
+from apps.workflow.models import ReceiptSnapshot, ServiceVisit
+from apps.workflow.pdf_engine import receipt as receipt_pdf
+
+
+@pytest.fixture
+def snapshot(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    patient = Patient.objects.create(name="Receipt Patient", age=30, gender="M")
+    visit = ServiceVisit.objects.create(patient=patient)
+    return ReceiptSnapshot.objects.create(
+        service_visit=visit,
+        receipt_number="2601-0001",
+        issued_at=timezone.now(),
+        items_json=[{"name": "USG Abdomen", "qty": 1, "unit_price": "1000", "line_total": "1000"}],
+        subtotal=1000,
+        total_paid=1000,
+        patient_name="Receipt Patient",
+    )
+
+
+def _build(snapshot):
+    with mock.patch.object(receipt_pdf, "render_pdf", wraps=receipt_pdf.render_pdf) as render:
+        pdf = receipt_pdf.build_receipt_snapshot_pdf(ReceiptSnapshot.objects.get(pk=snapshot.pk))
+    return pdf.read(), render.call_count
+
+
+@pytest.mark.django_db
+def test_snapshot_pdf_is_rendered_once_and_reused(snapshot):
+    first, renders = _build(snapshot)
+    assert renders == 1
+    assert first.startswith(b"%PDF")
+
+    snapshot.refresh_from_db()
+    assert snapshot.pdf_file
+    assert len(snapshot.pdf_sha256) == 64
+    stored_name = snapshot.pdf_file.name
+
+    second, renders = _build(snapshot)
+    assert renders == 0
+    assert second == first
+    snapshot.refresh_from_db()
+    assert snapshot.pdf_file.name == stored_name
+
+
+@pytest.mark.django_db
+def test_branding_change_or_corrupt_file_rerenders(snapshot):
+    _build(snapshot)
+    snapshot.refresh_from_db()
+    old_key, old_name = snapshot.pdf_render_key, snapshot.pdf_file.name
+
+    branding = ReceiptBrandingConfig.get_singleton()
+    branding.receipt_footer_text = "New footer"
+    branding.save()
+    _, renders = _build(snapshot)
+    assert renders == 1
+    snapshot.refresh_from_db()
+    assert snapshot.pdf_render_key != old_key
+    assert not snapshot.pdf_file.storage.exists(old_name)
+
+    with snapshot.pdf_file.open("wb") as handle:
+        handle.write(b"%PDF-corrupt")
+    _, renders = _build(snapshot)
+    assert renders == 1
+
+
+@pytest.mark.django_db
+def test_report_branding_change_keeps_stored_receipt(snapshot):
+    first, _ = _build(snapshot)
+    snapshot.refresh_from_db()
+    old_key = snapshot.pdf_render_key
+
+    ReportingOrganizationConfig.objects.create(org_name="Report Header Only")
+    second, renders = _build(snapshot)
+    assert renders == 0
+    assert second == first
+    snapshot.refresh_from_db()
+    assert snapshot.pdf_render_key == old_key
+
+
+@pytest.mark.django_db
+def test_concurrent_first_prints_store_one_file(snapshot, tmp_path):
+    # Loaded before either print stored anything, like a second in-flight request.
+    racing = ReceiptSnapshot.objects.get(pk=snapshot.pk)
+    _build(snapshot)
+    snapshot.refresh_from_db()
+
+    receipt_pdf.build_receipt_snapshot_pdf(racing)
+    assert racing.pdf_file.name == snapshot.pdf_file.name
+    assert racing.pdf_sha256 == snapshot.pdf_sha256
+    assert len([path for path in tmp_path.rglob("*.pdf")]) == 1
+    snapshot.refresh_from_db()
+    assert snapshot.pdf_file.name == racing.pdf_file.name
+
+
+@pytest.mark.django_db
+def test_unsaved_snapshot_is_not_persisted(snapshot):
+    unsaved = ReceiptSnapshot(
+        service_visit=snapshot.service_visit,
+        receipt_number="2601-0002",
+        issued_at=timezone.now(),
+        items_json=[],
+    )
+    assert receipt_pdf.build_receipt_snapshot_pdf(unsaved).read().startswith(b"%PDF")
+    assert not unsaved.pdf_file
+
+
+@pytest.mark.django_db
+def test_receipt_response_streams_stored_file_with_etag(snapshot):
+    from django.test import RequestFactory
+
+    from apps.workflow.api import receipt_pdf_response
+
+    response = receipt_pdf_response(RequestFactory().get("/"), snapshot, "receipt.pdf")
+    assert response.status_code == 200
+    snapshot.refresh_from_db()
+    assert response["ETag"] == f'"{snapshot.pdf_sha256}"'
+    assert b"".join(response.streaming_content).startswith(b"%PDF")
+
+    request = RequestFactory().get("/", HTTP_IF_NONE_MATCH=response["ETag"])
+    assert receipt_pdf_response(request, snapshot, "receipt.pdf").status_code == 304
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("paper,columns", [("58", 32), ("80", 48)])
+def test_thermal_text_receipt_fits_paper(snapshot, paper, columns):
+    from django.test import RequestFactory
+
+    from apps.workflow.api import receipt_pdf_response
+
+    with mock.patch.object(receipt_pdf, "render_pdf") as render:
+        response = receipt_pdf_response(
+            RequestFactory().get("/", {"output": "text", "paper": paper}), snapshot, "receipt_V1.pdf"
+        )
+    assert response.status_code == 200
+    assert render.call_count == 0
+    assert response["Content-Type"].startswith("text/plain")
+    assert 'filename="receipt_V1.txt"' in response["Content-Disposition"]
+
+    text = response.content.decode("utf-8")
+    lines = text.splitlines()
+    assert max(len(line) for line in lines) <= columns
+    assert "2601-0001" in text
+    assert any(line.startswith("1. USG Abdomen") and line.endswith("1000.00") for line in lines)
+    assert not snapshot.pdf_file
+
+
+@pytest.mark.django_db
+def test_escpos_receipt_is_compact_byte_stream(snapshot):
+    from apps.workflow.pdf_engine.thermal_receipt import ESC_INIT, GS_CUT, build_thermal_receipt
+
+    data = build_thermal_receipt(snapshot, "escpos", "58")
+    assert data.startswith(ESC_INIT)
+    assert data.endswith(GS_CUT)
+    assert b"USG Abdomen" in data
+    assert len(data) < 1500
+
+
+@pytest.mark.django_db
+def test_thermal_receipt_rejects_unknown_output_or_paper(snapshot):
+    from django.test import RequestFactory
+
+    from apps.workflow.api import receipt_pdf_response
+
+    for params in ({"output": "html"}, {"output": "text", "paper": "110"}):
+        response = receipt_pdf_response(RequestFactory().get("/", params), snapshot, "receipt.pdf")
+        assert response.status_code == 400
@@ -148,6 +148,62 @@ SPECTACULAR_SETTINGS = {
 
 OPD_ENABLED = os.getenv("OPD_ENABLED", "false").lower() in ("1", "true", "yes")
 
+# Narrative memoization (apps.reporting.services.narrative_cache).
+# NARRATIVE_CACHE_DIR enables a shared on-disk tier; leave empty to keep it in-process only.
+NARRATIVE_CACHE_SIZE = int(os.getenv("NARRATIVE_CACHE_SIZE", "512") or "0")
+NARRATIVE_CACHE_DIR = os.getenv("NARRATIVE_CACHE_DIR", "")
+
+# Per-worker LRU of derived report render context (print payload / report PDFs); 0 disables.
+REPORT_RENDER_CONTEXT_CACHE_SIZE = int(os.getenv("REPORT_RENDER_CONTEXT_CACHE_SIZE", "256") or "0")
+
+# Process pool size for the simulate_template_impact command (0 = min(4, CPU count)).
+TEMPLATE_IMPACT_WORKERS = int(os.getenv("TEMPLATE_IMPACT_WORKERS", "0") or "0")
+# Most documents the simulate-impact endpoint compares in one JSON response
+# (?stream=1 is unbounded). The endpoint compares in-process, without the pool.
+TEMPLATE_IMPACT_SYNC_LIMIT = int(os.getenv("TEMPLATE_IMPACT_SYNC_LIMIT", "1000"))
+
+# Upper bound for a report's values_json on save/submit (0 disables the size check).
+REPORT_VALUES_MAX_BYTES = int(os.getenv("REPORT_VALUES_MAX_BYTES", str(256 * 1024)) or "0")
+
+# Out-of-process PDF rendering (apps.printing.render_pool). 0 workers (the default)
+# renders inline; deployments opt in by setting PDF_RENDER_WORKERS.
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", "0"))
+PDF_RENDER_TIMEOUT = float(os.getenv("PDF_RENDER_TIMEOUT", "60"))
+PDF_RENDER_MAX_PENDING = int(os.getenv("PDF_RENDER_MAX_PENDING", "0"))
+PDF_RENDER_QUEUE_TIMEOUT = float(os.getenv("PDF_RENDER_QUEUE_TIMEOUT", "5"))
+
+# Background publish (POST publish/?async=1): threads per web process, and the age
+# after which a queued/running job is considered lost and its version released.
+REPORT_PUBLISH_WORKERS = int(os.getenv("REPORT_PUBLISH_WORKERS", "2"))
+REPORT_PUBLISH_JOB_TIMEOUT = int(os.getenv("REPORT_PUBLISH_JOB_TIMEOUT", "600"))
+# Render the publish PDF in the background when a report is verified (stored in the preview cache).
+REPORT_PUBLISH_PRERENDER = os.getenv("REPORT_PUBLISH_PRERENDER", "1").lower() in ("1", "true", "yes")
+
+# Draft-preview PDF cache for report-pdf; opt-in, set a directory to enable. Entries are evicted
+# beyond the size budget or after MAX_AGE seconds unused.
+REPORT_PREVIEW_CACHE_DIR = os.getenv("REPORT_PREVIEW_CACHE_DIR", "")
+REPORT_PREVIEW_CACHE_MAX_BYTES = int(os.getenv("REPORT_PREVIEW_CACHE_MAX_BYTES", str(512 * 1024 * 1024)) or "0")
+REPORT_PREVIEW_CACHE_MAX_AGE = int(os.getenv("REPORT_PREVIEW_CACHE_MAX_AGE", str(7 * 24 * 3600)) or "0")
+
+# Stored PDF delivery (apps.printing.pdf_delivery). Set PDF_SENDFILE_HEADER to
+# "X-Accel-Redirect" (nginx; Caddy via reverse_proxy handle_response) or "X-Sendfile"
+# to let the proxy serve the bytes; PDF_SENDFILE_PREFIX is the internal location
+# mapped to MEDIA_ROOT (empty sends the absolute path).
+PDF_SENDFILE_HEADER = os.getenv("PDF_SENDFILE_HEADER", "")
+PDF_SENDFILE_PREFIX = os.getenv("PDF_SENDFILE_PREFIX", "")
+
+# Merged print bundles (apps.printing.bundles): selection limits per request. The
+# merged PDF is assembled in memory, so MAX_DOCUMENTS also bounds peak memory.
+PRINT_BUNDLE_MAX_DOCUMENTS = int(os.getenv("PRINT_BUNDLE_MAX_DOCUMENTS", "200"))
+PRINT_BUNDLE_MAX_DAYS = int(os.getenv("PRINT_BUNDLE_MAX_DAYS", "31"))
+
+# Branding config cache (apps.printing.config_cache): seconds a worker trusts its
+# snapshot when the Django cache is not shared between workers.
+PRINT_CONFIG_CACHE_TTL = float(os.getenv("PRINT_CONFIG_CACHE_TTL", "30"))
+
+# Branding images are downscaled on upload to their print box at this resolution (apps.printing.images).
+PRINT_IMAGE_DPI = int(os.getenv("PRINT_IMAGE_DPI", "300"))
+
 # Security settings (configure via env for production; keep dev friendly defaults)
 SECURE_PROXY_SSL_HEADER = None
 secure_proxy_header = os.getenv("SECURE_PROXY_SSL_HEADER", "")
@@ -14,7 +14,7 @@ from apps.audit.api import AuditLogViewSet
 from apps.workflow.api import (
     ServiceCatalogViewSet, ServiceVisitViewSet, ServiceVisitItemViewSet,
     OPDVitalsViewSet, OPDConsultViewSet, PDFViewSet,
-    PatientWorkflowViewSet,
+    PatientWorkflowViewSet, receipt_pdf_response,
 )
 from apps.workflow.user_api import UserViewSet, GroupViewSet, PermissionViewSet
 from apps.consultants.api import ConsultantProfileViewSet, ConsultantSettlementViewSet, ConsultantBillingRuleViewSet
@@ -34,9 +34,8 @@ from apps.backups.api import (
     backup_cloud_test,
 )
 from apps.workflow.models import ServiceVisit, Invoice
-from apps.workflow.pdf import build_receipt_pdf_from_snapshot
 from apps.workflow.receipts import get_receipt_snapshot_data
-from django.http import HttpResponse, JsonResponse
+from django.http import JsonResponse
 from rest_framework.decorators import api_view, permission_classes
 from django.conf import settings
 from django.conf.urls.static import static
@@ -175,10 +174,7 @@ def receipt_pdf_alt(request, visit_id):
     
     # Generate receipt PDF using snapshot data
     snapshot = get_receipt_snapshot_data(service_visit, invoice)
-    pdf_file = build_receipt_pdf_from_snapshot(snapshot)
-    response = HttpResponse(pdf_file.read(), content_type="application/pdf")
-    response["Content-Disposition"] = f'inline; filename="receipt_{invoice.receipt_number or service_visit.visit_id}.pdf"'
-    return response
+    return receipt_pdf_response(request, snapshot, f"receipt_{invoice.receipt_number or service_visit.visit_id}.pdf")
 
 urlpatterns = [
     path("admin/", admin.site.urls),